@@ -2,22 +2,40 @@ from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QTableView, QApplication, QMainWindow,
     QLabel, QHBoxLayout, QHeaderView, QFileDialog, QSplitter
 )
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QColor, QPixmap, QAction
-from PySide6.QtCore import Qt
+from PySide6.QtGui import QColor, QPixmap, QImage, QAction
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QThread, QThreadPool, QRunnable, QObject, QEvent, Signal
 import sys
 import re
 import os
-from datetime import datetime
+from collections import OrderedDict
+from time import monotonic
 from bisect import bisect_right
 from itertools import groupby
 
-from parser_lib import Parser
+from log_cache import ParsedLogCache
+from packets import timestamp_us
 
 class Packet:
     def __init__(self, timestamp, ptype, content):
         self.timestamp = timestamp
         self.ptype = ptype
         self.content = content
+
+        # Microseconds since midnight, converted once here so that the timestamp never has to be parsed again
+        self.time_us = timestamp_us(timestamp) if timestamp else None
+
+        # Index of the screenshot taken after the packet (see assign_timeslots), None until the screenshots are known
+        self.slot = None
+
+        # The contents on one line, see summary
+        self.summary_line = None
+
+    # print_contents on a single line, for the table. Made the first time the row is shown: the view asks for it on every repaint
+    def summary(self):
+        if (self.summary_line is None):
+            lines = [line.strip() for line in self.print_contents().split("\n")]
+            self.summary_line = ", ".join(line for line in lines if line.strip("-"))
+        return self.summary_line
     
     def print_contents(self):
         # Generate more readable strings from the packet data
@@ -60,7 +78,7 @@ class Packet:
         return out_str
 
 
-def create_packet_objs(text):
+def create_packet_objs(parsed_packets):
     r"""out = []
     for line in lines:
         # remove extra whitespaces
@@ -82,20 +100,47 @@ def create_packet_objs(text):
         except IndexError:
             pass"""
 
-    parser = Parser()
-    packet_data = parser.parse_str(text).as_list()
-
     out = []
 
-    for packet in packet_data:
+    for packet in parsed_packets:
+        packet = packet.as_list()
         p = Packet(packet[1], packet[2], packet[3:])
         out.append(p)
 
 
     return out
 
-def convert_ts(ts):
-    return datetime.strptime(ts[:-1], '%H:%M:%S.%f').time()
+# Time of a screenshot in microseconds since midnight, from its file name (screenshot_2024-10-26_15-10-00.123.png)
+def screenshot_time_us(filename):
+    return capture_time_us(os.path.splitext(filename[11:])[0])
+
+# Same for the timestamps written by screenshots.py (2024-10-26_15-10-00.123)
+def capture_time_us(timestamp):
+    clock = timestamp.split("_")[1]
+    return timestamp_us(clock.replace("-", ":"))
+
+# Screenshot files and their times, sorted by time
+# Folders saved with deduplication have an index.csv with the time of every frame and the file showing it: consecutive frames showing the
+# same file are merged, keeping the time of the last one, so each packet is still shown the first screenshot taken after it
+def read_screenshots(folder):
+    index_path = os.path.join(folder, "index.csv")
+
+    if not os.path.exists(index_path):
+        # The folder also has the timing log written by screenshots.py
+        files = sorted(name for name in os.listdir(folder) if name.startswith("screenshot_"))
+        return files, [screenshot_time_us(name) for name in files]
+
+    files, times = [], []
+    with open(index_path) as index:
+        next(index)
+        for line in index:
+            timestamp, _, name = line.strip().partition(",")
+            if (files) and (files[-1] == name):
+                times[-1] = capture_time_us(timestamp)
+            else:
+                files.append(name)
+                times.append(capture_time_us(timestamp))
+    return files, times
 
 def search_timeslot(target, available_timestamps):
     # Binary search using bisect
@@ -111,6 +156,234 @@ def group_timestamps(timestamps, slots):
     t = groupby(timestamps, lambda x: search_timeslot(x, slots))
     return t
 
+# Sets packet.slot to search_timeslot(packet.time_us, available_times) for each packet
+# Packets are in order of time, so the slots are found with a single pass over the packets and the screenshots together
+def assign_timeslots(packets, available_times):
+    count = len(available_times)
+    index = 0
+    last = None
+
+    for packet in packets:
+        time_us = packet.time_us
+
+        # Only the first packet (or one going back in time) needs a search
+        if (last is None) or (time_us < last):
+            index = bisect_right(available_times, time_us)
+
+        while (index < count) and (available_times[index] <= time_us):
+            index += 1
+
+        packet.slot = index if index < count else -1
+        last = time_us
+
+# Table model backed directly by the packet list: text and colors are only computed for the rows the view asks for, so no Qt object
+# is created for each packet
+class PacketModel(QAbstractTableModel):
+    HEADERS = ('Timestamp', 'Type', 'Content')
+
+    FOREGROUNDS = (QColor('green'), QColor('blue'), QColor('black'))
+
+    # Rows in the same screenshot timeslot share a background, consecutive timeslots alternate between the two
+    BACKGROUNDS = (QColor(100, 100, 100, 100), QColor(200, 200, 200, 100))
+
+    def __init__(self, packets=(), parent=None):
+        super().__init__(parent)
+        self.packets = list(packets)
+
+        # Background of each row (an index in BACKGROUNDS), None without screenshots
+        self.available_times = []
+        self.shades = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.packets)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        packet = self.packets[index.row()]
+        column = index.column()
+
+        if (role == Qt.DisplayRole):
+            if (column == 0):
+                return packet.timestamp
+            if (column == 1):
+                return packet.ptype
+            # Rows have a fixed height, the content is shown on one line and in full in the tooltip
+            return packet.summary()
+
+        if (role == Qt.ToolTipRole) and (column == 2):
+            return packet.print_contents()
+
+        if (role == Qt.ForegroundRole):
+            return self.FOREGROUNDS[column]
+
+        # Rows added after the timeslots were computed have no background until they are computed again
+        if (role == Qt.BackgroundRole) and (self.shades is not None) and (index.row() < len(self.shades)):
+            return self.BACKGROUNDS[self.shades[index.row()]]
+
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if (role == Qt.DisplayRole) and (orientation == Qt.Horizontal):
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        # Not editable
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled
+
+    def set_packets(self, packets):
+        self.beginResetModel()
+        self.packets = list(packets)
+        self.shades = None
+        self.endResetModel()
+
+    # Adds packets at the end, used while a log is still loading
+    def append_packets(self, packets):
+        if (len(packets) == 0):
+            return
+
+        first = len(self.packets)
+        self.beginInsertRows(QModelIndex(), first, first + len(packets) - 1)
+        self.packets.extend(packets)
+        self.assign_slots(first)
+        self.endInsertRows()
+
+    # Colors the rows by the screenshot timeslot they belong to. available_times are the times of the screenshots (microseconds since
+    # midnight), sorted. Only the colors change, the rows are not built again
+    def set_slot_times(self, available_times):
+        self.available_times = available_times
+        self.shades = [] if available_times else None
+        self.assign_slots(0)
+
+        if (len(self.packets) > 0):
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.packets) - 1, len(self.HEADERS) - 1), [Qt.BackgroundRole])
+
+    # Timeslots and colors of the packets from first to the end
+    def assign_slots(self, first):
+        if (self.shades is None) or (first >= len(self.packets)):
+            return
+
+        packets = self.packets[first:]
+        assign_timeslots(packets, self.available_times)
+
+        shade = self.shades[-1] if self.shades else 0
+        current = self.packets[first - 1].slot if first > 0 else packets[0].slot
+
+        for packet in packets:
+            if (packet.slot != current):
+                shade = 1 - shade
+                current = packet.slot
+            self.shades.append(shade)
+
+# Scaled screenshots, least recently used first. The cache is bounded by the memory used by the pixmaps
+# Keys are (file path, width, height), so the same screenshot scaled for a different size is a different entry
+class PixmapCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.pixmaps = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.pixmaps
+
+    def get(self, key):
+        pixmap = self.pixmaps.get(key)
+        if (pixmap is not None):
+            self.pixmaps.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        if (key in self.pixmaps):
+            self.used_bytes -= self.pixmap_bytes(self.pixmaps.pop(key))
+
+        self.pixmaps[key] = pixmap
+        self.used_bytes += self.pixmap_bytes(pixmap)
+
+        while (self.used_bytes > self.max_bytes) and (len(self.pixmaps) > 1):
+            _, evicted = self.pixmaps.popitem(last=False)
+            self.used_bytes -= self.pixmap_bytes(evicted)
+
+    def clear(self):
+        self.pixmaps.clear()
+        self.used_bytes = 0
+
+    @staticmethod
+    def pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+# Screenshot read from disk and scaled to fit size. QImage is used since QPixmap can only be created on the GUI thread
+def load_scaled_image(path, size):
+    return QImage(path).scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+class PrefetchSignals(QObject):
+    # Cache key, scaled QImage
+    loaded = Signal(object, object)
+
+# Reads and scales a screenshot on a thread of the pool, the result is sent back to the GUI thread to be cached
+class PrefetchTask(QRunnable):
+    def __init__(self, key, size, signals):
+        super().__init__()
+        self.key = key
+        self.size = size
+        self.signals = signals
+
+    def run(self):
+        self.signals.loaded.emit(self.key, load_scaled_image(self.key[0], self.size))
+
+# Loads a log on a separate thread, so the window keeps working while it's parsed
+# Packets are sent to the window in batches as soon as they are parsed, together with the number of bytes of the log read so far
+# The load is stopped with requestInterruption, for example when another log is opened
+class LogLoader(QThread):
+    # New packets (a list of Packet objects)
+    packets_loaded = Signal(object)
+    # Bytes of the log read so far, size of the log
+    progress = Signal(object, object)
+    # Message of the error that stopped the load
+    failed = Signal(str)
+
+    # A batch is sent when it has this many packets or when this many seconds have passed since the last one
+    BATCH_SIZE = 5000
+    BATCH_INTERVAL = 0.1
+
+    def __init__(self, filepath, parent=None):
+        super().__init__(parent)
+        self.filepath = filepath
+        self.error = None
+
+    def run(self):
+        # The parsed packets are cached next to the log, opening it again only parses the lines added since the last time
+        try:
+            size = os.path.getsize(self.filepath)
+            packets = ParsedLogCache(self.filepath).stream(lambda done: self.progress.emit(done, size))
+
+            batch = []
+            last = monotonic()
+            for packet in packets:
+                batch.append(packet)
+
+                if (len(batch) >= self.BATCH_SIZE) or (monotonic() - last > self.BATCH_INTERVAL):
+                    if self.isInterruptionRequested():
+                        # Closing the generator stops the parse, the cache is not written
+                        packets.close()
+                        return
+                    self.packets_loaded.emit(create_packet_objs(batch))
+                    batch = []
+                    last = monotonic()
+
+            self.packets_loaded.emit(create_packet_objs(batch))
+        except Exception as error:
+            # Any error (missing log, corrupt cache, parse error...) is reported, the thread would end silently otherwise
+            self.error = error
+            self.failed.emit(f"{type(error).__name__}: {error}")
+
+# Number of screenshots before and after the selected one that are loaded in the background
+PREFETCH_DISTANCE = 3
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -140,6 +413,18 @@ class MainWindow(QMainWindow):
         self.image_label.setStyleSheet("background-color: white;")
         splitter.addWidget(self.image_label)
 
+        # Screenshots already scaled to the size of the label. The ones next to the selected one are loaded in the background, so moving
+        # through the packets doesn't have to wait for the disk and the scaling
+        self.pixmap_cache = PixmapCache()
+        self.prefetching = set()
+        self.prefetch_pool = QThreadPool(self)
+        self.prefetch_pool.setMaxThreadCount(2)
+        self.prefetch_signals = PrefetchSignals()
+        self.prefetch_signals.loaded.connect(self.on_screenshot_prefetched)
+
+        # The cached pixmaps have the size of the label, they are thrown away when it's resized
+        self.image_label.installEventFilter(self)
+
         # Set the splitter as the central widget's layout
         layout = QHBoxLayout()
         layout.addWidget(splitter)
@@ -170,18 +455,54 @@ class MainWindow(QMainWindow):
         # must be initialized to avoid a crash when opening a log file before a screenshot folder
         self.available_times = []
 
-    def on_packet_selected(self, selected_time):        
-        if (self.screenshot_folder and self.available_timestamps):
-            i = search_timeslot(selected_time, self.available_times)
+        # Thread loading the current log, if any
+        self.loader = None
+
+    def on_packet_selected(self, packet):
+        if (self.screenshot_folder and self.available_timestamps) and (packet.slot is not None):
+            self.show_screenshot(packet.slot % len(self.available_timestamps))
+
+    def screenshot_key(self, n):
+        size = self.image_label.size()
+        return (f"{self.screenshot_folder}/{self.available_timestamps[n]}", size.width(), size.height())
+
+    def show_screenshot(self, n):
+        key = self.screenshot_key(n)
+
+        pixmap = self.pixmap_cache.get(key)
+        if (pixmap is None):
+            pixmap = QPixmap.fromImage(load_scaled_image(key[0], self.image_label.size()))
+            self.pixmap_cache.put(key, pixmap)
+
+        self.image_label.setPixmap(pixmap)
+        self.prefetch_screenshots(n)
+
+    # Starts loading the screenshots around the n-th one that are not cached yet, the closest first
+    def prefetch_screenshots(self, n, distance=PREFETCH_DISTANCE):
+        for offset in range(1, distance + 1):
+            for neighbour in (n + offset, n - offset):
+                if not (0 <= neighbour < len(self.available_timestamps)):
+                    continue
+
+                key = self.screenshot_key(neighbour)
+                if (key in self.pixmap_cache) or (key in self.prefetching):
+                    continue
 
-            self.pixmap = QPixmap(f"{self.screenshot_folder}/{self.available_timestamps[i]}")
+                self.prefetching.add(key)
+                self.prefetch_pool.start(PrefetchTask(key, self.image_label.size(), self.prefetch_signals))
 
-            self.scaled_pixmap = self.pixmap.scaled(
-            self.image_label.size(), 
-            Qt.KeepAspectRatio, 
-            Qt.SmoothTransformation
-            )
-            self.image_label.setPixmap(self.scaled_pixmap)
+    def on_screenshot_prefetched(self, key, image):
+        self.prefetching.discard(key)
+
+        # Images scaled for a size the label doesn't have anymore are not needed
+        size = self.image_label.size()
+        if (key[1:] == (size.width(), size.height())):
+            self.pixmap_cache.put(key, QPixmap.fromImage(image))
+
+    def eventFilter(self, watched, event):
+        if (watched is self.image_label) and (event.type() == QEvent.Resize):
+            self.pixmap_cache.clear()
+        return super().eventFilter(watched, event)
 
     def open_log_file(self):
         # Open a file dialog to select the log file
@@ -192,16 +513,56 @@ class MainWindow(QMainWindow):
             "Log Files (*.log);;All Files (*)"
         )
         if file_path:
-            # Parse the log file and update the package list
             self.parse_log_file(file_path)
-            self.log_widget.update_packets(self.packets)
-    
+
+    # Starts loading a log in the background, stopping the one that was loading. The table is filled while the log is parsed
     def parse_log_file(self, filepath):
-        with open(filepath, "r") as file:
-            #lines = file.readlines()
-            text = file.read()
-        packets = create_packet_objs(text)
-        self.packets = packets
+        self.cancel_loading()
+
+        self.log_widget.update_packets([])
+        self.packets = self.log_widget.model.packets
+
+        self.loader = LogLoader(filepath, self)
+        self.loader.packets_loaded.connect(self.on_packets_loaded)
+        self.loader.progress.connect(self.on_load_progress)
+        self.loader.failed.connect(self.on_load_failed)
+        self.loader.finished.connect(self.on_load_finished)
+        self.loader.finished.connect(self.loader.deleteLater)
+        self.loader.start()
+
+    def cancel_loading(self):
+        if (self.loader is not None):
+            self.loader.requestInterruption()
+            self.loader.wait()
+            self.loader = None
+
+    # The slots below ignore signals still queued by a loader that was cancelled
+    def on_packets_loaded(self, packets):
+        if (self.sender() is self.loader):
+            self.log_widget.model.append_packets(packets)
+
+    def on_load_progress(self, done, total):
+        if (self.sender() is self.loader):
+            self.statusBar().showMessage(f"Loading {os.path.basename(self.loader.filepath)}: {done / 1e6:.1f} / {total / 1e6:.1f} MB")
+
+    def on_load_failed(self, message):
+        if (self.sender() is self.loader):
+            self.statusBar().showMessage(f"Error loading {self.loader.filepath}: {message}")
+
+    def on_load_finished(self):
+        if (self.sender() is not self.loader):
+            return
+
+        # The error is already shown by on_load_failed
+        if (self.loader.error is None):
+            self.statusBar().showMessage(f"{len(self.packets)} packets loaded from {os.path.basename(self.loader.filepath)}")
+        self.loader = None
+
+    def closeEvent(self, event):
+        self.cancel_loading()
+        self.prefetch_pool.clear()
+        self.prefetch_pool.waitForDone()
+        super().closeEvent(event)
 
     def select_screenshot_folder(self):
         # Open a dialog to select the screenshot folder
@@ -212,16 +573,15 @@ class MainWindow(QMainWindow):
         )
         if folder_path:
             self.screenshot_folder = folder_path
-            self.available_timestamps = os.listdir(self.screenshot_folder)
-            self.available_timestamps = sorted(self.available_timestamps)
-            self.available_times = [datetime.strptime(ts.split(".")[0][11:], '%Y-%m-%d_%H-%M-%S').time() for ts in self.available_timestamps]
-            if (self.packets != []):
-                self.log_widget.update_packets(self.packets)
+            self.available_timestamps, self.available_times = read_screenshots(self.screenshot_folder)
+            self.log_widget.model.set_slot_times(self.available_times)
 
 class LogWidget(QWidget):
     def __init__(self, packets=None):
         super().__init__()
 
+        self.parent_window = None
+
         # Set background color
         self.setStyleSheet("background-color: white;")
 
@@ -233,11 +593,16 @@ class LogWidget(QWidget):
         self.table_view = QTableView()
         layout.addWidget(self.table_view)
 
-        # Create a QStandardItemModel with 3 columns: Timestamp, Type, Content
-        self.model = QStandardItemModel()
-        self.model.setHorizontalHeaderLabels(['Timestamp', 'Type', 'Content'])
+        # The model reads the packets directly, rows are only rendered when they are visible
+        self.model = PacketModel()
         self.table_view.setModel(self.model)
 
+        # Every row has the same height, so the view never has to measure the rows
+        self.table_view.setWordWrap(False)
+        vertical_header = self.table_view.verticalHeader()
+        vertical_header.setSectionResizeMode(QHeaderView.Fixed)
+        vertical_header.setDefaultSectionSize(self.table_view.fontMetrics().height() + 6)
+
         # Set relative widths for columns (e.g., Timestamp: 1, Type: 1, Content: 3)
         header = self.table_view.horizontalHeader()
 
@@ -262,51 +627,11 @@ class LogWidget(QWidget):
             self.update_packets(packets)
 
     def update_packets(self, packets):
-        # Clear existing data
-        self.model.removeRows(0, self.model.rowCount())
-
-        # if timeslots are available, keep track of a few variables for the highlighting process
-        if (len(self.parent_window.available_times) > 0):
-            cols = [(100, 100, 100, 100), (200, 200, 200, 100)]
-            ci = 0
-            cts = search_timeslot(convert_ts(packets[0].timestamp), self.parent_window.available_times)
+        self.model.set_packets(packets)
 
-        for packet in packets:
-            # Create items for each column
-            timestamp_item = QStandardItem(packet.timestamp)
-            type_item = QStandardItem(packet.ptype)
-            content_item = QStandardItem(packet.print_contents())
-
-            # Set text colors
-            timestamp_item.setForeground(QColor('green'))
-            type_item.setForeground(QColor('blue'))
-            content_item.setForeground(QColor('black'))
-
-            # Disable editing for each item
-            flags = Qt.ItemIsSelectable | Qt.ItemIsEnabled
-            timestamp_item.setFlags(flags)
-            type_item.setFlags(flags)
-            content_item.setFlags(flags)
-
-            # if timeslots are available, do the highlighting
-            if (len(self.parent_window.available_times) > 0):
-                ts = search_timeslot(convert_ts(packet.timestamp), self.parent_window.available_times)
-
-                if (ts != cts):
-                    ci += 1
-                    ci %= 2
-                    cts = ts
-        
-                timestamp_item.setBackground(QColor(*cols[ci]))
-                type_item.setBackground(QColor(*cols[ci]))
-                content_item.setBackground(QColor(*cols[ci]))
-
-            # Add items to the model
-            self.model.appendRow([timestamp_item, type_item, content_item])
-
-        # Allow wordrapping and adjust horizontal size to match
-        self.table_view.setWordWrap(True)
-        self.table_view.resizeRowsToContents()
+        # if timeslots are available, highlight the rows of each timeslot
+        available_times = self.parent_window.available_times if self.parent_window else []
+        self.model.set_slot_times(available_times)
 
     def on_row_selected(self, index):
         # Get the selected packet
@@ -315,18 +640,12 @@ class LogWidget(QWidget):
             return
         packet = self.get_packet_from_row(row)
         if packet and (packet.timestamp != ""):
-            selected_time = datetime.strptime(packet.timestamp[:-1], '%H:%M:%S.%f').time()
-            self.parent_window.on_packet_selected(selected_time)
+            self.parent_window.on_packet_selected(packet)
 
     def get_packet_from_row(self, row):
-        # Retrieve packet data from the model
-        try:
-            timestamp = self.model.item(row, 0).text()
-            packet_type = self.model.item(row, 1).text()
-            content = self.model.item(row, 2).text()
-            return Packet(timestamp, packet_type, content)
-        except AttributeError:
-            return Packet("", "", "")
+        if (0 <= row < len(self.model.packets)):
+            return self.model.packets[row]
+        return Packet("", "", "")
 
 
 # run the application if the code is ran as main
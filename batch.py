@@ -0,0 +1,243 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+from log_cache import parse_log
+from packets import GetPacketList
+from entities import GetEntityList, FindByTags
+from games import SplitGames
+from utils import CardDB, CARD_DATA_PATH
+
+# Summary of every game in a set of archived logs, one row per game
+# Each log is parsed (through the parse cache, see log_cache.py) and replayed by a worker process, which only sends back the rows, so the
+# games never have to be kept in memory all at once. Rows are written as soon as a log is done, in the order the logs finish
+#
+# Usage: python batch.py "logs/*.log" -o games.csv --jobs 4
+
+COLUMNS = ("log", "game", "start", "end", "player", "hero", "placement", "turns", "board")
+
+# Player names by player id, from the PlayerID packets of a game
+# The parser sometimes takes the first PlayerID line as part of CREATE_GAME, leaving one player without a name. That player gets the
+# BattleTag used by the tag changes (TAG_CHANGE Entity=Name#1234) if it's the only one
+def player_names(packets):
+    names = {}
+    player_ids = set()
+    battletags = set()
+
+    for packet in packets:
+        if (packet.command == "PlayerID"):
+            names[packet.id] = packet.name
+        elif (packet.command == "CREATE_GAME"):
+            player_ids.update(tags["PLAYER_ID"] for tags in (packet.p1_tags, packet.p2_tags) if "PLAYER_ID" in tags)
+        elif (packet.command == "TAG_CHANGE") and ("#" in packet.id_tags.get("Entity", "")):
+            battletags.add(packet.id_tags["Entity"])
+
+    unnamed = player_ids - set(names)
+    battletags -= set(names.values())
+    if (len(unnamed) == 1) and (len(battletags) == 1):
+        names[unnamed.pop()] = battletags.pop()
+
+    return names
+
+# Opponents in Battlegrounds are played by the game (BaconShop, Bob's Tavern...): the local player is the one with a BattleTag
+# The names usually come from the PlayerID packets, which arrive after the player entities are created. Returns the player and its name,
+# or None if no player has a BattleTag
+# The first match is used: PowerTaskList creates the players again, but the tag changes always go to the ones created first
+def local_player(entities, names):
+    for n, player in FindByTags(["CARDTYPE"], ["PLAYER"], entities):
+        name = player["Entity"] or names.get(player["PLAYER_ID"]) or ""
+        if ("#" in name):
+            return player, name
+    return None
+
+def entity_by_id(entity_id, entities):
+    # Querying None would find the entities without an id
+    if (entity_id is None):
+        return None
+    found = FindByTags(["ENTITY_ID"], [entity_id], entities)
+    return found[-1][1] if found else None
+
+# Entities without a card id (hidden ones) have an empty name
+def card_name(card_id, cards):
+    if (card_id is None):
+        return ""
+    card = cards.get(card_id)
+    return card.get("name", card_id) if card else card_id
+
+def card_id(entity):
+    return entity["CardID"] or entity["cardId"]
+
+def zone_position(entity):
+    position = entity["ZONE_POSITION"] or ""
+    return int(position) if position.isdigit() else 0
+
+# The row for a game, from the state of its entities at the end and the player names of the game
+def game_row(entities, cards, names):
+    row = {"player": None, "hero": None, "placement": None, "turns": None, "board": ""}
+
+    # Like the players, the game entity is created twice and only the first one is updated
+    games = FindByTags(["CARDTYPE"], ["GAME"], entities)
+    if (games):
+        row["turns"] = games[0][1]["TURN"]
+
+    found = local_player(entities, names)
+    if (found is None):
+        return row
+    player, row["player"] = found
+
+    hero = entity_by_id(player["HERO_ENTITY"], entities)
+    if (hero is not None):
+        row["hero"] = card_name(card_id(hero), cards)
+        row["placement"] = hero["PLAYER_LEADERBOARD_PLACE"]
+
+    board = FindByTags(["ZONE", "CARDTYPE", "CONTROLLER"], ["PLAY", "MINION", player["PLAYER_ID"]], entities)
+    board.sort(key=lambda item: zone_position(item[1]))
+    row["board"] = "|".join(card_name(card_id(minion), cards) for n, minion in board)
+
+    return row
+
+# Runs in the worker processes: the rows for all the games in a log
+def summarize_log(args):
+    path, card_path, use_cache = args
+    # Without card data the rows have the card ids instead of the names
+    cards = CardDB.load(card_path) if card_path else CardDB([])
+
+    packets = GetPacketList(parse_log(path, use_cache=use_cache))
+
+    rows = []
+    for n, segment in enumerate(SplitGames(packets)):
+        entities = GetEntityList(segment, indexes=["CARDTYPE", "ZONE"])
+
+        row = {"log": path, "game": n, "start": segment[0].timestamp, "end": segment[-1].timestamp}
+        row.update(game_row(entities, cards, player_names(segment)))
+        rows.append(row)
+
+    return rows
+
+# Logs matching the arguments: directories are searched (not recursively) for .log files, anything else is a glob pattern
+def find_logs(patterns):
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(sorted(glob.glob(os.path.join(pattern, "*.log"))))
+        else:
+            paths.extend(sorted(glob.glob(pattern)))
+    return paths
+
+
+# Writes the rows as csv
+class CsvWriter:
+    def __init__(self, file):
+        self.writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        pass
+
+# Writes the rows as a parquet file, a row group every batch rows. Needs pyarrow
+class ParquetWriter:
+    def __init__(self, path, batch=1000):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([(column, pyarrow.int64() if column == "game" else pyarrow.string()) for column in COLUMNS])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+        self.batch = batch
+        self.rows = []
+
+    def write(self, rows):
+        self.rows.extend(rows)
+        if (len(self.rows) >= self.batch):
+            self.flush()
+
+    def flush(self):
+        if (self.rows):
+            columns = {column: [row[column] for row in self.rows] for column in COLUMNS}
+            self.writer.write_table(self.pyarrow.table(columns, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="One row per game for a set of Power.log files")
+    parser.add_argument("logs", nargs="+", help="directories or glob patterns of .log files")
+    parser.add_argument("-o", "--output", help="output file, csv on stdout if not given")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="output format, from the extension of the output file by default")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--cards", default=CARD_DATA_PATH)
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the parse caches")
+    args = parser.parse_args()
+
+    paths = find_logs(args.logs)
+    if (len(paths) == 0):
+        parser.error("no log files found")
+
+    output_format = args.format or ("parquet" if (args.output or "").endswith(".parquet") else "csv")
+
+    if (output_format == "parquet"):
+        if (args.output is None):
+            parser.error("parquet output needs an output file")
+        try:
+            writer = ParquetWriter(args.output)
+        except ImportError:
+            parser.error("parquet output needs pyarrow")
+        file = None
+    else:
+        file = open(args.output, "w", newline="") if args.output else sys.stdout
+        writer = CsvWriter(file)
+
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    done_bytes = 0
+    games = 0
+    t0 = perf_counter()
+
+    # Checked once here, instead of every worker complaining about it
+    card_path = args.cards
+    if not os.path.exists(card_path):
+        print(f"Card data file {card_path} not found, card ids are used instead of names. Try running download-info.py in the json-data folder",
+              file=sys.stderr)
+        card_path = None
+
+    tasks = [(path, card_path, not args.no_cache) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(summarize_log, task): task[0] for task in tasks}
+
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                rows = future.result()
+            except Exception as error:
+                print(f"{path}: {error}", file=sys.stderr)
+                rows = []
+
+            writer.write(rows)
+            if (file is not None):
+                file.flush()
+
+            done_bytes += os.path.getsize(path)
+            games += len(rows)
+            elapsed = perf_counter() - t0
+
+            print(f"[{done}/{len(paths)}] {done_bytes / 1e6:.1f}/{total_bytes / 1e6:.1f} MB, {games} games, "
+                  f"{done_bytes / 1e6 / elapsed:.2f} MB/s, {games / elapsed:.2f} games/s", file=sys.stderr)
+
+    writer.close()
+    if (file is not None) and (file is not sys.stdout):
+        file.close()
+
+
+if __name__ == "__main__":
+    main()
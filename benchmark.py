@@ -0,0 +1,365 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+
+from parser_lib import Parser
+from packets import GetPacketList
+from entities import GetEntityList
+from history import GameHistory, TagTimelines
+from log_cache import parse_log
+from parallel import GetPacketListParallel
+from utils import CardDB, CARD_DATA_PATH
+import card_cache
+import metrics
+import synthetic_log
+
+# Benchmarks for the slower parts of the tools. Each one is a subcommand taking the path of a log (usually a full game)
+
+def load_packets(path):
+    with open(path) as file:
+        return GetPacketList(Parser("tokenizer").iter_packets(file))
+
+# Returns mean and 95th percentile of a list of times, in milliseconds
+def summary(times):
+    times = sorted(times)
+    return 1000 * sum(times) / len(times), 1000 * times[int(0.95 * (len(times) - 1))]
+
+# Random access to the state of the game: GameHistory with different checkpoint intervals against replaying from the start
+def bench_snapshots(args):
+    packets = load_packets(args.log)
+    rnd = random.Random(0)
+    targets = [rnd.randrange(len(packets)) for _ in range(args.lookups)]
+
+    print(f"{len(packets)} packets, {args.lookups} random lookups")
+
+    times = []
+    for n in targets[:10]:
+        t0 = perf_counter()
+        GetEntityList(packets[:n + 1])
+        times.append(perf_counter() - t0)
+    mean, p95 = summary(times)
+    print(f"replay from start:\tmean {mean:.2f} ms\tp95 {p95:.2f} ms")
+
+    for interval in args.intervals:
+        t0 = perf_counter()
+        history = GameHistory(packets, interval=interval)
+        build = perf_counter() - t0
+
+        # tracemalloc slows everything down, so memory is measured on a separate run
+        tracemalloc.start()
+        measured = GameHistory(packets, interval=interval)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del measured
+
+        times = []
+        for n in targets:
+            t0 = perf_counter()
+            history.state_at(n)
+            times.append(perf_counter() - t0)
+        mean, p95 = summary(times)
+
+        print(f"interval {interval}:\tmean {mean:.2f} ms\tp95 {p95:.2f} ms\tbuild {build:.2f} s\tmemory {memory / 1e6:.1f} MB")
+
+# Value of a single tag at a random point of the game: TagTimelines against GameHistory and replaying from the start
+def bench_timelines(args):
+    packets = load_packets(args.log)
+
+    t0 = perf_counter()
+    timelines = TagTimelines(packets)
+    build = perf_counter() - t0
+
+    report = timelines.memory_report()
+    print(f"{len(packets)} packets, build {build:.2f} s")
+    print(f"{report["entities"]} entities, {report["timelines"]} timelines, {report["entries"]} entries, {report["values"]} distinct values")
+    print(f"memory {report["total_bytes"] / 1e6:.2f} MB (arrays {report["array_bytes"] / 1e6:.2f} MB, tables {report["table_bytes"] / 1e6:.2f} MB, "
+          f"value pool {report["pool_bytes"] / 1e6:.2f} MB), {report["bytes_per_entry"]:.0f} bytes per entry")
+
+    # Random (entity, tag, packet) lookups, on entities that already exist at that packet
+    rnd = random.Random(0)
+    entities = timelines.entities
+    lookups = []
+    while (len(lookups) < args.lookups):
+        n = rnd.randrange(len(packets))
+        entity = entities[rnd.randrange(len(entities))]
+        tag = rnd.choice(args.tags)
+        if (timelines.timeline(entity, tag) is not None) and (timelines.timeline(entity, tag)[0][0] <= n):
+            lookups.append((entity.positions[0], tag, n))
+
+    times = []
+    for key, tag, n in lookups:
+        t0 = perf_counter()
+        timelines.value_at(key, tag, n)
+        times.append(perf_counter() - t0)
+    mean, p95 = summary(times)
+    print(f"value_at:\t\tmean {1000 * mean:.2f} us\tp95 {1000 * p95:.2f} us")
+
+    history = GameHistory(packets, interval=args.interval)
+    times = []
+    mismatches = 0
+    for key, tag, n in lookups:
+        t0 = perf_counter()
+        value = history.state_at(n)[key][tag]
+        times.append(perf_counter() - t0)
+        mismatches += (value != timelines.value_at(key, tag, n))
+    mean, p95 = summary(times)
+    print(f"state_at (interval {args.interval}):\tmean {mean:.2f} ms\tp95 {p95:.2f} ms")
+
+    times = []
+    for key, tag, n in lookups[:10]:
+        t0 = perf_counter()
+        value = GetEntityList(packets[:n + 1])[key][tag]
+        times.append(perf_counter() - t0)
+        mismatches += (value != timelines.value_at(key, tag, n))
+    mean, p95 = summary(times)
+    print(f"replay from start:\tmean {mean:.2f} ms\tp95 {p95:.2f} ms")
+
+    print("same values" if mismatches == 0 else f"{mismatches} DIFFERENT VALUES")
+
+# Stages of the pipeline measured by the suite, each one run on the output of the previous ones
+STAGES = ("parse_str", "GetPacketList", "GetEntityList")
+
+# Peak resident memory of the process so far, in MB
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Runs in a new process, so the peak memory only comes from this stage and the ones it needs. Returns time and memory of the stage
+def run_stage(path, stage, backend):
+    with open(path) as file:
+        data = file.read()
+
+    steps = {
+        "parse_str": lambda data: Parser(backend).parse_str(data),
+        "GetPacketList": GetPacketList,
+        "GetEntityList": GetEntityList,
+    }
+
+    result = data
+    for name in STAGES[:STAGES.index(stage)]:
+        result = steps[name](result)
+
+    rss_before = peak_rss()
+    t0 = perf_counter()
+    steps[stage](result)
+    elapsed = perf_counter() - t0
+
+    return {"seconds": elapsed, "peak_rss_mb": peak_rss(), "rss_increase_mb": peak_rss() - rss_before}
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Parser, packet and entity stages on synthetic logs of different sizes (or on given logs), with the results saved as json
+def bench_suite(args):
+    logs = []
+    folder = tempfile.TemporaryDirectory()
+
+    for size in args.sizes:
+        path = os.path.join(folder.name, f"synthetic_{size:g}MB.log")
+        with open(path, "w") as file:
+            synthetic_log.write_log(file, size * 1e6, seed=args.seed)
+        logs.append(path)
+    logs.extend(args.logs)
+
+    results = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "backend": args.backend,
+        "logs": [],
+    }
+
+    # A new process for every stage, started from scratch so that nothing is shared between the measures
+    context = multiprocessing.get_context("spawn")
+
+    for path in logs:
+        size = os.path.getsize(path)
+        with open(path) as file:
+            lines = sum(1 for _ in file)
+
+        log = {"log": os.path.basename(path), "bytes": size, "lines": lines, "stages": {}}
+        print(f"{log["log"]}: {size / 1e6:.1f} MB, {lines} lines")
+
+        for stage in STAGES:
+            with context.Pool(1) as pool:
+                measure = pool.apply(run_stage, (path, stage, args.backend))
+
+            measure["lines_per_second"] = lines / measure["seconds"]
+            measure["mb_per_second"] = size / 1e6 / measure["seconds"]
+            log["stages"][stage] = measure
+
+            print(f"\t{stage}:\t{measure["seconds"]:.2f} s\t{measure["lines_per_second"]:.0f} lines/s\t{measure["mb_per_second"]:.2f} MB/s\t"
+                  f"peak RSS {measure["peak_rss_mb"]:.0f} MB (+{measure["rss_increase_mb"]:.0f} MB)")
+
+        results["logs"].append(log)
+
+    folder.cleanup()
+
+    if (args.output):
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Results saved to {args.output}")
+
+    if (args.compare):
+        compare_results(args.compare, results)
+
+# Prints the speed of each stage against a previous run of the suite, for the logs with the same name
+def compare_results(path, results):
+    with open(path) as file:
+        previous = {log["log"]: log for log in json.load(file)["logs"]}
+
+    print(f"Compared to {path}:")
+    for log in results["logs"]:
+        if (log["log"] not in previous):
+            continue
+        for stage, measure in log["stages"].items():
+            old = previous[log["log"]]["stages"].get(stage)
+            if (old):
+                print(f"\t{log["log"]} {stage}:\t{old["seconds"] / measure["seconds"]:.2f}x speed\t"
+                      f"{measure["peak_rss_mb"] - old["peak_rss_mb"]:+.0f} MB peak RSS")
+
+# Time needed to open the card data and to look up cards: json against the binary cache
+def bench_cards(args):
+    if not card_cache.is_fresh(args.cards):
+        card_cache.build_cache(args.cards)
+
+    for name, use_cache in (("json", False), ("cache", True)):
+        CardDB.loaded.clear()
+
+        t0 = perf_counter()
+        db = CardDB.load(args.cards, use_cache=use_cache)
+        startup = perf_counter() - t0
+
+        ids = [card["id"] for card in db.find_by_tier(1)][:7]
+
+        # A full board, looked up again and again
+        t0 = perf_counter()
+        for _ in range(args.lookups):
+            for id in ids:
+                db.get(id)
+        lookup = (perf_counter() - t0) / (args.lookups * max(len(ids), 1))
+
+        print(f"{name}:\tstartup {1000 * startup:.2f} ms\tlookup {1e6 * lookup:.2f} us\t{len(db)} cards")
+
+    CardDB.loaded.clear()
+
+# Parallel parsing with different numbers of workers, against the serial parse_str + GetPacketList
+def bench_parse(args):
+    with open(args.log) as file:
+        data = file.read()
+
+    t0 = perf_counter()
+    serial = GetPacketList(Parser(args.backend).parse_str(data))
+    serial_time = perf_counter() - t0
+    print(f"serial:\t\t{serial_time:.2f} s\t{len(serial)} packets")
+
+    for workers in args.workers:
+        t0 = perf_counter()
+        packets = GetPacketListParallel(data, workers=workers, backend=args.backend)
+        elapsed = perf_counter() - t0
+
+        same = ([packet.field_values() for packet in packets] == [packet.field_values() for packet in serial])
+        print(f"{workers} workers:\t{elapsed:.2f} s\tspeedup {serial_time / elapsed:.2f}x\t{"same output" if same else "DIFFERENT OUTPUT"}")
+
+# Memory used by the packet objects and by the entities of a whole game
+def bench_memory(args):
+    # The log is streamed, so what is left at the end is the memory kept by the packets, strings included
+    tracemalloc.start()
+    packets = load_packets(args.log)
+    packets_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    entities = GetEntityList(packets)
+    entities_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"packets:\t{len(packets)}\t{packets_memory / 1e6:.2f} MB\t{packets_memory / len(packets):.0f} bytes per packet")
+    print(f"entities:\t{len(entities)}\t{entities_memory / 1e6:.2f} MB\t{entities_memory / max(len(entities), 1):.0f} bytes per entity")
+
+# Counters and timers of the whole pipeline on a log (packets per command, time per tokenizer rule and per packet handler, entity lookups,
+# cache hits), optionally under cProfile
+def bench_metrics(args):
+    def run():
+        packets = GetPacketList(parse_log(args.log, use_cache=not args.no_cache))
+        return packets, GetEntityList(packets)
+
+    collected = metrics.enable()
+    try:
+        if (args.profile):
+            with metrics.profile(args.profile if args.profile != "-" else None):
+                packets, entities = run()
+        else:
+            packets, entities = run()
+    finally:
+        metrics.disable()
+
+    print(f"{len(packets)} packets, {len(entities)} entities")
+    collected.print_report()
+
+    if (args.output):
+        collected.export_json(args.output)
+        print(f"Metrics saved to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the log parsing tools")
+    subparsers = parser.add_subparsers(required=True)
+
+    snapshots = subparsers.add_parser("snapshots", help="random access latency of GameHistory.state_at")
+    snapshots.add_argument("log")
+    snapshots.add_argument("--lookups", type=int, default=200)
+    snapshots.add_argument("--intervals", type=int, nargs="+", default=[100, 1000, 10000])
+    snapshots.set_defaults(func=bench_snapshots)
+
+    timelines = subparsers.add_parser("timelines", help="single tag lookups with TagTimelines, GameHistory and replay, and memory used")
+    timelines.add_argument("log")
+    timelines.add_argument("--lookups", type=int, default=1000)
+    timelines.add_argument("--interval", type=int, default=1000, help="checkpoint interval of GameHistory")
+    timelines.add_argument("--tags", nargs="+", default=["ZONE", "ATK", "HEALTH", "CONTROLLER", "ZONE_POSITION"])
+    timelines.set_defaults(func=bench_timelines)
+
+    cards = subparsers.add_parser("cards", help="startup time of the card data, json against the binary cache")
+    cards.add_argument("--cards", default=CARD_DATA_PATH)
+    cards.add_argument("--lookups", type=int, default=1000)
+    cards.set_defaults(func=bench_cards)
+
+    parse = subparsers.add_parser("parse", help="scaling of the parallel parser with the number of workers")
+    parse.add_argument("log")
+    parse.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parse.add_argument("--backend", choices=["pyparsing", "tokenizer"], default="pyparsing")
+    parse.set_defaults(func=bench_parse)
+
+    memory = subparsers.add_parser("memory", help="bytes per packet object and per entity")
+    memory.add_argument("log")
+    memory.set_defaults(func=bench_memory)
+
+    suite = subparsers.add_parser("suite", help="parse_str, GetPacketList and GetEntityList on synthetic logs, results saved as json")
+    suite.add_argument("logs", nargs="*", help="real logs to measure as well")
+    suite.add_argument("--sizes", type=float, nargs="*", default=[1, 5, 20], help="sizes of the synthetic logs, in MB")
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--backend", choices=["pyparsing", "tokenizer"], default="tokenizer")
+    suite.add_argument("-o", "--output", help="json file for the results")
+    suite.add_argument("--compare", help="json file of a previous run to compare with")
+    suite.set_defaults(func=bench_suite)
+
+    measure = subparsers.add_parser("metrics", help="counters and timers of the parsing pipeline, optionally under cProfile")
+    measure.add_argument("log")
+    measure.add_argument("--no-cache", action="store_true", help="parse the log even if it has a cache")
+    measure.add_argument("-o", "--output", help="json file for the metrics")
+    measure.add_argument("--profile", help="file for the cProfile stats, - to print them")
+    measure.set_defaults(func=bench_metrics)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from bisect import bisect_left
+
+# Compact binary version of the card data json, read through mmap so that opening it doesn't need to parse anything
+#
+# Layout of the file:
+#   header      magic, format version, size/mtime/sha1 of the json it was built from, offsets of the other sections
+#   records     one fixed size record per card, sorted by card id
+#   dbf index   record numbers sorted by dbfId
+#   pool        strings (ids, names, list of races) and the cards themselves as compact json, only decoded when a card is requested
+#
+# The header is used to detect a stale cache: if the json changed since the cache was built, the cache is built again
+
+MAGIC = b"HSCD"
+VERSION = 2
+
+# magic, version, json size, json mtime, json sha1, cards, dbf entries, records offset, dbf offset, pool offset, races offset, races length
+HEADER = struct.Struct("<4sIQQ20sIIIIIII")
+# id offset, id length, name offset, name length, card offset, card length, dbfId, tier, races bitmask, position in the json
+RECORD = struct.Struct("<IHIHIIiBII")
+DBF_ENTRY = struct.Struct("<I")
+
+# Tier of the cards without a techLevel (tier 0 is a real one)
+NO_TIER = 255
+
+def cache_path(json_path):
+    return os.path.splitext(json_path)[0] + ".bin"
+
+def file_hash(path):
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).digest()
+
+def card_races(card):
+    # Newer cards can have more than one race
+    return card.get("races", [card["race"]] if "race" in card else [])
+
+# Writes the binary cache for a json card dump. cards can be passed if the json has already been loaded
+def build_cache(json_path, cards=None):
+    if (cards is None):
+        with open(json_path) as file:
+            cards = json.load(file)
+
+    stat = os.stat(json_path)
+    # The position in the json is kept, so the cards found by race, tier or name come in the same order as with utils.CardDB
+    order = sorted(range(len(cards)), key=lambda n: cards[n]["id"])
+    cards = [cards[n] for n in order]
+
+    races = sorted({race for card in cards for race in card_races(card)})
+    race_bits = {race: 1 << n for n, race in enumerate(races)}
+
+    pool = bytearray()
+
+    def add_string(data):
+        offset = len(pool)
+        pool.extend(data)
+        return offset, len(data)
+
+    records = bytearray()
+    for card, position in zip(cards, order):
+        id_offset, id_length = add_string(card["id"].encode("utf-8"))
+        name_offset, name_length = add_string(card.get("name", "").encode("utf-8"))
+        card_offset, card_length = add_string(json.dumps(card, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+        mask = 0
+        for race in card_races(card):
+            mask |= race_bits[race]
+
+        records += RECORD.pack(id_offset, id_length, name_offset, name_length, card_offset, card_length,
+                               card.get("dbfId", -1), card.get("techLevel", NO_TIER), mask, position)
+
+    races_offset, races_length = add_string(json.dumps(races).encode("utf-8"))
+
+    dbf_order = sorted((n for n, card in enumerate(cards) if "dbfId" in card), key=lambda n: cards[n]["dbfId"])
+    dbf_index = b"".join(DBF_ENTRY.pack(n) for n in dbf_order)
+
+    records_offset = HEADER.size
+    dbf_offset = records_offset + len(records)
+    pool_offset = dbf_offset + len(dbf_index)
+
+    header = HEADER.pack(MAGIC, VERSION, stat.st_size, stat.st_mtime_ns, file_hash(json_path), len(cards), len(dbf_order),
+                         records_offset, dbf_offset, pool_offset, races_offset, races_length)
+
+    # Written to a temporary file first, so a process reading the old cache never sees a half written one
+    # Each writer has its own temporary file: processes building the cache at the same time would otherwise write into the same one
+    path = cache_path(json_path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(header)
+            file.write(records)
+            file.write(dbf_index)
+            file.write(pool)
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+# Checks that the cache exists and was built from the current json by the current version of this code
+def is_fresh(json_path):
+    try:
+        with open(cache_path(json_path), "rb") as file:
+            header = file.read(HEADER.size)
+    except FileNotFoundError:
+        return False
+
+    if (len(header) < HEADER.size):
+        return False
+
+    magic, version, size, mtime, digest = HEADER.unpack(header)[:5]
+    if (magic != MAGIC) or (version != VERSION):
+        return False
+
+    # Size and modification time are enough most of the time, the hash covers files that were touched without changing
+    stat = os.stat(json_path)
+    if (stat.st_size == size) and (stat.st_mtime_ns == mtime):
+        return True
+
+    return (stat.st_size == size) and (file_hash(json_path) == digest)
+
+
+# Read-only access to the binary cache, with the same lookup methods as utils.CardDB
+class CardCache:
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = HEADER.unpack_from(self.data, 0)
+        self.count, self.dbf_count, self.records_offset, self.dbf_offset, self.pool_offset, races_offset, races_length = header[5:]
+
+        self.races = json.loads(self.read_string(races_offset, races_length))
+
+        # Decoded cards are kept, so each one is only decoded once. Cards already found by id don't need the binary search either
+        self.decoded = {}
+        self.found = {}
+
+        # Indexes on race, tier and name, only built from the records (not the cards) the first time they are used
+        self.by_race = None
+        self.by_tier = None
+        self.by_name = None
+
+    @classmethod
+    def open(cls, json_path):
+        # Builds the cache again if it's missing or stale. Returns None if there is no json to build it from
+        if not is_fresh(json_path):
+            if not os.path.exists(json_path):
+                return None
+            build_cache(json_path)
+
+        return cls(cache_path(json_path))
+
+    def __len__(self):
+        return self.count
+
+    def read_string(self, offset, length):
+        start = self.pool_offset + offset
+        return self.data[start:start + length].decode("utf-8")
+
+    def record(self, n):
+        return RECORD.unpack_from(self.data, self.records_offset + n * RECORD.size)
+
+    def card(self, n):
+        if (n not in self.decoded):
+            record = self.record(n)
+            self.decoded[n] = json.loads(self.read_string(record[4], record[5]))
+        return self.decoded[n]
+
+    # Binary search on the records, sorted by card id
+    def get(self, id):
+        # Entities without a card id have None, which can't be compared with the ids
+        if not isinstance(id, str):
+            return None
+
+        if (id in self.found):
+            return self.found[id]
+
+        lo, hi = 0, self.count
+        while (lo < hi):
+            mid = (lo + hi) // 2
+            record = self.record(mid)
+            mid_id = self.read_string(record[0], record[1])
+            if (mid_id == id):
+                self.found[id] = self.card(mid)
+                return self.found[id]
+            elif (mid_id < id):
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return None
+
+    def get_by_dbf_id(self, dbf_id):
+        dbf_ids = DbfKeys(self)
+        i = bisect_left(dbf_ids, dbf_id)
+        if (i < len(dbf_ids)) and (dbf_ids[i] == dbf_id):
+            return self.card(dbf_ids.record_number(i))
+        return None
+
+    def build_indexes(self):
+        self.by_race, self.by_tier, self.by_name = {}, {}, {}
+
+        records = sorted((self.record(n) + (n,) for n in range(self.count)), key=lambda record: record[9])
+        for record in records:
+            n = record[10]
+
+            for bit, race in enumerate(self.races):
+                if (record[8] & (1 << bit)):
+                    self.by_race.setdefault(race, []).append(n)
+
+            if (record[7] != NO_TIER):
+                self.by_tier.setdefault(record[7], []).append(n)
+
+            self.by_name.setdefault(self.read_string(record[2], record[3]), []).append(n)
+
+    def find_by_race(self, race):
+        if (self.by_race is None):
+            self.build_indexes()
+        return [self.card(n) for n in self.by_race.get(race, [])]
+
+    def find_by_tier(self, tier):
+        if (self.by_tier is None):
+            self.build_indexes()
+        return [self.card(n) for n in self.by_tier.get(tier, [])]
+
+    def find_by_name(self, name):
+        if (self.by_name is None):
+            self.build_indexes()
+        return [self.card(n) for n in self.by_name.get(name, [])]
+
+
+# Sequence view of the dbfIds in the dbf index, so that bisect can be used on it without reading the whole index
+class DbfKeys:
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __len__(self):
+        return self.cache.dbf_count
+
+    def record_number(self, i):
+        return DBF_ENTRY.unpack_from(self.cache.data, self.cache.dbf_offset + i * DBF_ENTRY.size)[0]
+
+    def __getitem__(self, i):
+        return self.cache.record(self.record_number(i))[6]
+
+
+# Build step: python card_cache.py [path to the json]
+if __name__ == "__main__":
+    json_path = sys.argv[1] if len(sys.argv) > 1 else "json-data/bg-cards.json"
+    build_cache(json_path)
+    print(f"Card cache written to {cache_path(json_path)}")
@@ -1,8 +1,25 @@
+from bisect import insort
+
+from tag_registry import registry
+import metrics
+
+# Tags used to look for entities while replaying a game. EntityStore keeps an index for each of them
+INDEXED_TAGS = ("ENTITY_ID", "Entity", "entityName")
+
 class Entity:
+    # No __dict__ for each entity, the tags are the only data that grows
+    __slots__ = ("tags", "store", "positions")
+
+    # Tags are kept as {tag code: value code} (see tag_registry.py). Reading and writing them by name converts them with the registry
     def __init__(self, tags):
         self.tags = {}
         for tag, value in tags:
-            self.tags[tag] = value
+            code = registry.tag_code(tag)
+            self.tags[code] = registry.value_code(code, value)
+
+        # The store the entity belongs to and its positions in it (usually just one), used to keep the indexes updated
+        self.store = None
+        self.positions = []
 
         # Some tags shoud be available for all entities, but currently this is not necessarely true (ex: entities created by change tag when they aren't found)
         """self.id = self.tags["ENTITY_ID"]
@@ -12,29 +29,229 @@ class Entity:
         self.creator = self.tags["CREATOR"]"""
 
     def change_tag(self, tag, value):
-        self.tags[tag] = value
+        self[tag] = value
 
     def __getitem__(self, name):
-        if (name in self.tags.keys()):
-            return self.tags[name]
-        else:
-            return None
+        tag = registry.find_tag(name)
+        return registry.value_name(tag, self.tags.get(tag))
 
     def __setitem__(self, name, value):
-        self.tags[name] = value
+        tag = registry.tag_code(name)
+        self.set_code(tag, registry.value_code(tag, value))
+
+    def set_code(self, tag, value):
+        if (self.store is not None) and (tag in self.store.watched):
+            self.store.reindex(self, tag, self.tags.get(tag), value)
+        self.tags[tag] = value
+
+    # The tags with their names and values
+    def items(self):
+        return [(registry.tag_name(tag), registry.value_name(tag, value)) for tag, value in self.tags.items()]
+
+    def tag_dict(self):
+        return dict(self.items())
+
+    # Entities are pickled with the names and values of their tags only: codes are only valid inside a process, and the store the entity
+    # belongs to is rebuilt on the other side
+    def __reduce__(self):
+        return (Entity, (self.items(),))
     
     def __repr__(self):
-        tags = [f"\t\t{tag} = {val}\n" for tag,val in zip(self.tags.keys(), self.tags.values())]
+        tags = [f"\t\t{tag} = {val}\n" for tag, val in self.items()]
 
         return f"Tags: \n{"".join(tags)}"
 
 
+# List of entities with a hash index on the tags used to look them up, so finding an entity doesn't need a scan of the whole list
+# The indexes are updated by Entity.set_code, so tags should not be changed by writing to Entity.tags directly
+# Appending (append, extend, +=) updates the indexes, any other change to the list (insert, del, slice assignment, sort...) builds them again
+# Secondary indexes on other tags (ZONE, CARDTYPE, ...) can be added with add_index and are used by query to avoid scans as well
+class EntityStore(list):
+    def __init__(self, entities=(), indexes=()):
+        super().__init__()
+
+        # For each indexed tag, maps every value to the positions of the entities having it. Entities without the tag are under None
+        # Tags and values are the codes from the tag registry
+        self.indexes = {registry.tag_code(tag): {} for tag in INDEXED_TAGS}
+
+        # Same, but the positions are kept in sets that can be intersected quickly
+        self.secondary_indexes = {}
+
+        # Tags whose changes have to be reported by the entities
+        self.watched = set(self.indexes)
+
+        for entity in entities:
+            self.append(entity)
+
+        for tag in indexes:
+            self.add_index(tag)
+
+    # Starts keeping a secondary index on a tag. Entities already in the store are indexed right away
+    def add_index(self, tag):
+        tag = registry.tag_code(tag)
+        if (tag in self.secondary_indexes):
+            return
+
+        index = {}
+        for n, entity in enumerate(self):
+            index.setdefault(entity.tags.get(tag), set()).add(n)
+
+        self.secondary_indexes[tag] = index
+        self.watched.add(tag)
+
+    def append(self, entity):
+        n = len(self)
+        super().append(entity)
+
+        # An entity only keeps the indexes of the last store it was added to updated
+        if (entity.store is not self):
+            entity.store = self
+            entity.positions = []
+        entity.positions.append(n)
+
+        for tag, index in self.indexes.items():
+            index.setdefault(entity.tags.get(tag), []).append(n)
+
+        for tag, index in self.secondary_indexes.items():
+            index.setdefault(entity.tags.get(tag), set()).add(n)
+
+    def extend(self, entities):
+        for entity in entities:
+            self.append(entity)
+
+    def __iadd__(self, entities):
+        self.extend(entities)
+        return self
+
+    # Makes the change on a copy of the entities, then fills the store again with them
+    def change(self, method, *args, **kwargs):
+        entities = list(self)
+        result = method(entities, *args, **kwargs)
+
+        for entity in self:
+            if (entity.store is self):
+                entity.store = None
+
+        super().clear()
+        for index in self.indexes.values():
+            index.clear()
+        for index in self.secondary_indexes.values():
+            index.clear()
+
+        for entity in entities:
+            self.append(entity)
+
+        return result
+
+    def insert(self, n, entity):
+        self.change(list.insert, n, entity)
+
+    def __setitem__(self, key, value):
+        self.change(list.__setitem__, key, value)
+
+    def __delitem__(self, key):
+        self.change(list.__delitem__, key)
+
+    def __imul__(self, count):
+        self.change(list.__imul__, count)
+        return self
+
+    def pop(self, n=-1):
+        return self.change(list.pop, n)
+
+    def remove(self, entity):
+        self.change(list.remove, entity)
+
+    def clear(self):
+        self.change(list.clear)
+
+    def sort(self, key=None, reverse=False):
+        self.change(list.sort, key=key, reverse=reverse)
+
+    def reverse(self):
+        self.change(list.reverse)
+
+    def reindex(self, entity, tag, old_value, new_value):
+        if (old_value == new_value):
+            return
+
+        if (tag in self.indexes):
+            index = self.indexes[tag]
+            for n in entity.positions:
+                index[old_value].remove(n)
+                insort(index.setdefault(new_value, []), n)
+
+        if (tag in self.secondary_indexes):
+            index = self.secondary_indexes[tag]
+            for n in entity.positions:
+                index[old_value].discard(n)
+                index.setdefault(new_value, set()).add(n)
+
+    # Same output as FindByTags on a single indexed tag: (position, entity) pairs in order
+    def find(self, tag, value):
+        tag = registry.find_tag(tag)
+        return [(n, self[n]) for n in self.indexes[tag].get(registry.value_code(tag, value), [])]
+
+    # Same output as FindByTags. The entities found by candidates are checked for the tags without an index, so the cost depends on the
+    # size of the result
+    def query(self, tags, values):
+        if (len(tags) == 1) and (registry.find_tag(tags[0]) in self.indexes):
+            return self.find(tags[0], values[0])
+
+        positions, others = self.candidates(tags, values)
+
+        out = []
+        for n in positions:
+            entity = self[n]
+            if all(entity.tags.get(tag) == value for tag, value in others):
+                out.append((n, entity))
+        return out
+
+    # Positions of the entities that can match a query, in order, and the (tag, value) pairs still to be checked on them, as codes
+    # The sets of positions from the indexed tags are intersected starting from the smallest. Without any index on the tags, the positions
+    # are a range over all the entities
+    def candidates(self, tags, values):
+        sets = []
+        others = []
+        for tag, value in zip(tags, values):
+            tag = registry.find_tag(tag)
+            value = registry.value_code(tag, value)
+
+            if (tag in self.secondary_indexes):
+                sets.append(self.secondary_indexes[tag].get(value, set()))
+            elif (tag in self.indexes):
+                sets.append(set(self.indexes[tag].get(value, [])))
+            else:
+                others.append((tag, value))
+
+        # Without any index every entity has to be checked
+        if (len(sets) == 0):
+            return range(len(self)), others
+
+        sets.sort(key=len)
+        return sorted(sets[0].intersection(*sets[1:])), others
+
+    # Rebuilt from the entities when unpickled, the indexes are made again instead of being copied
+    def __reduce__(self):
+        return (EntityStore, (list(self), [registry.tag_name(tag) for tag in self.secondary_indexes]))
+
+
 def FindByTags(tags, values, entities):
+    # Lookups on an EntityStore can use the indexes
+    if isinstance(entities, EntityStore):
+        return entities.query(tags, values)
+
+    # The tags are read from the entities directly, going through Entity.__getitem__ for every tag of every entity is much slower
+    pairs = []
+    for tag, value in zip(tags, values):
+        tag = registry.find_tag(tag)
+        pairs.append((tag, registry.value_code(tag, value)))
+
     out = []
     for n, entity in enumerate(entities):
         match = True
-        for tag, value in zip(tags, values):
-            if (entity[tag] != value):
+        for tag, value in pairs:
+            if (entity.tags.get(tag) != value):
                 match = False
                 break
         if (match):
@@ -53,41 +270,96 @@ def CreateGame(packet):
 
     return (game, player1, player2)
 
-def GetEntityList(packets, entities=[], dbg=False):
-    # for whatever reason, the game creates player entities and gives them ids, then searches for them by player-name which is given elsewhere
-    ids = []
-    names = []
+# Keeps the state of all the entities in a game and updates it one packet at a time
+# Used by GetEntityList and by the live follower, where packets arrive while the game is running
+class EntityState:
+    def __init__(self, dbg=False, indexes=()):
+        self.dbg = dbg
 
-    entities = []
+        # Tags to keep a secondary index on, see EntityStore.add_index
+        self.indexes = indexes
 
-    for packet in packets:
+        # Consumers can subscribe to these events to be notified of changes
+        # entity_created(entity), tag_changed(entity, tag, old_value, new_value), reset()
+        self.callbacks = {"entity_created": [], "tag_changed": [], "reset": []}
+
+        self.clear()
+
+    # Forgets all the entities, for example when the game restarts and a new log is started
+    def clear(self):
+        # for whatever reason, the game creates player entities and gives them ids, then searches for them by player-name which is given elsewhere
+        self.ids = []
+        self.names = []
+
+        self.entities = EntityStore(indexes=self.indexes)
 
-        if (dbg):
+        # The entity found by the last packet. Tag changes on entities that can't be found still apply to it, like they always did
+        self.entity = None
+        self.should_append = False
+
+        # Number of packets whose entity couldn't be found
+        self.unresolved = 0
+
+        self.notify("reset")
+
+    def subscribe(self, event, callback):
+        self.callbacks[event].append(callback)
+
+    def notify(self, event, *args):
+        for callback in self.callbacks[event]:
+            callback(*args)
+
+    def add_entity(self, entity):
+        self.entities.append(entity)
+        self.notify("entity_created", entity)
+
+    # Sets a tag on an entity. Changes are only reported for entities that are already part of the state, with names and values
+    def set_tag(self, entity, tag, value):
+        # Same as registry.tag_code and registry.value_code, done here since this runs for every tag of every packet
+        code = registry.tag_codes.get(tag)
+        if (code is None):
+            code = registry.tag_code(tag)
+
+        enum = registry.enums.get(code)
+        value_code = value if (enum is None) else enum[0].get(value, value)
+
+        if (self.callbacks["tag_changed"]) and (entity.store is self.entities):
+            old_value = entity.tags.get(code)
+            entity.set_code(code, value_code)
+            if (old_value != value_code):
+                self.notify("tag_changed", entity, tag, registry.value_name(code, old_value), value)
+        else:
+            entity.set_code(code, value_code)
+
+    def apply(self, packet):
+        entities = self.entities
+
+        if (self.dbg):
             print(packet)
 
         command = packet.command
 
         # Handle the command that gives the player names and their ids
         if (command == "PlayerID"):
-            ids.append(packet.id)
-            names.append(packet.name)
+            self.ids.append(packet.id)
+            self.names.append(packet.name)
         
         # Handle the command that starts the game
         elif (command == "CREATE_GAME"):
             game, player1, player2 = CreateGame(packet)
 
             # Set a few tags that are useful for finding the entities later
-            if (player1["PLAYER_ID"] in ids):
-                player1["Entity"] = names[ids.index(player1["PLAYER_ID"])]
+            if (player1["PLAYER_ID"] in self.ids):
+                player1["Entity"] = self.names[self.ids.index(player1["PLAYER_ID"])]
 
-            if (player2["PLAYER_ID"] in ids):
-                player2["Entity"] = names[ids.index(player2["PLAYER_ID"])]
+            if (player2["PLAYER_ID"] in self.ids):
+                player2["Entity"] = self.names[self.ids.index(player2["PLAYER_ID"])]
             
             game["Entity"] = "GameEntity"
 
-            entities.append(player1)
-            entities.append(player2)
-            entities.append(game)
+            self.add_entity(player1)
+            self.add_entity(player2)
+            self.add_entity(game)
 
         # Handle the command used to create and update entities by giving all their tags
         elif (command == "FULL_ENTITY" or command == "SHOW_ENTITY"):
@@ -110,13 +382,16 @@ def GetEntityList(packets, entities=[], dbg=False):
                 should_append = True
             
             for tag, value in zip(id_tags.keys(), id_tags.values()):
-                entity[tag] = value
+                self.set_tag(entity, tag, value)
             
             for tag, value in zip(tags.keys(), tags.values()):
-                entity[tag] = value
+                self.set_tag(entity, tag, value)
             
             if (should_append):
-                entities.append(entity)
+                self.add_entity(entity)
+
+            self.entity = entity
+            self.should_append = should_append
 
         # Handle the command used to update a single tag on an entity
         elif (command == "TAG_CHANGE" or command == "HIDE_ENTITY" or command == "CHANGE_ENTITY"):
@@ -140,28 +415,39 @@ def GetEntityList(packets, entities=[], dbg=False):
             # Sometimes entities are unable to be located. Either because of a parsing error or because the entity doesn't exist
             # This is unlikely to be much of a problem and can be safwly ignored in most cases
             if (len(t) == 0):
+                self.unresolved += 1
 
-                if (dbg):
+                if (self.dbg):
                     print(f"Error, entity not found from tags {" ".join(id_tags.keys())} with values {" ".join(id_tags.values())}")
 
                 # The game occasionally tries to change tags on some entities representing the enemy players and a few other less important things by looking for them using the Entity=[...] tag
                 # As far as i can tell, these entities are never created or at least never given the names used to look for them
                 # The following code is a hack to try and handle this by creating them the first time they are mentioned
                 if ("Entity" in id_tags.keys()) and (len(id_tags.keys()) == 1):
-                    entity = Entity(zip(list(id_tags.keys()), list(id_tags.values())))
-                    should_append = True
+                    self.entity = Entity(zip(list(id_tags.keys()), list(id_tags.values())))
+                    self.should_append = True
 
             else:
-                entity = entities[t[0][0]]
-                should_append = False
+                self.entity = entities[t[0][0]]
+                self.should_append = False
+
+            # Nothing has been found yet, there is no entity to apply the tags to
+            if (self.entity is None):
+                return
 
             for tag, value in zip(tags.keys(), tags.values()):
-                entity[tag] = value
+                self.set_tag(self.entity, tag, value)
             
-            if (should_append):
-                entities.append(entity)
-
-    return entities
+            if (self.should_append):
+                self.add_entity(self.entity)
 
+# packets can be any iterable of packet objects, including the generator returned by IterPackets
+# indexes lists the tags that will be used in queries, so that FindByTags doesn't have to scan all the entities
+@metrics.stage("GetEntityList")
+def GetEntityList(packets, entities=[], dbg=False, indexes=()):
+    state = EntityState(dbg, indexes)
 
+    for packet in packets:
+        state.apply(packet)
 
+    return state.entities
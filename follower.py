@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+
+from parser_lib import Parser
+from tokenizer import LineTokenizer
+from packets import IterPackets
+from entities import EntityState
+
+# Follows a Power.log while the game is running. Only the bytes appended since the last poll are read and the new packets are
+# applied to a persistent EntityState, so nothing has to be parsed twice. Works by polling the file, no OS specific watchers needed
+class LogFollower:
+    def __init__(self, path, state=None, interval=0.5):
+        self.path = path
+        self.interval = interval
+
+        self.state = state if state is not None else EntityState()
+
+        # Only used to clean up the lines, the packets are built incrementally by the tokenizer
+        self.parser = Parser("tokenizer")
+        self.tokenizer = LineTokenizer()
+
+        self.running = False
+        self.restart()
+
+    # Goes back to the start of the file, used when the log is rotated or truncated (the game restarts)
+    def restart(self):
+        self.offset = 0
+        self.inode = None
+        self.partial = b""     # Trailing line that hasn't been completely written yet
+        self.tokenizer.reset()
+        self.state.clear()
+
+    # Reads whatever has been appended to the log since the last call and applies it to the state. Returns the new packets
+    def poll(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+
+        # A different file with the same name or a shorter file means the log has been started again
+        if (self.inode is not None) and ((stat.st_ino != self.inode) or (stat.st_size < self.offset)):
+            self.restart()
+
+        self.inode = stat.st_ino
+
+        if (stat.st_size == self.offset):
+            return []
+
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            data = file.read()
+
+        self.offset += len(data)
+
+        # Only complete lines are parsed, the last one is kept until the rest of it is written
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+
+        # Same newlines as a log opened in text mode (logs written on Windows end their lines with \r\n)
+        lines = [self.parser.clean_str(line.removesuffix(b"\r").decode("utf-8", errors="replace") + "\n") for line in lines]
+        packets = list(IterPackets(self.tokenizer.feed(lines)))
+
+        for packet in packets:
+            self.state.apply(packet)
+
+        return packets
+
+    def run(self):
+        self.running = True
+        while self.running:
+            self.poll()
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+
+
+# Example: print the changes to the entities as the game goes on
+if __name__ == "__main__":
+    follower = LogFollower(sys.argv[1])
+
+    follower.state.subscribe("entity_created", lambda entity: print(f"Created entity {entity["ENTITY_ID"]} ({entity["CardID"]})"))
+    follower.state.subscribe("tag_changed", lambda entity, tag, old, new: print(f"Entity {entity["ENTITY_ID"]}: {tag} {old} -> {new}"))
+    follower.state.subscribe("reset", lambda: print("Log restarted"))
+
+    try:
+        follower.run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,65 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from packets import CreateGame
+from entities import GetEntityList
+
+# A Power.log can contain several games one after the other. Replaying all of them into a single entity list mixes them up, since entity
+# ids start again from 1 in every game, so the packets are split in games first and each game is replayed on its own
+
+# One game of a log: its packets, the time it started and ended and the state of its entities at the end
+class Game:
+    def __init__(self, packets, entities):
+        self.packets = packets
+        self.entities = entities
+
+        self.start = packets[0].timestamp if packets else None
+        self.end = packets[-1].timestamp if packets else None
+
+    def __repr__(self):
+        return f"Game {self.start} - {self.end}: {len(self.packets)} packets, {len(self.entities)} entities"
+
+
+# Splits a list of packets in games. Each game starts with a CREATE_GAME
+# The game is printed both by GameState and by PowerTaskList, so there are two CREATE_GAME packets for each game: a new game only starts
+# when a CREATE_GAME with a packet type already seen in the current game is found
+# Packets before the first CREATE_GAME are kept with the first game
+def SplitGames(packets):
+    games = []
+    current = []
+    seen = set()
+
+    for packet in packets:
+        if isinstance(packet, CreateGame):
+            if (packet.packet_type in seen):
+                games.append(current)
+                current = []
+                seen = set()
+            seen.add(packet.packet_type)
+
+        current.append(packet)
+
+    if (current):
+        games.append(current)
+
+    return games
+
+def replay_game(args):
+    packets, indexes = args
+    return GetEntityList(packets, indexes=indexes)
+
+# Splits the packets in games and replays each one with its own entity state. Games are replayed in parallel by a pool of processes
+# indexes is passed to GetEntityList, workers defaults to the number of cpus
+def GetGames(packets, workers=None, indexes=()):
+    segments = SplitGames(packets)
+    workers = min(workers or os.cpu_count(), len(segments))
+
+    tasks = [(segment, indexes) for segment in segments]
+
+    if (workers <= 1):
+        states = [replay_game(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            states = list(executor.map(replay_game, tasks))
+
+    return [Game(segment, entities) for segment, entities in zip(segments, states)]
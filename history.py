@@ -0,0 +1,262 @@
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from entities import Entity, EntityState, EntityStore
+from packets import timestamp_us
+
+DAY_US = 24 * 60 * 60 * 1000000
+
+# Times of the packets of a replay, in microseconds from the midnight before the first packet, so they can be searched with a binary search
+# The timestamps in the logs only have the time of day: one that goes back by more than half a day is taken as the log going past midnight.
+# Smaller steps back (lines not written in order) are kept at the time of the packet before, so the times never decrease
+class PacketTimes:
+    def __init__(self):
+        self.times = array("q")
+        self.day = 0
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, timestamp):
+        time = timestamp_us(timestamp) + self.day
+
+        if (self.times):
+            last = self.times[-1]
+            if (time < last - DAY_US // 2):
+                self.day += DAY_US
+                time += DAY_US
+            time = max(time, last)
+
+        self.times.append(time)
+
+    # Time of a timestamp used in a lookup. Times of day earlier than the first packet are on the day after it
+    def time(self, timestamp):
+        time = timestamp_us(timestamp)
+        if (self.times) and (time < self.times[0]):
+            time += DAY_US
+        return time
+
+# Number of packets applied at the given packet index (inclusive) or timestamp (all the packets up to it)
+def packet_count(times, when):
+    if isinstance(when, str):
+        return bisect_right(times.times, times.time(when))
+
+    if (when < 0):
+        when += len(times)
+    return min(max(when + 1, 0), len(times))
+
+# Records a replay of a game so the state of the entities can be rebuilt at any point without replaying from the start
+# Every `interval` packets a full copy of the tags (a checkpoint) is saved, and for each packet the changes it made are kept in an
+# undo log. state_at restores the closest checkpoint and applies the changes forward, or undoes them backward, up to the requested packet
+# A smaller interval uses more memory but needs less changes to be applied on each lookup
+class GameHistory:
+    def __init__(self, packets, interval=1000, dbg=False):
+        self.interval = interval
+
+        # Entities are identified by their first position in the entity list. The same entity can be appended more than once,
+        # so layout maps every position to the entity it holds
+        self.layout = []
+
+        # deltas[n] holds the changes made by the n-th packet:
+        # ("new", key, tags) when an entity is created, ("dup", key) when it is appended again, ("set", key, tag, old, new) on tag changes
+        self.deltas = []
+        self.times = PacketTimes()
+
+        # checkpoints[k] is the state after k * interval packets, as {key: tags} plus the number of positions in use
+        self.checkpoints = []
+
+        state = EntityState(dbg)
+        state.subscribe("entity_created", self.on_entity_created)
+        state.subscribe("tag_changed", self.on_tag_changed)
+
+        self.current = []
+        self.checkpoint(state)
+
+        for packet in packets:
+            state.apply(packet)
+
+            self.deltas.append(self.current)
+            self.times.append(packet.timestamp)
+            self.current = []
+
+            if (len(self.deltas) % interval == 0):
+                self.checkpoint(state)
+
+        # Final state of the replay, same as GetEntityList
+        self.entities = state.entities
+
+    def on_entity_created(self, entity):
+        key = entity.positions[0]
+        self.layout.append(key)
+
+        if (len(entity.positions) == 1):
+            self.current.append(("new", key, entity.tag_dict()))
+        else:
+            self.current.append(("dup", key))
+
+    def on_tag_changed(self, entity, tag, old_value, new_value):
+        self.current.append(("set", entity.positions[0], tag, old_value, new_value))
+
+    def checkpoint(self, state):
+        tags = {}
+        for n, entity in enumerate(state.entities):
+            if (entity.positions[0] == n):
+                tags[n] = entity.tag_dict()
+
+        self.checkpoints.append((tags, len(state.entities)))
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def packet_count(self, when):
+        return packet_count(self.times, when)
+
+    # Returns the state of the entities right after the packet with the given index, or at the given timestamp ("HH:MM:SS.fffffff")
+    # The result is a new EntityStore, changing it doesn't affect the history
+    def state_at(self, when):
+        count = self.packet_count(when)
+
+        # Closest checkpoint, either before or after the requested packet
+        k = min(round(count / self.interval), len(self.checkpoints) - 1)
+        checkpoint, size = self.checkpoints[k]
+        start = k * self.interval
+
+        tags = {key: dict(values) for key, values in checkpoint.items()}
+
+        if (start <= count):
+            for n in range(start, count):
+                for change in self.deltas[n]:
+                    if (change[0] == "set"):
+                        tags[change[1]][change[2]] = change[4]
+                    else:
+                        if (change[0] == "new"):
+                            tags[change[1]] = dict(change[2])
+                        size += 1
+        else:
+            for n in range(start - 1, count - 1, -1):
+                for change in reversed(self.deltas[n]):
+                    if (change[0] == "set"):
+                        # Tags that weren't there before the change are removed
+                        if (change[3] is None):
+                            del tags[change[1]][change[2]]
+                        else:
+                            tags[change[1]][change[2]] = change[3]
+                    else:
+                        if (change[0] == "new"):
+                            del tags[change[1]]
+                        size -= 1
+
+        entities = {key: Entity(values.items()) for key, values in tags.items()}
+        return EntityStore(entities[key] for key in self.layout[:size])
+
+
+# Records, while replaying a game, every value each tag of each entity had and the packet that set it, so the value of a single tag at any
+# point can be found with a binary search instead of rebuilding the whole state like GameHistory.state_at
+# Each (entity, tag) has two append-only arrays: the indexes of the packets that changed it and the codes of the values it got (positions
+# in a pool of the distinct values)
+class TagTimelines:
+    def __init__(self, packets, dbg=False, indexes=()):
+        # Entity key (its first position in the entity list) -> {tag: (packet indexes, value codes)}
+        self.timelines = {}
+
+        self.values = []
+        self.value_codes = {}
+
+        self.times = PacketTimes()
+
+        state = EntityState(dbg, indexes)
+        state.subscribe("entity_created", self.on_entity_created)
+        state.subscribe("tag_changed", self.on_tag_changed)
+
+        self.packet = 0
+        for packet in packets:
+            state.apply(packet)
+            self.times.append(packet.timestamp)
+            self.packet += 1
+
+        # Final state of the replay, same as GetEntityList
+        self.entities = state.entities
+
+    def record(self, key, tag, value):
+        timeline = self.timelines[key].get(tag)
+        if (timeline is None):
+            timeline = self.timelines[key][tag] = (array("I"), array("I"))
+
+        code = self.value_codes.get(value)
+        if (code is None):
+            code = self.value_codes[value] = len(self.values)
+            self.values.append(value)
+
+        timeline[0].append(self.packet)
+        timeline[1].append(code)
+
+    def on_entity_created(self, entity):
+        # Entities appended again are already recorded
+        if (len(entity.positions) > 1):
+            return
+
+        key = entity.positions[0]
+        self.timelines[key] = {}
+        for tag, value in entity.items():
+            self.record(key, tag, value)
+
+    def on_tag_changed(self, entity, tag, old_value, new_value):
+        self.record(entity.positions[0], tag, new_value)
+
+    def __len__(self):
+        return len(self.times)
+
+    def packet_count(self, when):
+        return packet_count(self.times, when)
+
+    # Entities can be given as their key or as the entity itself (from self.entities)
+    def timeline(self, entity, tag):
+        key = entity if isinstance(entity, int) else entity.positions[0]
+        return self.timelines.get(key, {}).get(tag)
+
+    # Value of a tag right after the packet with the given index, or at the given timestamp ("HH:MM:SS.fffffff")
+    # None if the entity didn't have the tag yet
+    def value_at(self, entity, tag, when):
+        timeline = self.timeline(entity, tag)
+        if (timeline is None):
+            return None
+
+        n = bisect_left(timeline[0], self.packet_count(when))
+        return self.values[timeline[1][n - 1]] if n > 0 else None
+
+    # All the values a tag had, as (packet index, value) pairs
+    # Example: when a minion left PLAY is the first change after its last (n, "PLAY") pair in changes(minion, "ZONE")
+    def changes(self, entity, tag):
+        timeline = self.timeline(entity, tag)
+        if (timeline is None):
+            return []
+        return [(n, self.values[code]) for n, code in zip(*timeline)]
+
+    # Memory used by the timelines, in bytes. The value strings are shared with the rest of the program and are not counted
+    def memory_report(self):
+        entries = 0
+        arrays = 0
+        tables = sys.getsizeof(self.timelines)
+
+        for tags in self.timelines.values():
+            tables += sys.getsizeof(tags)
+            for timeline in tags.values():
+                entries += len(timeline[0])
+                tables += sys.getsizeof(timeline)
+                arrays += sys.getsizeof(timeline[0]) + sys.getsizeof(timeline[1])
+
+        pool = sys.getsizeof(self.values) + sys.getsizeof(self.value_codes)
+        total = arrays + tables + pool
+
+        return {
+            "entities": len(self.timelines),
+            "timelines": sum(len(tags) for tags in self.timelines.values()),
+            "entries": entries,
+            "values": len(self.values),
+            "array_bytes": arrays,
+            "table_bytes": tables,
+            "pool_bytes": pool,
+            "total_bytes": total,
+            "bytes_per_entry": total / max(entries, 1),
+        }
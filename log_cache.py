@@ -0,0 +1,277 @@
+import gc
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+
+from parser_lib import Parser, PARSER_VERSION
+from tokenizer import LineBuffer, ParsedGroup, packet_from_list
+import metrics
+
+# Cache of the packets parsed from a log, saved next to it, so that the same log doesn't have to be parsed again every time it's opened
+#
+# Layout of the file:
+#   header      magic, format version, parser version, size/mtime/sha1 of the log when it was parsed, where to resume parsing it
+#   strings     every distinct string found in the packets (tag names, values, timestamps...) as utf-8, separated by \0
+#   shapes      for each packet the number of tokens, then one uint32 per token: 0 for a string, 2 for a key-value pair, 2n + 1 for a group
+#               of n key-value pairs
+#   leaves      the strings of all the packets, in order, as uint32 indexes in the list of strings
+#
+# A cache is only used if the log and the parser version are the same as when it was written. If the log has grown since then and the part
+# that was already parsed didn't change (a game still being played), only the new lines are parsed, starting from the last packet that
+# could be affected by them (see LineBuffer.resume_line)
+
+MAGIC = b"HSLC"
+VERSION = 1
+
+# magic, format version, parser version, log size, log mtime, log sha1, resume offset, packets, packets before the resume offset,
+# strings length, shapes, leaves
+HEADER = struct.Struct("<4sIIQQ20sQIIQQQ")
+
+# Progress is reported every PROGRESS_LINES lines of the log while parsing it
+PROGRESS_LINES = 10000
+
+def cache_path(log_path):
+    return os.path.splitext(log_path)[0] + ".cache"
+
+# sha1 of the first size bytes of a file, or of the whole file
+def file_hash(path, size=None):
+    digest = hashlib.sha1()
+
+    with open(path, "rb") as file:
+        while (size is None) or (size > 0):
+            chunk = file.read(1 << 20 if size is None else min(1 << 20, size))
+            if not chunk:
+                break
+
+            digest.update(chunk)
+            if (size is not None):
+                size -= len(chunk)
+
+    return digest.digest()
+
+def encode(packets):
+    strings = {}
+    shapes = array("I")
+    leaves = array("I")
+
+    def add_string(string):
+        code = strings.get(string)
+        if (code is None):
+            code = strings[string] = len(strings)
+        leaves.append(code)
+
+    for packet in packets:
+        shapes.append(len(packet))
+
+        for token in packet:
+            if isinstance(token, str):
+                shapes.append(0)
+                add_string(token)
+            elif (len(token) > 0) and isinstance(token[0], str):
+                # A single key-value pair (the GameEntity of CREATE_GAME)
+                shapes.append(2)
+                add_string(token[0])
+                add_string(token[1])
+            else:
+                shapes.append(len(token) << 1 | 1)
+                for key, value in token:
+                    add_string(key)
+                    add_string(value)
+
+    return "\0".join(strings).encode("utf-8"), shapes, leaves
+
+def decode(strings, shapes, leaves, count):
+    # All the strings are looked up at once, then the packets are cut out of them following the shapes
+    leaves = list(map(strings.__getitem__, leaves))
+    packets = []
+    s = l = 0
+
+    for _ in range(count):
+        tokens = []
+        for s in range(s + 1, s + 1 + shapes[s]):
+            shape = shapes[s]
+
+            if (shape == 0):
+                tokens.append(leaves[l])
+                l += 1
+            elif (shape == 2):
+                tokens.append(leaves[l:l + 2])
+                l += 2
+            else:
+                pairs = iter(leaves[l:l + (shape >> 1) * 2])
+                tokens.append(ParsedGroup(map(list, zip(pairs, pairs))))
+                l += (shape >> 1) * 2
+
+        packets.append(packet_from_list(tokens))
+        s += 1
+
+    return packets
+
+
+class ParsedLogCache:
+    def __init__(self, log_path):
+        self.log_path = log_path
+        self.path = cache_path(log_path)
+        self.parser = Parser("tokenizer")
+
+        # Filled by read: what is known about the log from the cache
+        self.size = 0
+        self.mtime = 0
+        self.digest = b""
+        self.resume_offset = 0
+        self.kept = 0
+
+    # Returns the packets of the log, parsing only what isn't in the cache already. The cache is updated if needed
+    def load(self):
+        return ParsedGroup(self.stream())
+
+    # Same as load, but yields the packets as soon as they are available. progress is called with the number of bytes of the log read
+    # so far. The cache is only written if the generator runs to the end
+    def stream(self, progress=None):
+        stat = os.stat(self.log_path)
+        packets = self.read()
+        offset = 0
+
+        if (packets is not None):
+            if (stat.st_size == self.size) and ((stat.st_mtime_ns == self.mtime) or (file_hash(self.log_path) == self.digest)):
+                yield from packets
+                if (progress):
+                    progress(stat.st_size)
+                return
+
+            if (stat.st_size > self.size) and (file_hash(self.log_path, self.size) == self.digest):
+                # The log has grown, the packets that could be changed by the new lines are parsed again with them
+                packets = packets[:self.kept]
+                offset = self.resume_offset
+                yield from packets
+            else:
+                packets = None
+
+        if (packets is None):
+            packets = []
+            self.kept = 0
+
+        resume_offset, kept, size = yield from self.parse(offset, packets, progress)
+        self.kept += kept
+        self.write(packets, stat, size, resume_offset)
+
+    # Returns the cached packets, or None if there is no usable cache
+    def read(self):
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+
+        if (len(data) < HEADER.size):
+            return None
+
+        magic, version, parser_version, self.size, self.mtime, self.digest, self.resume_offset, count, self.kept, strings_length, shapes_count, leaves_count = HEADER.unpack_from(data, 0)
+        if (magic != MAGIC) or (version != VERSION) or (parser_version != PARSER_VERSION):
+            return None
+
+        pos = HEADER.size + strings_length
+        try:
+            strings = data[HEADER.size:pos].decode("utf-8").split("\0")
+        except UnicodeDecodeError:
+            # A corrupt cache, the log is parsed again
+            return None
+
+        shapes, leaves = array("I"), array("I")
+        shapes.frombytes(data[pos:pos + 4 * shapes_count])
+        leaves.frombytes(data[pos + 4 * shapes_count:pos + 4 * (shapes_count + leaves_count)])
+
+        # Most of the time would go in the garbage collector, triggered over and over by the lists created while decoding
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return decode(strings, shapes, leaves, count)
+        finally:
+            if (enabled):
+                gc.enable()
+
+    # Parses the log from a byte offset (the start of a line) to its end, adding the packets to out and yielding them
+    # Returns the offset to resume from on the next append, how many of the new packets come before it and the offset of the end
+    def parse(self, offset, out, progress=None):
+        offsets = array("Q")
+
+        def lines():
+            pos = offset
+            with open(self.log_path, "rb") as file:
+                file.seek(offset)
+                for raw in file:
+                    offsets.append(pos)
+                    pos += len(raw)
+
+                    if (progress) and (len(offsets) % PROGRESS_LINES == 0):
+                        progress(pos)
+
+                    # Same newlines as a log opened in text mode. Invalid bytes are replaced, like in follower.py
+                    line = raw.decode("utf-8", errors="replace")
+                    if line.endswith("\r\n"):
+                        line = line[:-2] + "\n"
+                    yield self.parser.clean_str(line)
+
+            offsets.append(pos)
+            if (progress):
+                progress(pos)
+
+        buffer = LineBuffer(lines())
+        first_lines = []
+        for packet in self.parser.tokenizer.packets(buffer):
+            first_lines.append(packet.line)
+            out.append(packet)
+            yield packet
+
+        kept = bisect_left(first_lines, buffer.resume_line)
+
+        return offsets[buffer.resume_line], kept, offsets[-1]
+
+    def write(self, packets, stat, size, resume_offset):
+        strings, shapes, leaves = encode(packets)
+        header = HEADER.pack(MAGIC, VERSION, PARSER_VERSION, size, stat.st_mtime_ns, file_hash(self.log_path, size), resume_offset,
+                             len(packets), self.kept, len(strings), len(shapes), len(leaves))
+
+        # Written to a temporary file first, so a process reading the old cache never sees a half written one
+        # Each writer has its own temporary file: processes caching the same log at the same time would otherwise write into the same one
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+        except OSError:
+            # The folder of the log isn't writable, the packets are still returned but the log will be parsed again next time
+            return
+
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(header)
+                file.write(strings)
+                file.write(shapes.tobytes())
+                file.write(leaves.tobytes())
+
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # Disk full or similar, same as above
+            pass
+        finally:
+            # Only left if the cache couldn't be written
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+
+# Packets of a log (same as Parser.parse_str on its contents), from the cache when possible
+@metrics.stage("parse_log")
+def parse_log(log_path, use_cache=True):
+    if (use_cache):
+        return ParsedGroup(ParsedLogCache(log_path).load())
+
+    with open(log_path, encoding="utf-8", errors="replace") as file:
+        return ParsedGroup(Parser("tokenizer").iter_packets(file))
+
+
+# Fills the cache of the given logs: python log_cache.py [log paths]
+if __name__ == "__main__":
+    for log_path in sys.argv[1:]:
+        print(f"{log_path}: {len(parse_log(log_path))} packets, cache written to {cache_path(log_path)}")
@@ -0,0 +1,255 @@
+import cProfile
+import functools
+import importlib
+import json
+import pstats
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+
+# Counters and timers filled by the parsing pipeline (log cache -> parser -> packets -> entities) while metrics are enabled
+#
+# Disabled, nothing is measured and the pipeline runs its usual code: the functions called for every line, packet or lookup are only
+# replaced by measuring versions while metrics are enabled (see INSTRUMENTED), the stage functions decorated with stage() only check
+# whether metrics are enabled once per call
+#
+# Example:
+#   metrics.enable()
+#   entities = GetEntityList(GetPacketList(parse_log(path)))
+#   metrics.disable().export_json("metrics.json")
+#
+# Only the objects created while metrics are enabled are measured: a LineTokenizer dispatches to the rules it found when it was created
+
+# The Metrics being filled, None when disabled
+current = None
+
+class Metrics:
+    def __init__(self):
+        self.counters = Counter()
+
+        # name -> [calls, seconds]
+        self.timers = {}
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def add_time(self, name, seconds):
+        timer = self.timers.get(name)
+        if (timer is None):
+            timer = self.timers[name] = [0, 0.0]
+        timer[0] += 1
+        timer[1] += seconds
+
+    def ratio(self, numerator, denominator):
+        return self.counters[numerator] / self.counters[denominator] if self.counters[denominator] else None
+
+    def report(self):
+        counters = self.counters
+        loads = counters["log_cache.loads"]
+
+        return {
+            "counters": dict(sorted(counters.items())),
+            "timers": {name: {"calls": calls, "seconds": seconds, "mean_us": 1e6 * seconds / calls}
+                       for name, (calls, seconds) in sorted(self.timers.items())},
+            "derived": {
+                "find_by_tags.mean_scan": self.ratio("find_by_tags.scanned", "find_by_tags.scans"),
+                "find_by_tags.indexed_rate": self.ratio("find_by_tags.indexed", "find_by_tags.calls"),
+                "find_by_tags.mean_candidates": self.ratio("find_by_tags.candidates", "find_by_tags.indexed"),
+                "log_cache.hit_rate": (loads - counters["log_cache.full_parses"] - counters["log_cache.appends"]) / loads if loads else None,
+                "card_db.hit_rate": self.ratio("card_db.hits", "card_db.loads"),
+            },
+        }
+
+    def export_json(self, path):
+        with open(path, "w") as file:
+            json.dump(self.report(), file, indent=4)
+
+    def print_report(self):
+        report = self.report()
+        for name, timer in report["timers"].items():
+            print(f"{name}:\t{timer["calls"]} calls\t{timer["seconds"]:.3f} s\t{timer["mean_us"]:.1f} us per call")
+        for name, value in report["counters"].items():
+            print(f"{name}:\t{value}")
+        for name, value in report["derived"].items():
+            if (value is not None):
+                print(f"{name}:\t{value:.3f}")
+
+
+# Decorator for the functions that make a whole stage of the pipeline (parse_str, GetPacketList...), timed under name
+def stage(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if (current is None):
+                return func(*args, **kwargs)
+
+            t0 = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                current.add_time(name, perf_counter() - t0)
+        return wrapper
+    return decorator
+
+
+# Measuring versions of the functions called in the inner loops. Each one gets the original function and returns its replacement
+
+def timed_rule(name, rule):
+    def wrapper(*args, **kwargs):
+        t0 = perf_counter()
+        result = rule(*args, **kwargs)
+        current.add_time(f"tokenizer.{name}", perf_counter() - t0)
+        return result
+    return wrapper
+
+def measured_make_packet(make_packet):
+    def wrapper(packet, dbg=False):
+        result = make_packet(packet, dbg)
+        current.count(f"packets.{result.command}" if result is not None else "packets.skipped")
+        return result
+    return wrapper
+
+def measured_apply(apply):
+    def wrapper(self, packet):
+        unresolved = self.unresolved
+
+        t0 = perf_counter()
+        apply(self, packet)
+        current.add_time(f"entities.{packet.command}", perf_counter() - t0)
+
+        if (self.unresolved != unresolved):
+            current.count("entities.unresolved", self.unresolved - unresolved)
+    return wrapper
+
+# Lookups on an EntityStore are counted by the store (see measured_store_find and measured_store_candidates), only scans of plain lists here
+def measured_find_by_tags(find_by_tags):
+    from entities import EntityStore
+
+    def wrapper(tags, values, entities):
+        if not isinstance(entities, EntityStore):
+            current.count("find_by_tags.calls")
+            current.count("find_by_tags.scans")
+            current.count("find_by_tags.scanned", len(entities))
+        return find_by_tags(tags, values, entities)
+    return wrapper
+
+# Lookups on a single tag of the main indexes, the entities found are the only ones looked at
+def measured_store_find(find):
+    def wrapper(self, tag, value):
+        result = find(self, tag, value)
+        current.count("find_by_tags.calls")
+        current.count("find_by_tags.indexed")
+        current.count("find_by_tags.candidates", len(result))
+        return result
+    return wrapper
+
+# Other lookups on the store: indexed if some of the tags have an index, a scan of all the entities otherwise
+def measured_store_candidates(candidates):
+    def wrapper(self, tags, values):
+        positions, others = candidates(self, tags, values)
+        current.count("find_by_tags.calls")
+        if isinstance(positions, range):
+            current.count("find_by_tags.scans")
+            current.count("find_by_tags.scanned", len(positions))
+        else:
+            current.count("find_by_tags.indexed")
+            current.count("find_by_tags.candidates", len(positions))
+        return positions, others
+    return wrapper
+
+def measured_cache_stream(stream):
+    def wrapper(self, *args, **kwargs):
+        current.count("log_cache.loads")
+        return stream(self, *args, **kwargs)
+    return wrapper
+
+def measured_cache_parse(parse):
+    def wrapper(self, offset, *args, **kwargs):
+        current.count("log_cache.appends" if offset > 0 else "log_cache.full_parses")
+        return parse(self, offset, *args, **kwargs)
+    return wrapper
+
+def measured_card_load(load):
+    def wrapper(cls, path=None, use_cache=True):
+        from utils import CARD_DATA_PATH
+
+        path = path or CARD_DATA_PATH
+        current.count("card_db.loads")
+        if ((path, use_cache) in cls.loaded):
+            current.count("card_db.hits")
+        return load(cls, path, use_cache)
+    return classmethod(wrapper)
+
+
+# (module, object name, attribute, wrapper factory) for everything replaced while metrics are enabled. object name is None for module
+# functions. Classmethods are given their underlying function
+INSTRUMENTED = [
+    ("packets", None, "MakePacket", measured_make_packet),
+    ("entities", "EntityState", "apply", measured_apply),
+    ("entities", None, "FindByTags", measured_find_by_tags),
+    ("entities", "EntityStore", "find", measured_store_find),
+    ("entities", "EntityStore", "candidates", measured_store_candidates),
+    ("log_cache", "ParsedLogCache", "stream", measured_cache_stream),
+    ("log_cache", "ParsedLogCache", "parse", measured_cache_parse),
+    ("utils", "CardDB", "load", measured_card_load),
+]
+
+TOKENIZER_RULES = ("create_game", "full_entity", "tag_change", "hide_entity", "show_entity", "change_entity", "block_start", "block_end",
+                   "player_id")
+
+# Originals of the replaced functions, to put them back on disable
+replaced = []
+
+# Replaces a function of a module or a class with wrapper(function)
+def replace(target, attribute, wrapper):
+    original = target.__dict__[attribute]
+    replaced.append((target, attribute, original))
+
+    if isinstance(original, classmethod):
+        original = original.__func__
+    setattr(target, attribute, wrapper(original))
+
+# Starts collecting metrics, in a new Metrics object that is returned
+def enable():
+    global current
+
+    if (current is not None):
+        disable()
+
+    current = Metrics()
+
+    for module_name, object_name, attribute, wrapper in INSTRUMENTED:
+        module = importlib.import_module(module_name)
+        replace(module if (object_name is None) else getattr(module, object_name), attribute, wrapper)
+
+    from tokenizer import LineTokenizer
+    for rule in TOKENIZER_RULES:
+        replace(LineTokenizer, rule, lambda original, rule=rule: timed_rule(rule, original))
+
+    return current
+
+# Stops collecting metrics and puts the original functions back. Returns the collected metrics
+def disable():
+    global current
+
+    while (replaced):
+        target, attribute, original = replaced.pop()
+        setattr(target, attribute, original)
+
+    metrics, current = current, None
+    return metrics
+
+# Runs the code inside the with block under cProfile. The stats are saved to path (for pstats or snakeviz) if given, otherwise the
+# functions with the highest cumulative time are printed
+@contextmanager
+def profile(path=None, top=25):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if (path):
+            profiler.dump_stats(path)
+        else:
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
@@ -0,0 +1,228 @@
+import re
+from collections.abc import Sequence
+
+import numpy as np
+
+from packets import MakePacket, timestamp_us, CreateGame, PlayerId
+
+# Columnar version of the packet list, for questions about a whole game that would otherwise need a loop over all the packet objects
+# (e.g. how many times ATK changed on each turn). Every tag set by a packet is a row, packets without tags get a single row
+#
+# Columns (numpy arrays, one value per row):
+#   packet      index of the packet in the packet list (the same as GetPacketList)
+#   timestamp   microseconds since midnight
+#   command     code in the commands pool
+#   packet_type code in the packet_types pool
+#   entity      id of the entity the packet acts on, -1 if unknown
+#   tag         code in the tags pool, -1 for packets without tags
+#   value       code in the values pool, -1 for packets without tags
+#
+# The packet objects are only created when they are accessed, from the parsed packets kept by the table (see LazyPackets)
+
+POOLS = ("commands", "packet_types", "tags", "values")
+POOL_COLUMNS = {"command": "commands", "packet_type": "packet_types", "tag": "tags", "value": "values"}
+
+NUMBER = re.compile(r"-?[0-9]+")
+
+# Strings are stored once in a pool and referred to by their position in it
+class StringPool(list):
+    def __init__(self):
+        super().__init__()
+        self.codes = {}
+
+    def add(self, string):
+        code = self.codes.get(string)
+        if (code is None):
+            code = self.codes[string] = len(self)
+            self.append(string)
+        return code
+
+    # -1 for strings that are not in the pool, so comparisons with it never match
+    def code(self, string):
+        return self.codes.get(string, -1)
+
+
+# Read-only list of packet objects created from the parsed packets the first time each one is accessed
+class LazyPackets(Sequence):
+    def __init__(self, parsed):
+        self.parsed = parsed
+        self.objects = [None] * len(parsed)
+
+    def __len__(self):
+        return len(self.parsed)
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return [self[i] for i in range(*n.indices(len(self)))]
+
+        if (self.objects[n] is None):
+            self.objects[n] = MakePacket(self.parsed[n])
+        return self.objects[n]
+
+
+class PacketTable:
+    def __init__(self, packet_data=()):
+        self.commands, self.packet_types, self.tags, self.values = (StringPool() for _ in POOLS)
+
+        # Parsed packets that have a packet object, in the same order as GetPacketList
+        self.parsed = []
+
+        # Entities referred to by name (Entity=GameEntity, Entity=PlayerName) are given the id they got in CREATE_GAME
+        self.entity_ids = {}
+        self.player_names = {}
+
+        columns = {name: [] for name in ("packet", "timestamp", "command", "packet_type", "entity", "tag", "value")}
+
+        for parsed in packet_data:
+            packet = MakePacket(parsed)
+            if (packet is None):
+                continue
+
+            n = len(self.parsed)
+            self.parsed.append(parsed)
+
+            timestamp = timestamp_us(packet.timestamp)
+            command = self.commands.add(packet.command)
+            packet_type = self.packet_types.add(packet.packet_type)
+
+            rows = self.packet_rows(packet)
+            if (len(rows) == 0):
+                rows = [(-1, None, None)]
+
+            for entity, tag, value in rows:
+                columns["packet"].append(n)
+                columns["timestamp"].append(timestamp)
+                columns["command"].append(command)
+                columns["packet_type"].append(packet_type)
+                columns["entity"].append(entity)
+                columns["tag"].append(-1 if tag is None else self.tags.add(tag))
+                columns["value"].append(-1 if value is None else self.values.add(value))
+
+        self.packet = np.array(columns["packet"], dtype=np.int32)
+        self.timestamp = np.array(columns["timestamp"], dtype=np.int64)
+        self.command = np.array(columns["command"], dtype=np.int16)
+        self.packet_type = np.array(columns["packet_type"], dtype=np.int16)
+        self.entity = np.array(columns["entity"], dtype=np.int32)
+        self.tag = np.array(columns["tag"], dtype=np.int32)
+        self.value = np.array(columns["value"], dtype=np.int32)
+
+        self.packets = LazyPackets(self.parsed)
+
+    # (entity id, tag, value) for each tag set by the packet
+    def packet_rows(self, packet):
+        if isinstance(packet, CreateGame):
+            rows = []
+            for tags in (packet.game_tags, packet.p1_tags, packet.p2_tags):
+                entity = self.entity_id(tags.get("EntityID"))
+                rows.extend((entity, tag, value) for tag, value in tags.items())
+
+            self.entity_ids["GameEntity"] = self.entity_id(packet.game_tags.get("EntityID"))
+            for tags in (packet.p1_tags, packet.p2_tags):
+                if (tags.get("PLAYER_ID") in self.player_names):
+                    self.entity_ids[self.player_names[tags["PLAYER_ID"]]] = self.entity_id(tags.get("EntityID"))
+            return rows
+
+        if isinstance(packet, PlayerId):
+            self.player_names[packet.id] = packet.name
+            return []
+
+        id_tags = packet.id_tags
+        entity = -1
+        for key in ("id", "ID", "Entity"):
+            if (key in id_tags):
+                entity = self.entity_id(id_tags[key])
+                if (entity >= 0):
+                    break
+
+        return [(entity, tag, value) for tag, value in packet.tags.items()]
+
+    def entity_id(self, value):
+        if (value is None):
+            return -1
+        if value.isdigit():
+            return int(value)
+        return self.entity_ids.get(value, -1)
+
+    def __len__(self):
+        return len(self.packet)
+
+    def pool(self, column):
+        return getattr(self, POOL_COLUMNS[column])
+
+    # Boolean mask of the rows matching all the conditions. Pooled columns are compared with strings, entity with ids
+    # start and end limit the timestamp (in microseconds, end excluded)
+    # Example: table.mask(command="TAG_CHANGE", tag="ATK")
+    def mask(self, start=None, end=None, **conditions):
+        mask = np.ones(len(self), dtype=bool)
+
+        for column, value in conditions.items():
+            if (column in POOL_COLUMNS):
+                value = self.pool(column).code(value)
+            mask &= (getattr(self, column) == value)
+
+        if (start is not None):
+            mask &= (self.timestamp >= start)
+        if (end is not None):
+            mask &= (self.timestamp < end)
+
+        return mask
+
+    # New table with only the rows matching the conditions (same arguments as mask) or a mask. Pools and packets are shared
+    def select(self, mask=None, **conditions):
+        if (mask is None):
+            mask = self.mask(**conditions)
+
+        table = object.__new__(PacketTable)
+        table.__dict__.update(self.__dict__)
+        for column in ("packet", "timestamp", "command", "packet_type", "entity", "tag", "value"):
+            setattr(table, column, getattr(self, column)[mask])
+        return table
+
+    # Value codes (the value column by default) converted to numbers, for numeric tags (ATK, HEALTH, TURN...)
+    # Values that are not numbers and missing values become -1, has_number tells them apart from a real -1
+    def numbers(self, codes=None):
+        numbers = np.array([int(value) if NUMBER.fullmatch(value) else -1 for value in self.values] + [-1], dtype=np.int64)
+        return numbers[self.value if (codes is None) else codes]
+
+    # Boolean mask of the value codes (the value column by default) that are numbers, same arguments as numbers
+    def has_number(self, codes=None):
+        valid = np.array([NUMBER.fullmatch(value) is not None for value in self.values] + [False], dtype=bool)
+        return valid[self.value if (codes is None) else codes]
+
+    # For each row, the value code of the last change of a tag at or before it, -1 before the first change
+    # Example: the turn of each row is table.numbers(table.running_value("TURN", entity=table.entity_ids["GameEntity"]))
+    def running_value(self, tag, entity=None):
+        mask = self.mask(tag=tag) if (entity is None) else self.mask(tag=tag, entity=entity)
+
+        last = np.where(mask, np.arange(len(self)), -1)
+        np.maximum.accumulate(last, out=last)
+
+        values = np.append(self.value, -1)
+        return values[last]
+
+    # Number of rows for each combination of keys. Keys are column names (pooled columns are decoded) or arrays with a value per row
+    # Example: ATK changes per turn are table.group_count(turn, mask=table.mask(command="TAG_CHANGE", tag="ATK")), with turn as above
+    def group_count(self, *keys, mask=None):
+        arrays = [getattr(self, key) if isinstance(key, str) else np.asarray(key) for key in keys]
+        if (mask is not None):
+            arrays = [array[mask] for array in arrays]
+
+        if (len(arrays[0]) == 0):
+            return {}
+
+        unique, counts = np.unique(np.stack(arrays, axis=1), axis=0, return_counts=True)
+
+        out = {}
+        for row, count in zip(unique, counts):
+            group = []
+            for key, code in zip(keys, row):
+                if isinstance(key, str) and (key in POOL_COLUMNS):
+                    group.append(self.pool(key)[code] if code >= 0 else None)
+                else:
+                    group.append(code.item())
+            out[tuple(group)] = count.item()
+        return out
+
+    # The value strings for an array of value codes
+    def decode_values(self, codes):
+        return [self.values[code] if code >= 0 else None for code in codes]
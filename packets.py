@@ -1,47 +1,63 @@
+from symbols import symbol, value_symbol
+import metrics
+
+# Packets use __slots__: a game has tens of thousands of them and a __dict__ for each one would take more memory than the data itself
 class Packet:
+    __slots__ = ("timestamp", "packet_type", "command")
+
     def __init__(self, timestamp, packet_type, command):
         self.timestamp = timestamp
-        self.packet_type = packet_type
-        self.command = command
+        self.packet_type = symbol(packet_type)
+        self.command = symbol(command)
     
     # Useful for debugging and in the analyzer
     def __repr__(self):
         return f"{self.command}"
 
+    # Type and values of all the fields, to check that two parses gave the same packets
+    # Packets themselves compare and hash by identity, like any object, so they can be kept in sets and used as dict keys
+    def field_values(self):
+        return (type(self), *[getattr(self, name) for name in self.fields()])
+
+    @classmethod
+    def fields(cls):
+        return [name for klass in reversed(cls.__mro__) for name in getattr(klass, "__slots__", ())]
+
+# Converts a timestamp from the logs ("HH:MM:SS.fffffff") to microseconds since midnight
+def timestamp_us(timestamp):
+    hours, minutes, seconds = timestamp.split(":")
+    seconds, _, fraction = seconds.partition(".")
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000000 + int(fraction[:6].ljust(6, "0"))
+
+# Tags in the tag lines are written as two pairs: tag=NAME value=VALUE
 def pair_tags(tags):
-    pairs = list(zip(tags[::2], tags[1::2]))
-    pairs = [(i[0][1], i[1][1]) for i in pairs]
-    return pairs
+    pairs = iter(tags)
+    return [(symbol(tag[1]), value_symbol(value[1])) for tag, value in zip(pairs, pairs)]
+
+# Inline tags are normal key-value pairs
+def tag_dict(tags):
+    return {symbol(tag): value_symbol(value) for tag, value in tags}
 
 class CreateGame(Packet):
+    __slots__ = ("game_tags", "p1_tags", "p2_tags")
+
     def __init__(self, timestamp, packet_type, command_name, GameEntity_il_tags, game_tags, player_1, player_1_tags, player_2, player_2_tags):
         super().__init__(timestamp, packet_type, command_name)
 
         # game entity info
 
-        self.game_tags = {}
-        self.game_tags[GameEntity_il_tags[0][0]] = GameEntity_il_tags[0][1]
-
-        for tag, value in pair_tags(game_tags.as_list()):
-            self.game_tags[tag] = value
+        self.game_tags = tag_dict(GameEntity_il_tags[:1])
+        self.game_tags.update(pair_tags(game_tags))
 
         # player1 info
 
-        self.p1_tags = {}
-        for tag, value in player_1[1].as_list()[:-2]:   # skips the playerid tags. I have no idea what they mean and are not handled well by the parser
-            self.p1_tags[tag] = value
-
-        for tag, value in pair_tags(player_1_tags.as_list()):
-            self.p1_tags[tag] = value
+        self.p1_tags = tag_dict(player_1[1][:-2])   # skips the playerid tags. I have no idea what they mean and are not handled well by the parser
+        self.p1_tags.update(pair_tags(player_1_tags))
         
         # player2 info
 
-        self.p2_tags = {}
-        for tag, value in player_2[1].as_list()[:-2]:   # skips the playerid tags. I have no idea what they mean and are not handled well by the parser
-            self.p2_tags[tag] = value
-
-        for tag, value in pair_tags(player_2_tags.as_list()):
-            self.p2_tags[tag] = value
+        self.p2_tags = tag_dict(player_2[1][:-2])   # skips the playerid tags. I have no idea what they mean and are not handled well by the parser
+        self.p2_tags.update(pair_tags(player_2_tags))
 
     def __repr__(self):
         game_tags = [f"\t\t{tag} = {val}\n" for tag,val in zip(self.game_tags.keys(), self.game_tags.values())]
@@ -51,19 +67,17 @@ class CreateGame(Packet):
         return f"{self.command}:\n\tGame: \n{"".join(game_tags)}\tPlayer 1: \n{"".join(p1_tags)}\tPlayer 2: \n{"".join(p2_tags)}"
 
 class FullEntity(Packet):
+    __slots__ = ("id_tags", "tags")
+
     def __init__(self, timestamp, packet_type, command, il_tags, tags):
         super().__init__(timestamp, packet_type, command)
 
         # inline tags are sometimes used to id the entity to act on (ex: if - Updating), other times just used to give more tag values
         # the plan is to check every time if an entity with the tags described exists and use this to understand how to handle the inline tags
-        self.id_tags = {}
-        for tag, value in il_tags.as_list():
-            self.id_tags[tag] = value
+        self.id_tags = tag_dict(il_tags)
         
         # these are the tags to give to the new entity/to set on an existing entity
-        self.tags = {}
-        for tag, value in pair_tags(tags.as_list()):
-            self.tags[tag] = value
+        self.tags = dict(pair_tags(tags))
     
     def __repr__(self):
         id_tags = [f"\t\t{tag} = {val}\n" for tag,val in zip(self.id_tags.keys(), self.id_tags.values())]
@@ -73,24 +87,31 @@ class FullEntity(Packet):
 
 # Show entity packets can be handled the same as full entities
 class ShowEntity(FullEntity):
+    __slots__ = ()
+
     def __init__(self, timestamp, packet_type, command, il_tags, tags):
         super().__init__(timestamp, packet_type, command, il_tags, tags)
 
         self.tags["hidden"] = "0"
 
 class TagChange(Packet):
+    # A single tag is changed, so it's kept as two fields instead of a dict. tag is None if the packet doesn't have one
+    __slots__ = ("id_tags", "tag", "value")
+
     def __init__(self, timestamp, packet_type, command, tags):
         super().__init__(timestamp, packet_type, command)
 
         # these tags are used to id the entity to act on
-        self.id_tags = {}
-        for tag, value in tags.as_list()[:-2]:
-            self.id_tags[tag] = value
-
-        # these are the tags to change
-        self.tags = {}
-        for tag, value in pair_tags(tags.as_list()[-2:]):
-            self.tags[tag] = value
+        self.id_tags = tag_dict(tags[:-2])
+
+        # this is the tag to change
+        changed = pair_tags(tags[-2:])
+        self.tag, self.value = changed[0] if changed else (None, None)
+
+    # The changed tags as a dict, like the other packets
+    @property
+    def tags(self):
+        return {self.tag: self.value} if (self.tag is not None) else {}
     
     def __repr__(self):
         id_tags = [f"\t\t{tag} = {val}\n" for tag,val in zip(self.id_tags.keys(), self.id_tags.values())]
@@ -100,17 +121,21 @@ class TagChange(Packet):
 
 # Hide entity packets can be handled the same as tag changes
 class HideEntity(TagChange):
-    def __init__(self, timestamp, packet_type, command, tags):
-        super().__init__(timestamp, packet_type, command, tags)
+    __slots__ = ()
 
-        self.tags["hidden"] = "1"
+    @property
+    def tags(self):
+        tags = super().tags
+        tags["hidden"] = "1"
+        return tags
 
 # Change entity is identical to tag change
 class ChangeEntity(TagChange):
-    def __init__(self, timestamp, packet_type, command, tags):
-        super().__init__(timestamp, packet_type, command, tags)
+    __slots__ = ()
 
 class PlayerId(Packet):
+    __slots__ = ("id", "name")
+
     def __init__(self, timestamp, packet_type, command, id, name):
         super().__init__(timestamp, packet_type, command)
         self.id = id
@@ -119,64 +144,73 @@ class PlayerId(Packet):
     def __repr__(self):
         return f"{self.command}\t{self.id}\t{self.name}\n"
 
-# Convert parsed packet data to a list of packet objects
-def GetPacketList(packet_data, dbg=False):
-    packets = []
+# Convert a single parsed packet to a packet object. Returns None for the packets that don't have one
+def MakePacket(packet, dbg=False):
+    try:
+        timestamp = packet["timestamp"]
+        ptype = packet["packet_type"]
+        command = packet["command_name"]
+        
+        if (command == "CREATE_GAME"):
+            ge_il_tags = packet["GameEntity_il_tags"]
+            game_tags = packet["game_tags"]
+            p1 = packet["player_1"]
+            p1_tags = packet["player_1_tags"]
+            p2 = packet["player_2"]
+            p2_tags = packet["player_2_tags"]
+
+            return CreateGame(timestamp, ptype, command, ge_il_tags, game_tags, p1, p1_tags, p2, p2_tags)
+
+        elif (command == "FULL_ENTITY"):
+            il_tags = packet["il_tags"]
+            tags = packet["tags"]
+
+            return FullEntity(timestamp, ptype, command, il_tags, tags)
+
+        elif (command == "SHOW_ENTITY"):
+            il_tags = packet["il_tags"]
+            tags = packet["tags"]
 
+            return ShowEntity(timestamp, ptype, command, il_tags, tags)
+        
+        elif (command == "TAG_CHANGE"):
+            tags = packet["tags"]
+
+            return TagChange(timestamp, ptype, command, tags)
+
+        elif (command == "HIDE_ENTITY"):
+            tags = packet["tags"]
+
+            return HideEntity(timestamp, ptype, command, tags)
+        
+        elif (command == "CHANGE_ENTITY"):
+            tags = packet["tags"]
+
+            return ChangeEntity(timestamp, ptype, command, tags)
+        
+        elif (command == "PlayerID"):
+            id = packet["id"]
+            name = packet["name"]
+
+            return PlayerId(timestamp, ptype, command, id, name)
+
+    # This catches packets not implemented in the parser
+    except KeyError:
+        if (dbg):
+            print(f"Error on packet: {" ".join(packet.as_list())}")
+        else:
+            pass
+
+    return None
+
+# Convert parsed packet data to packet objects one at a time. Works with the streaming output of Parser.iter_packets
+def IterPackets(packet_data, dbg=False):
     for packet in packet_data:
-        try:
-            timestamp = packet["timestamp"]
-            ptype = packet["packet_type"]
-            command = packet["command_name"]
-            
-            if (command == "CREATE_GAME"):
-                ge_il_tags = packet["GameEntity_il_tags"]
-                game_tags = packet["game_tags"]
-                p1 = packet["player_1"]
-                p1_tags = packet["player_1_tags"]
-                p2 = packet["player_2"]
-                p2_tags = packet["player_2_tags"]
-
-                packets.append(CreateGame(timestamp, ptype, command, ge_il_tags, game_tags, p1, p1_tags, p2, p2_tags))
-
-            elif (command == "FULL_ENTITY"):
-                il_tags = packet["il_tags"]
-                tags = packet["tags"]
-
-                packets.append(FullEntity(timestamp, ptype, command, il_tags, tags))
-
-            elif (command == "SHOW_ENTITY"):
-                il_tags = packet["il_tags"]
-                tags = packet["tags"]
-
-                packets.append(ShowEntity(timestamp, ptype, command, il_tags, tags))
-            
-            elif (command == "TAG_CHANGE"):
-                tags = packet["tags"]
-
-                packets.append(TagChange(timestamp, ptype, command, tags))
-
-            elif (command == "HIDE_ENTITY"):
-                tags = packet["tags"]
-
-                packets.append(HideEntity(timestamp, ptype, command, tags))
-            
-            elif (command == "CHANGE_ENTITY"):
-                tags = packet["tags"]
-
-                packets.append(ChangeEntity(timestamp, ptype, command, tags))
-            
-            elif (command == "PlayerID"):
-                id = packet["id"]
-                name = packet["name"]
-
-                packets.append(PlayerId(timestamp, ptype, command, id, name))
-
-        # This catches packets not implemented in the parser
-        except KeyError:
-            if (dbg):
-                print(f"Error on packet: {" ".join(packet.as_list())}")
-            else:
-                pass
-
-    return packets
+        packet = MakePacket(packet, dbg)
+        if (packet is not None):
+            yield packet
+
+# Convert parsed packet data to a list of packet objects
+@metrics.stage("GetPacketList")
+def GetPacketList(packet_data, dbg=False):
+    return list(IterPackets(packet_data, dbg))
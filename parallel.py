@@ -0,0 +1,72 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from parser_lib import Parser
+from packets import GetPacketList
+from tokenizer import LINE_START
+
+# Parsing of large logs split in chunks, each one parsed by a separate process
+# Chunks are only cut before a line starting a top-level command. A line like that can't be read as one of the tag lines of the packet
+# before it (these are made of key-value pairs), so the packets before it are the same whether the text is cut there or not. Each chunk
+# is parsed together with the first line of the next one, so its last packet also sees the same text that follows it in the whole log
+
+BOUNDARY = re.compile(LINE_START.pattern + r'(?:CREATE_GAME|FULL_ENTITY|SHOW_ENTITY|HIDE_ENTITY|CHANGE_ENTITY|TAG_CHANGE|BLOCK_START|BLOCK_END)\b(?!\s*=)')
+
+# The grammar is only built once in each process
+parsers = {}
+
+# Returns the positions where the string can be cut to get about `count` chunks of the same size: 0, the start of each boundary line and
+# the end of the string
+def chunk_bounds(string, count):
+    bounds = [0]
+
+    for n in range(1, count):
+        # Start of the first line after the target position
+        pos = string.find("\n", max(len(string) * n // count, bounds[-1])) + 1
+
+        while (0 < pos < len(string)):
+            line_end = string.find("\n", pos)
+            if (line_end < 0):
+                break
+
+            if BOUNDARY.match(string[pos:line_end]):
+                bounds.append(pos)
+                break
+
+            pos = line_end + 1
+
+    bounds.append(len(string))
+    return bounds
+
+def parse_chunk(args):
+    text, end, backend = args
+
+    if (backend not in parsers):
+        parsers[backend] = Parser(backend)
+
+    return GetPacketList(parsers[backend].parse_range(text, end))
+
+# Same result as GetPacketList(Parser(backend).parse_str(string)), with the text split in chunks parsed by a pool of processes
+# Each worker gets a few chunks, so that the pool stays busy when some chunks take longer than others
+def GetPacketListParallel(string, workers=None, backend="pyparsing", chunks_per_worker=4):
+    workers = workers or os.cpu_count()
+
+    if (workers == 1):
+        return parse_chunk((string, len(string), backend))
+
+    bounds = chunk_bounds(string, workers * chunks_per_worker)
+
+    tasks = []
+    for start, end in zip(bounds, bounds[1:]):
+        # The first line of the next chunk is passed along with the chunk
+        line_end = string.find("\n", end)
+        lookahead_end = len(string) if (line_end < 0) else line_end + 1
+        tasks.append((string[start:lookahead_end], end - start, backend))
+
+    packets = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_packets in executor.map(parse_chunk, tasks):
+            packets.extend(chunk_packets)
+
+    return packets
@@ -1,8 +1,29 @@
 from pyparsing import Word, alphas, nums, Combine, Suppress, Optional, Group, Keyword, OneOrMore, alphanums, White, ZeroOrMore, Regex, Literal, SkipTo
 import re
+import io
+
+from tokenizer import LineTokenizer, ParsedGroup
+import metrics
+
+# Patterns removed from the logs before parsing, see Parser.clean_str
+EMPTY_TAG = re.compile(r'\w+=[ \t]')
+EMPTY_TAG_EOL = re.compile(r'\w+=\n')
+EMPTY_ENTITY = re.compile(r'Entity=\[')
+INVALID_CARD_TYPE = re.compile(r'\[cardType=INVALID\]')
+
+# Has to be increased whenever a change to the rules (or to clean_str) changes the packets produced from the same log, so that logs
+# parsed by the previous version and saved in a cache (see log_cache.py) are parsed again
+PARSER_VERSION = 1
 
 class Parser:
-    def __init__(self):
+    def __init__(self, backend="pyparsing"):
+        # Two backends are available: the pyparsing grammar defined below and a faster hand-written tokenizer giving the same output
+        if (backend not in ("pyparsing", "tokenizer")):
+            raise ValueError(f"Unknown parser backend: '{backend}'")
+
+        self.backend = backend
+        self.tokenizer = LineTokenizer()
+
         # For readability purposes, the various rules are defined by methods that have to be called when the parser object is created
         self.basic_rules()
         self.tag_change_rule()
@@ -97,13 +118,41 @@ class Parser:
         command_name = Keyword("PlayerID")("command_name")
         self.playerId_packet = self.line_start + command_name + Suppress("=") + Word(alphanums)("id") + Suppress(",") + Suppress("PlayerName=") + Word(alphanums + "#")("name")
 
-    def parse_str(self, string):
+    # Removes the parts of the text that confuse the parsing rules. Works both on the whole log and on single lines
+    def clean_str(self, string):
         # Sometimes in the logs there are tag names without an assigned value. This creates issues with the parsing rules and it is easier to remove them before processing the contents
-        string = re.sub(r'\w+=[ \t]', '', string)
-        string = re.sub(r'\w+=\n', '\n', string)    # An empty tag at end of line must be handled differently. We need to put the \n back or the parser mixes up lines
+        string = EMPTY_TAG.sub('', string)
+        string = EMPTY_TAG_EOL.sub('\n', string)    # An empty tag at end of line must be handled differently. We need to put the \n back or the parser mixes up lines
 
         # These acause problems by messing up the way the parser recognises key-value pairs
-        string = re.sub(r'Entity=\[', '', string)   # This is basically an empty tag. Could be handled with a recursive structure in the parser, but doesn't seem to be worth it
-        string = re.sub(r'\[cardType=INVALID\]', '', string)    # The square brackets are only used like this for this specific expression, messing up some rules. It also doesn't contain useful info
+        string = EMPTY_ENTITY.sub('', string)   # This is basically an empty tag. Could be handled with a recursive structure in the parser, but doesn't seem to be worth it
+        string = INVALID_CARD_TYPE.sub('', string)    # The square brackets are only used like this for this specific expression, messing up some rules. It also doesn't contain useful info
+
+        return string
+
+    @metrics.stage("parse_str")
+    def parse_str(self, string):
+        string = self.clean_str(string)
+
+        if (self.backend == "tokenizer"):
+            return ParsedGroup(self.tokenizer.tokenize(io.StringIO(string)))
 
         return self.expr.search_string(string)
+
+    # Same as parse_str, but only returns the packets starting before position `end` of the string (the start of a line). The text after
+    # it is still used by the packets that look ahead, so these are the same packets that parse_str finds in that part of a longer text
+    def parse_range(self, string, end):
+        head = self.clean_str(string[:end])
+        string = head + self.clean_str(string[end:])
+
+        if (self.backend == "tokenizer"):
+            # A last line without a newline is only possible at the end of the string
+            lines = head.count("\n") + (not head.endswith("\n"))
+            return ParsedGroup(packet for packet in self.tokenizer.tokenize(io.StringIO(string)) if packet.line < lines)
+
+        return [tokens for tokens, start, _ in self.expr.scan_string(string) if start < len(head)]
+
+    # Streaming alternative to parse_str: reads the log line by line and yields each packet as soon as it is complete
+    # Memory use doesn't depend on the size of the log. Always uses the tokenizer, since the pyparsing grammar needs the whole text
+    def iter_packets(self, fileobj):
+        return self.tokenizer.tokenize(self.clean_str(line) for line in fileobj)
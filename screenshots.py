@@ -1,21 +1,32 @@
+import argparse
+import queue
 import subprocess
+import threading
 import time
 from datetime import datetime
-import mss
 from PIL import Image, ImageDraw, ImageFont
 import os
 
 # THE FOLLOWING CODE ONLY RUN ON A XORG DESKTOP ENVIRONMENT!!!!
 # THERE IS CURRENTLY NO WAY TO RUN THIS OR SOMETHING SIMILAR ON WAYLAND AND A DIFFFERENT (AND MORE COMPLEX) APPROACH IS REQUIRED
+#
+# Frames are grabbed by the main loop and put in a bounded queue, a pool of encoder threads takes them from there, draws the timestamp
+# and saves them. Saving (the PNG compression especially) can take longer than the interval between two frames, this way it doesn't delay
+# the next grab. If the encoders fall behind and the queue is full, the grab waits a little and then the frame is dropped and counted
+#
+# With deduplication on, frames that look the same as the last saved one (see frame_hash) are not saved at all. The folder then gets an
+# index.csv mapping the time of every frame to the file of the saved frame showing it, which the analyzer uses to find the screenshots
+
+class WindowNotFound(Exception):
+    pass
 
 def get_window_geometry(window_name):
     # Get info about the window from xwininfo as a subprocess
     try:
-        output = subprocess.check_output(["xwininfo", "-name", window_name]).decode("utf-8")
+        output = subprocess.check_output(["xwininfo", "-name", window_name], stderr=subprocess.DEVNULL).decode("utf-8")
     except subprocess.CalledProcessError:
-        print(f"Unable to find window with name: '{window_name}'")
-        exit(1)
-    
+        raise WindowNotFound(f"Unable to find window with name: '{window_name}'")
+
     # Parse command output and extract window geometry
     geometry = {}
     for line in output.split("\n"):
@@ -27,7 +38,7 @@ def get_window_geometry(window_name):
             geometry['width'] = int(line.split(":")[1].strip())
         elif "Height:" in line:
             geometry['height'] = int(line.split(":")[1].strip())
-    
+
     return geometry
 
 # Format geometry data in a way mss can understand
@@ -36,58 +47,319 @@ def get_monitor_obj(geometry):
     top = geometry['top']
     width = geometry['width']
     height = geometry['height']
-    
+
     monitor = {"top": top, "left": left, "width": width, "height": height}
     return monitor
 
+# Geometry backends have a geometry(window_name) method returning the geometry of the window, or raising WindowNotFound
+class XwininfoBackend:
+    def geometry(self, window_name):
+        return get_window_geometry(window_name)
+
+# Geometry of the window, looked up again only every max_age seconds or after a grab failed (the window was probably moved or resized)
+# Looking it up means starting xwininfo, which takes tens of milliseconds, too much to do for every frame
+class WindowGeometryCache:
+    def __init__(self, window_name, backend=None, max_age=5.0):
+        self.window_name = window_name
+        self.backend = backend or XwininfoBackend()
+        self.max_age = max_age
+
+        self.monitor = None
+        self.updated = 0
+        self.lookups = 0
+
+    # The geometry as mss wants it
+    def get(self):
+        if (self.monitor is None) or (time.monotonic() - self.updated > self.max_age):
+            self.lookups += 1
+            self.monitor = get_monitor_obj(self.backend.geometry(self.window_name))
+            self.updated = time.monotonic()
+        return self.monitor
+
+    def invalidate(self):
+        self.monitor = None
+
 def get_timestamp():
     return datetime.now().strftime("%Y-%m-%d_%H-%M-%S.%f")[:-3]
 
-window_title = "Hearthstone"
+# Configure a font to write timestamps
+def load_font(size=20):
+    font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+    if not os.path.exists(font_path):
+        # Try and alternative
+        font_path = "/usr/share/fonts/truetype/freefont/FreeSansBold.ttf"
 
-out_folder = f"test-data/screenshots/{get_timestamp()}"
-os.makedirs(out_folder, exist_ok=True)
+    try:
+        return ImageFont.truetype(font_path, size)
+    except OSError:
+        return ImageFont.load_default()
 
-# Get window geometry and format it
-geometry = get_window_geometry(window_title)
-monitor = get_monitor_obj(geometry)
 
-# Configure a font to write timestamps
-font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
-if not os.path.exists(font_path):
-    # Try and alternative
-    font_path = "/usr/share/fonts/truetype/freefont/FreeSansBold.ttf"
+# Raised by the frame sources when a frame can't be grabbed, the capture continues from the next cycle
+class GrabError(Exception):
+    pass
 
-font = ImageFont.truetype(font_path, 20)
+# A grabbed frame: its size and RGB pixels, with the time it was taken and the timings measured while it goes through the pipeline
+class Frame:
+    def __init__(self, size, rgb, timestamp):
+        self.size = size
+        self.rgb = rgb
+        self.timestamp = timestamp
 
-# Mainloop to capture screenshots
-with mss.mss() as sct:
-    while True:
-        start_time = time.time()
+        self.capture_time = 0
+        self.queued_at = 0
+
+# Frame source grabbing the window of the game with mss
+# Frame sources only need a grab method returning a Frame, so the pipeline can be run without a display (see FakeFrameSource)
+# geometry is a WindowGeometryCache, by default one using xwininfo
+class MssFrameSource:
+    def __init__(self, window_title, geometry=None):
+        import mss
+        import mss.exception
+
+        self.geometry = geometry or WindowGeometryCache(window_title)
+        self.sct = mss.mss()
+        self.errors = (mss.exception.ScreenShotError,)
+
+    def grab(self):
+        # Area to capture, only looked up again when the cached geometry is old
+        try:
+            monitor = self.geometry.get()
+        except WindowNotFound as error:
+            raise GrabError(error)
 
         # the try except block is needed to handle some errors that might be thrown when the window is being moved/manipulated while taking a screenshot
         # excecution should be able to continue from the next cycle, at worse skipping a few
         try:
-            # Update area to capture
-            monitor = get_monitor_obj(get_window_geometry(window_title))
-            
             # Capture the screenshot with the info given
-            img = sct.grab(monitor)
+            img = self.sct.grab(monitor)
+        except self.errors as error:
+            self.geometry.invalidate()
+            raise GrabError(error)
+
+        return Frame(img.size, img.rgb, get_timestamp())
+
+    def close(self):
+        self.sct.close()
+
+# Frame source producing frames without a display, for running the pipeline in tests. The frames are a gradient that changes every
+# repeat frames
+class FakeFrameSource:
+    def __init__(self, width=1280, height=720, repeat=1):
+        self.size = (width, height)
+        self.repeat = repeat
+        self.count = 0
+
+    def grab(self):
+        self.count += 1
+        shift = (self.count - 1) // self.repeat * 40
+        row = bytes(channel for x in range(self.size[0]) for channel in ((x + shift) % 256, 100, 50))
+        return Frame(self.size, row * self.size[1], get_timestamp())
+
+    def close(self):
+        pass
+
+
+# Perceptual hash of a frame: the frame scaled down to hash_size x hash_size in grayscale, one bit for each pixel brighter than the one
+# on its right. Frames that only differ in small details (or in compression noise) get the same hash or hashes a few bits apart
+def frame_hash(frame, hash_size=16):
+    small = Image.frombytes('RGB', frame.size, frame.rgb).convert("L").resize((hash_size + 1, hash_size), Image.BOX, reducing_gap=2.0)
+    pixels = small.tobytes()
+
+    bits = 0
+    for y in range(hash_size):
+        row = pixels[y * (hash_size + 1):(y + 1) * (hash_size + 1)]
+        for x in range(hash_size):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return bits
+
+def hash_distance(a, b):
+    return (a ^ b).bit_count()
+
+# File extension and PIL save options for an output format. level is the PNG compression level (0-9) or the WebP method (0-6)
+def save_options(image_format, level):
+    if (image_format == "png"):
+        return "png", {"compress_level": level}
+    if (image_format == "webp"):
+        return "webp", {"lossless": True, "method": min(level, 6)}
+    raise ValueError(f"Unknown image format: {image_format}")
+
+class CapturePipeline:
+    # dedup_distance enables deduplication: frames with a hash at most this many bits away from the last saved one are skipped
+    def __init__(self, source, out_folder, image_format="png", level=6, workers=2, queue_size=8, put_timeout=0.25, timing_log=True,
+                 dedup_distance=None):
+        self.source = source
+        self.out_folder = out_folder
+        self.extension, self.options = save_options(image_format, level)
+
+        self.dedup_distance = dedup_distance
+        self.last_hash = None
+        self.last_file = None
+        self.duplicates = 0
+
+        # Time of each frame -> file of the saved frame showing it, only written with deduplication on
+        self.index = None
+        if (dedup_distance is not None):
+            self.index = open(os.path.join(out_folder, "index.csv"), "w")
+            self.index.write("timestamp,file\n")
 
-        except mss.exception.ScreenShotError:
+        # How long a grab waits for space in the queue before its frame is dropped
+        self.put_timeout = put_timeout
+
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.font = load_font()
+
+        self.saved = 0
+        self.dropped = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+        # One line per saved frame: capture, time spent in the queue and encoding time, in milliseconds
+        self.timing_log = None
+        if (timing_log):
+            self.timing_log = open(os.path.join(out_folder, "timing.csv"), "w")
+            self.timing_log.write("timestamp,capture_ms,queue_ms,encode_ms\n")
+
+        self.workers = [threading.Thread(target=self.encode_frames, daemon=True) for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    # Grabs a frame and queues it for the encoders. Returns False if the frame was not queued
+    def capture(self):
+        start = time.perf_counter()
+        try:
+            frame = self.source.grab()
+        except GrabError:
             print(f"Encountered an error while taking a screenshot at {get_timestamp()}\nContinuing normally from the next cycle\n")
-            continue
+            return False
+        frame.capture_time = time.perf_counter() - start
+
+        if (self.dedup_distance is not None):
+            bits = frame_hash(frame)
+            if (self.last_hash is not None) and (hash_distance(bits, self.last_hash) <= self.dedup_distance):
+                self.duplicates += 1
+                self.index.write(f"{frame.timestamp},{self.last_file}\n")
+                return False
+
+        frame.queued_at = time.perf_counter()
+        try:
+            self.frames.put(frame, timeout=self.put_timeout)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+
+        if (self.dedup_distance is not None):
+            self.last_hash = bits
+            self.last_file = self.frame_filename(frame)
+            self.index.write(f"{frame.timestamp},{self.last_file}\n")
+        return True
+
+    def frame_filename(self, frame):
+        return f"screenshot_{frame.timestamp}.{self.extension}"
+
+    def encode_frames(self):
+        while True:
+            frame = self.frames.get()
+            if (frame is None):
+                break
+
+            queue_time = time.perf_counter() - frame.queued_at
+            start = time.perf_counter()
+            # A frame that can't be saved (full disk, bad frame...) is counted and skipped, the encoder keeps going
+            try:
+                self.save_frame(frame)
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                print(f"Encountered an error while saving the screenshot taken at {frame.timestamp}: {e}")
+                continue
+            encode_time = time.perf_counter() - start
+
+            with self.lock:
+                self.saved += 1
+                if (self.timing_log):
+                    self.timing_log.write(f"{frame.timestamp},{1000 * frame.capture_time:.1f},{1000 * queue_time:.1f},{1000 * encode_time:.1f}\n")
 
+    def save_frame(self, frame):
         # Add the timestamp to te image
-        img_pil = Image.frombytes('RGB', img.size, img.rgb)
+        img_pil = Image.frombytes('RGB', frame.size, frame.rgb)
         draw = ImageDraw.Draw(img_pil)
-        draw.text((10, 10), get_timestamp(), font=font, fill="white")
-        
+        draw.text((10, 10), frame.timestamp, font=self.font, fill="white")
+
         # Save the image
-        filename = f"{out_folder}/screenshot_{get_timestamp()}.png"
-        img_pil.save(filename)
-        
-        # Compute time taken to take a screenshot --- optional
-        elapsed_time = time.time() - start_time
-        sleep_time = max(0, 0.5 - elapsed_time)  # This sets the frequency, taking into consideration what we want and what the computer can currently do
-        time.sleep(sleep_time)
+        filename = f"{self.out_folder}/{self.frame_filename(frame)}"
+        img_pil.save(filename, **self.options)
+
+    # Captures a frame every interval seconds, for count frames or until interrupted
+    def run(self, interval=0.5, count=None):
+        n = 0
+        try:
+            while (count is None) or (n < count):
+                start_time = time.time()
+                self.capture()
+                n += 1
+
+                # This sets the frequency, taking into consideration what we want and what the computer can currently do
+                elapsed_time = time.time() - start_time
+                time.sleep(max(0, interval - elapsed_time))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    # Waits for the queued frames to be saved and stops the encoders
+    # Encoders that died can't empty the queue, so the stop signals are only sent while some are still running
+    def close(self):
+        for _ in self.workers:
+            while any(worker.is_alive() for worker in self.workers):
+                try:
+                    self.frames.put(None, timeout=self.put_timeout)
+                    break
+                except queue.Full:
+                    pass
+        for worker in self.workers:
+            worker.join()
+
+        if (self.timing_log):
+            self.timing_log.close()
+            self.timing_log = None
+        if (self.index):
+            self.index.close()
+            self.index = None
+        self.source.close()
+
+        print(f"{self.saved} frames saved, {self.duplicates} duplicates skipped, {self.dropped} dropped, {self.errors} errors")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Takes a screenshot of the game window every interval seconds")
+    parser.add_argument("--window", default="Hearthstone", help="title of the window to capture")
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--format", choices=["png", "webp"], default="png", help="webp is saved lossless")
+    parser.add_argument("--level", type=int, default=6, help="PNG compression level (0-9) or WebP method (0-6)")
+    parser.add_argument("--workers", type=int, default=2, help="number of encoder threads")
+    parser.add_argument("--queue", type=int, default=8, help="frames waiting to be encoded before new ones are dropped")
+    parser.add_argument("--count", type=int, help="stop after this many frames")
+    parser.add_argument("--fake", action="store_true", help="save generated frames instead of capturing the window")
+    parser.add_argument("--dedup", type=int, nargs="?", const=3, metavar="BITS",
+                        help="skip frames whose hash differs by at most BITS bits (3 if not given) from the last saved frame")
+    parser.add_argument("--geometry-refresh", type=float, default=5.0, help="seconds between two lookups of the window geometry")
+    args = parser.parse_args()
+
+    if not args.fake:
+        geometry = WindowGeometryCache(args.window, max_age=args.geometry_refresh)
+        try:
+            geometry.get()
+        except WindowNotFound as error:
+            print(error)
+            exit(1)
+
+    out_folder = f"test-data/screenshots/{get_timestamp()}"
+    os.makedirs(out_folder, exist_ok=True)
+
+    source = FakeFrameSource() if args.fake else MssFrameSource(args.window, geometry)
+
+    pipeline = CapturePipeline(source, out_folder, image_format=args.format, level=args.level, workers=args.workers, queue_size=args.queue,
+                               dedup_distance=args.dedup)
+    pipeline.run(interval=args.interval, count=args.count)
@@ -0,0 +1,19 @@
+import re
+
+# Shared symbol table for the strings that appear over and over in a log: tag names, commands and enum-like values (PLAY, MINION, card
+# ids, small numbers...). Each of them is kept once, instead of once for every packet and entity using it
+# Other values (entity names, timestamps) are almost always different and are left alone, so the table doesn't grow with the log
+
+SYMBOLS = {}
+
+COMMON_VALUE = re.compile(r'[A-Z0-9_]+')
+
+# Returns the shared copy of a tag name (or any other string that should always be shared)
+def symbol(string):
+    return SYMBOLS.setdefault(string, string)
+
+# Returns the shared copy of a tag value if it's one of the common ones, the value itself otherwise
+def value_symbol(value):
+    if COMMON_VALUE.fullmatch(value):
+        return SYMBOLS.setdefault(value, value)
+    return value
@@ -0,0 +1,154 @@
+import random
+import sys
+
+# Generator of synthetic Power.log files, used by the benchmarks to get logs of any size without real games
+# The logs are made of Battlegrounds-like games: each starts with CREATE_GAME (printed by GameState and by PowerTaskList, like the game
+# does) and the PlayerID lines and the heroes, then every turn has a BLOCK_START/BLOCK_END with new minions (FULL_ENTITY) followed by a random mix of
+# TAG_CHANGE, SHOW_ENTITY, HIDE_ENTITY, CHANGE_ENTITY and lines that aren't packets. Games end with the placement of the first player
+# The lines have the same quirks as the real logs that Parser.clean_str has to remove: tags without a value (in the middle and at the end
+# of a line), Entity=[...] and [cardType=INVALID]
+
+POWER = "GameState.DebugPrintPower()"
+TASK_LIST = "PowerTaskList.DebugPrintPower()"
+GAME = "GameState.DebugPrintGame()"
+
+PLAYERS = ((2, 5, "Lvetto#2345"), (3, 13, "BaconShop"))
+# Entity id and card id of the hero of each player
+HEROES = ((4, "TB_BaconShop_HERO_22"), (5, "TB_BaconShop_HERO_49"))
+MINIONS = (("Alleycat", "BG_CFM_315"), ("Wrath Weaver", "BGS_004"), ("Murloc Tidehunter", "BG_EX1_506"), ("Rockpool Hunter", "BGS_043"),
+           ("Scallywag", "BGS_061"), ("Micro Mummy", "BG_ULD_217"))
+RACES = ("BEAST", "DEMON", "MURLOC", "PIRATE", "MECHANICAL")
+ZONES = ("PLAY", "HAND", "SETASIDE", "GRAVEYARD")
+
+class SyntheticLog:
+    def __init__(self, file, seed=0):
+        self.file = file
+        self.rnd = random.Random(seed)
+
+        # Seconds since midnight
+        self.time = 15 * 3600.0
+
+        self.bytes = 0
+        self.lines = 0
+
+    def line(self, packet_type, content):
+        self.time += self.rnd.random() * 0.01
+        hours, rest = divmod(self.time, 3600)
+        minutes, seconds = divmod(rest, 60)
+
+        line = f"D {int(hours) % 24:02d}:{int(minutes):02d}:{seconds:010.7f} {packet_type} - {content}\n"
+        self.file.write(line)
+        self.bytes += len(line)
+        self.lines += 1
+
+    def tags(self, packet_type, tags, indent="    "):
+        for tag, value in tags:
+            self.line(packet_type, f"{indent}tag={tag} value={value}")
+
+    def entity(self, minion):
+        entity_id, name, card_id, zone = minion
+        return f"[entityName={name} id={entity_id} zone={zone} zonePos={self.rnd.randint(0, 7)} cardId={card_id} player=5]"
+
+    def create_game(self):
+        for packet_type in (POWER, TASK_LIST):
+            self.line(packet_type, "CREATE_GAME")
+            self.line(packet_type, "    GameEntity EntityID=1")
+            self.tags(packet_type, [("CARDTYPE", "GAME"), ("ZONE", "PLAY"), ("ENTITY_ID", "1"), ("TURN", "1")], "        ")
+
+            for (entity_id, player_id, name), (hero_id, hero_card) in zip(PLAYERS, HEROES):
+                self.line(packet_type, f"    Player EntityID={entity_id} PlayerID={player_id} GameAccountId=[hi={self.rnd.getrandbits(56)} lo={self.rnd.getrandbits(24)}]")
+                self.tags(packet_type, [("PLAYER_ID", player_id), ("HERO_ENTITY", hero_id), ("CARDTYPE", "PLAYER"), ("ENTITY_ID", entity_id),
+                                        ("CONTROLLER", player_id)], "        ")
+
+            for entity_id, player_id, name in PLAYERS:
+                self.line(GAME, f"PlayerID={player_id}, PlayerName={name}")
+
+        for (entity_id, player_id, name), (hero_id, hero_card) in zip(PLAYERS, HEROES):
+            self.line(POWER, f"FULL_ENTITY - Creating ID={hero_id} CardID={hero_card}")
+            self.tags(POWER, [("CONTROLLER", player_id), ("CARDTYPE", "HERO"), ("ZONE", "PLAY"), ("ENTITY_ID", hero_id), ("HEALTH", 30)])
+
+        self.line(POWER, "TAG_CHANGE Entity=GameEntity tag=STATE value=RUNNING ")
+        for entity_id, player_id, name in PLAYERS:
+            self.line(POWER, f"TAG_CHANGE Entity={name} tag=PLAYSTATE value=PLAYING ")
+
+    def turn(self, turn, minions, next_id):
+        rnd = self.rnd
+
+        self.line("GameState.DebugPrintPowerList()", f"Count={rnd.randint(1, 40)}")
+        self.line(POWER, f"TAG_CHANGE Entity=GameEntity tag=TURN value={turn} ")
+
+        # The shop is refreshed: new minions are created inside a block
+        keyword = rnd.choice(("TriggerKeyword=TAG_NOT_SET", "TriggerKeyword="))
+        self.line(POWER, "BLOCK_START BlockType=TRIGGER Entity=[entityName=Bob's Tavern id=3 zone=PLAY zonePos=0 cardId=TB_BaconShopBob "
+                         f"player=13] EffectCardId=System.String[] EffectIndex=0 Target=0 SubOption=-1 {keyword}")
+        for _ in range(rnd.randint(3, 8)):
+            name, card_id = rnd.choice(MINIONS)
+            self.line(POWER, f"FULL_ENTITY - Creating ID={next_id} CardID={card_id}")
+            self.tags(POWER, [("CONTROLLER", rnd.choice(("5", "13"))), ("CARDTYPE", "MINION"), ("ZONE", "SETASIDE"), ("ENTITY_ID", next_id),
+                              ("ATK", rnd.randint(1, 9)), ("HEALTH", rnd.randint(1, 9)), ("CARDRACE", rnd.choice(RACES)), ("TECH_LEVEL", 1)])
+            minions.append([next_id, name, card_id, "SETASIDE"])
+            next_id += 1
+        self.line(POWER, "BLOCK_END")
+
+        # The turn itself
+        for _ in range(rnd.randint(10, 40)):
+            minion = rnd.choice(minions)
+            entity_id, name, card_id, zone = minion
+            r = rnd.random()
+
+            if (r < 0.45):
+                tag = rnd.choice(("ZONE", "ATK", "HEALTH", "DAMAGE", "ZONE_POSITION"))
+                value = rnd.choice(ZONES) if (tag == "ZONE") else rnd.randint(0, 12)
+                self.line(POWER, f"TAG_CHANGE Entity={self.entity(minion)} tag={tag} value={value} ")
+                if (tag == "ZONE"):
+                    minion[3] = value
+            elif (r < 0.55):
+                name = rnd.choice(("GameEntity",) + tuple(player[2] for player in PLAYERS))
+                self.line(POWER, f"TAG_CHANGE Entity={name} tag=NUM_TURNS_IN_PLAY value={turn} ")
+            elif (r < 0.65):
+                # Hidden entities have an empty cardId and an invalid card type in their description
+                self.line(POWER, f"SHOW_ENTITY - Updating Entity=[entityName=UNKNOWN ENTITY [cardType=INVALID] id={entity_id} zone=DECK zonePos=0 "
+                                 f"cardId= player=5] CardID={card_id}")
+                self.tags(POWER, [("ZONE", "HAND"), ("ATK", rnd.randint(1, 9)), ("HEALTH", rnd.randint(1, 9))])
+            elif (r < 0.7):
+                self.line(POWER, f"HIDE_ENTITY - Entity={self.entity(minion)} tag=ZONE value=DECK")
+            elif (r < 0.75):
+                self.line(POWER, f"CHANGE_ENTITY - Updating Entity={self.entity(minion)} CardID={card_id}_G")
+                self.tags(POWER, [("PREMIUM", 1)])
+            elif (r < 0.85):
+                self.line(TASK_LIST, f"TAG_CHANGE Entity={self.entity(minion)} tag=EXHAUSTED value=0 ")
+            elif (r < 0.9):
+                self.line("GameState.DebugPrintOptions()", f"id={rnd.randint(0, 20)} ")
+            elif (r < 0.95):
+                # Tags without a name known to the game are logged as numbers
+                self.line(POWER, f"TAG_CHANGE Entity=[entityName={name} id={entity_id} zone={zone} zonePos=2 cardId= player=5] tag=1068 value=0 ")
+            else:
+                self.line(TASK_LIST, "BLOCK_END")
+
+        return next_id
+
+    def game(self, turns):
+        self.create_game()
+
+        minions = []
+        next_id = HEROES[-1][0] + 1
+        for turn in range(1, turns + 1):
+            next_id = self.turn(turn, minions, next_id)
+
+        hero_id, hero_card = HEROES[0]
+        self.line(POWER, f"TAG_CHANGE Entity=[entityName=Hero id={hero_id} zone=PLAY zonePos=0 cardId={hero_card} player={PLAYERS[0][1]}] "
+                         f"tag=PLAYER_LEADERBOARD_PLACE value={self.rnd.randint(1, 8)} ")
+        self.line(POWER, "TAG_CHANGE Entity=GameEntity tag=STATE value=COMPLETE ")
+        self.line("GameState.DebugPrintPowerList()", "Count=1")
+
+# Writes games of the given number of turns to file until at least size bytes are written. Returns the number of bytes and of lines
+def write_log(file, size, turns=20, seed=0):
+    log = SyntheticLog(file, seed)
+    while (log.bytes < size):
+        log.game(turns)
+    return log.bytes, log.lines
+
+
+# Writes a log of the given size in MB to stdout: python synthetic_log.py [MB]
+if __name__ == "__main__":
+    write_log(sys.stdout, float(sys.argv[1]) * 1e6 if len(sys.argv) > 1 else 1e6)
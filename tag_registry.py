@@ -0,0 +1,146 @@
+# Registry of integer codes for tag names and tag values, used by the entities to store their tags
+#
+# Tag names that are Hearthstone GameTags get their id from the game's own GameTag enum, any other name (including the pseudo-tags used
+# by the logs, such as Entity, CardID or zonePos) gets a code assigned the first time it's seen, starting from DYNAMIC_BASE. These are only
+# valid inside the process
+# Values of the tags with an enum in the game (ZONE, CARDTYPE, STATE...) are coded with their value in the enum, so a value code only means
+# something together with its tag. Other values (numbers, card ids, names) are kept as given, the strings from the logs are already shared
+# through symbols.py
+
+DYNAMIC_BASE = 1 << 20
+
+# Code used in lookups for tag names that were never registered: no entity can have it
+UNKNOWN = -1
+
+GAME_TAGS = {
+    "PLAYSTATE": 17,
+    "STEP": 19,
+    "TURN": 20,
+    "FATIGUE": 22,
+    "CURRENT_PLAYER": 23,
+    "FIRST_PLAYER": 24,
+    "RESOURCES_USED": 25,
+    "RESOURCES": 26,
+    "HERO_ENTITY": 27,
+    "MAXHANDSIZE": 28,
+    "STARTHANDSIZE": 29,
+    "PLAYER_ID": 30,
+    "TEAM_ID": 31,
+    "DEFENDING": 36,
+    "ATTACKING": 38,
+    "EXHAUSTED": 43,
+    "DAMAGE": 44,
+    "HEALTH": 45,
+    "ATK": 47,
+    "COST": 48,
+    "ZONE": 49,
+    "CONTROLLER": 50,
+    "OWNER": 51,
+    "ENTITY_ID": 53,
+    "ELITE": 114,
+    "MAXRESOURCES": 176,
+    "CARD_SET": 183,
+    "DURABILITY": 187,
+    "SILENCED": 188,
+    "WINDFURY": 189,
+    "TAUNT": 190,
+    "STEALTH": 191,
+    "SPELLPOWER": 192,
+    "DIVINE_SHIELD": 194,
+    "CHARGE": 197,
+    "NEXT_STEP": 198,
+    "CLASS": 199,
+    "CARDRACE": 200,
+    "FACTION": 201,
+    "CARDTYPE": 202,
+    "RARITY": 203,
+    "STATE": 204,
+    "SUMMONED": 205,
+    "FREEZE": 208,
+    "ENRAGED": 212,
+    "DEATHRATTLE": 217,
+    "BATTLECRY": 218,
+    "SECRET": 219,
+    "COMBO": 220,
+    "FROZEN": 260,
+    "JUST_PLAYED": 261,
+    "LINKED_ENTITY": 262,
+    "ZONE_POSITION": 263,
+    "NUM_TURNS_IN_PLAY": 271,
+    "ARMOR": 292,
+    "CREATOR": 313,
+    "TECH_LEVEL": 1440,
+}
+
+ENUMS = {
+    "ZONE": {
+        "INVALID": 0, "PLAY": 1, "DECK": 2, "HAND": 3, "GRAVEYARD": 4, "REMOVEDFROMGAME": 5, "SETASIDE": 6, "SECRET": 7,
+    },
+    "CARDTYPE": {
+        "INVALID": 0, "GAME": 1, "PLAYER": 2, "HERO": 3, "MINION": 4, "SPELL": 5, "ENCHANTMENT": 6, "WEAPON": 7, "ITEM": 8,
+        "TOKEN": 9, "HERO_POWER": 10,
+    },
+    "STATE": {
+        "INVALID": 0, "LOADING": 1, "RUNNING": 2, "COMPLETE": 3,
+    },
+    "PLAYSTATE": {
+        "INVALID": 0, "PLAYING": 1, "WINNING": 2, "LOSING": 3, "WON": 4, "LOST": 5, "TIED": 6, "DISCONNECTED": 7, "CONCEDED": 8,
+    },
+    "STEP": {
+        "INVALID": 0, "BEGIN_FIRST": 1, "BEGIN_SHUFFLE": 2, "BEGIN_DRAW": 3, "BEGIN_MULLIGAN": 4, "MAIN_BEGIN": 5, "MAIN_READY": 6,
+        "MAIN_RESOURCE": 7, "MAIN_DRAW": 8, "MAIN_START": 9, "MAIN_ACTION": 10, "MAIN_COMBAT": 11, "MAIN_END": 12, "MAIN_NEXT": 13,
+        "FINAL_WRAPUP": 14, "FINAL_GAMEOVER": 15, "MAIN_CLEANUP": 16, "MAIN_START_TRIGGERS": 17,
+    },
+}
+ENUMS["NEXT_STEP"] = ENUMS["STEP"]
+
+
+# Code of an enum value. Plain ints set on an enum tag (entity["ZONE"] = 7) are not codes and are given back as they are
+# There is one instance for each value of each enum, shared by all the entities
+class EnumValue(int):
+    __slots__ = ()
+
+
+class TagRegistry:
+    def __init__(self):
+        self.tag_codes = dict(GAME_TAGS)
+        self.tag_names = {code: name for name, code in GAME_TAGS.items()}
+
+        # For the tags with an enum: tag code -> (value -> code, code -> value)
+        self.enums = {}
+        for tag, values in ENUMS.items():
+            codes = {value: EnumValue(code) for value, code in values.items()}
+            self.enums[GAME_TAGS[tag]] = (codes, {code: value for value, code in values.items()})
+
+    # Code of a tag name, assigned if the name was never seen
+    def tag_code(self, name):
+        code = self.tag_codes.get(name)
+        if (code is None):
+            code = self.tag_codes[name] = DYNAMIC_BASE + len(self.tag_names) - len(GAME_TAGS)
+            self.tag_names[code] = name
+        return code
+
+    # Code of a tag name without assigning new ones, for lookups
+    def find_tag(self, name):
+        return self.tag_codes.get(name, UNKNOWN)
+
+    def tag_name(self, code):
+        return self.tag_names[code]
+
+    # Value of the given tag (a code) as stored by the entities: the enum code if the tag has an enum with that value, the value itself
+    # otherwise (numbers, values missing from the enum...)
+    def value_code(self, tag, value):
+        enum = self.enums.get(tag)
+        if (enum is not None) and isinstance(value, str):
+            return enum[0].get(value, value)
+        return value
+
+    # Reverse of value_code
+    def value_name(self, tag, code):
+        if (tag in self.enums) and (type(code) is EnumValue):
+            return self.enums[tag][1][code]
+        return code
+
+
+# Registry shared by all the entities of the process
+registry = TagRegistry()
@@ -1,10 +1,11 @@
 from packets import GetPacketList
 from entities import GetEntityList, FindByTags
 from parser_lib import Parser
-from pickle import dump, load
+from log_cache import parse_log
 from time import time
-import json
+import io
 from utils import GetCardData
+import synthetic_log
 
 # Decorator used to time the execution of functions
 def time_function(func):
@@ -22,20 +23,24 @@ filename = "test-data/test_files/" + "Power_2" + ".log"
 with open(f"{filename}") as file:
     data = file.read()
 
-p = Parser()
+# The parsed packets are cached next to the log (see log_cache.py), the log is only parsed the first time
+packet_data = time_function(parse_log)(filename)
 
-try:
-    with open(filename.split(".")[0] + ".pickle", "br") as file:
-        packet_data = load(file)
-except FileNotFoundError:
-    packet_data = time_function(p.parse_str)(data)
+# The cached packets must be the same as parsing the log again
+fast_packet_data = time_function(Parser("tokenizer").parse_str)(data)
+assert fast_packet_data.as_list() == packet_data.as_list(), "Cached packets differ from the parsed log"
 
-    with open(filename.split(".")[0] + ".pickle", "bw") as file:
-        dump(packet_data, file)
+# The tokenizer backend must give the same results as the pyparsing grammar. Parsing a whole log with pyparsing takes minutes, so the
+# check runs on a small synthetic log (see synthetic_log.py) with the same quirks as the real ones
+synthetic = io.StringIO()
+synthetic_log.write_log(synthetic, 1e5, turns=5)
+synthetic = synthetic.getvalue()
+assert time_function(Parser().parse_str)(synthetic).as_list() == Parser("tokenizer").parse_str(synthetic).as_list(), "Tokenizer output differs from the pyparsing grammar"
 
 packets = time_function(GetPacketList)(packet_data)
 
-entities = time_function(GetEntityList)(packets, dbg=False)
+# The tags used in the queries below are indexed while replaying the game
+entities = time_function(GetEntityList)(packets, dbg=False, indexes=["ZONE", "CARDTYPE", "CONTROLLER"])
 
 # EXAMPLE: extracting minions controlled by one player and displaying their type and name
 
@@ -45,10 +50,11 @@ p_id = players[0][1]["PlayerID"]
 minions_in_play = FindByTags(["ZONE", "CARDTYPE", "CONTROLLER"], ["PLAY", "MINION", p_id], entities)
 minion_ids = [minion["cardId"] for n, minion in minions_in_play]
 
-with open("json-data/bg-cards.json") as file:
-    cards = json.load(file)
+# Indexed queries must give the same results as a scan of all the entities
+assert minions_in_play == FindByTags(["ZONE", "CARDTYPE", "CONTROLLER"], ["PLAY", "MINION", p_id], list(entities))
 
-minion_data = [GetCardData(id, cards) for id in minion_ids]
+# The card data is loaded once and indexed by id
+minion_data = [GetCardData(id) for id in minion_ids]
 
 print(f"Minion types: {", ".join([minion["CARDRACE"] for n, minion in minions_in_play])}")
 print(f"Minion names: {", ".join([card["name"] for card in minion_data])}")
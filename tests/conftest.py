@@ -0,0 +1,23 @@
+import io
+import os
+import sys
+
+import pytest
+
+# The modules are at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic_log
+
+# A small synthetic log (see synthetic_log.py) with the same quirks as the real ones, a few games of 5 turns
+@pytest.fixture(scope="session")
+def log_text():
+    file = io.StringIO()
+    synthetic_log.write_log(file, 1e5, turns=5)
+    return file.getvalue()
+
+@pytest.fixture
+def log_path(tmp_path, log_text):
+    path = tmp_path / "Power.log"
+    path.write_text(log_text)
+    return str(path)
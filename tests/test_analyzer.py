@@ -0,0 +1,154 @@
+import os
+import struct
+
+import pytest
+
+# The analyzer needs Qt, run without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+pytest.importorskip("PySide6")
+
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication
+
+from parser_lib import Parser
+from log_cache import cache_path
+import analyzer
+from analyzer import PacketModel, LogLoader, MainWindow, create_packet_objs, search_timeslot
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+@pytest.fixture(scope="module")
+def packets(log_text):
+    return create_packet_objs(Parser("tokenizer").parse_str(log_text))
+
+def test_model_rows(app, packets):
+    model = PacketModel(packets)
+
+    assert model.rowCount() == len(packets)
+    assert model.columnCount() == 3
+    assert model.headerData(0, Qt.Horizontal) == "Timestamp"
+
+    index = model.index(10, 0)
+    assert model.data(index) == packets[10].timestamp
+    assert model.data(model.index(10, 1)) == packets[10].ptype
+    assert model.data(model.index(10, 2), Qt.ToolTipRole) == packets[10].print_contents()
+    assert "\n" not in model.data(model.index(10, 2))
+    assert model.data(model.index(10, 2)) is model.data(model.index(10, 2))
+    assert not (model.flags(index) & Qt.ItemIsEditable)
+
+def test_append_packets(app, packets):
+    model = PacketModel()
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+
+    model.append_packets(packets[:100])
+    model.append_packets([])
+    model.append_packets(packets[100:])
+
+    assert model.rowCount() == len(packets)
+    assert inserted == [(0, 99), (100, len(packets) - 1)]
+
+# Shades alternate with the screenshot timeslots, the same when the rows are added in batches after the times are known
+def test_slot_shades(app, packets):
+    times = sorted({packet.time_us for packet in packets})[::50]
+
+    model = PacketModel(packets)
+    model.set_slot_times(times)
+
+    streamed = PacketModel()
+    streamed.set_slot_times(times)
+    for n in range(0, len(packets), 77):
+        streamed.append_packets(packets[n:n + 77])
+
+    assert streamed.shades == model.shades
+    for packet in packets:
+        slot = search_timeslot(packet.time_us, times)
+        assert packet.slot == (slot if slot is not None else -1)
+
+    shades = [model.data(model.index(n, 0), Qt.BackgroundRole) for n in range(len(packets))]
+    assert all(shade is not None for shade in shades)
+
+def loaded_packets(loader):
+    packets = []
+    loader.packets_loaded.connect(packets.extend)
+    loader.run()
+    return packets
+
+def test_loader(app, log_path, packets):
+    loader = LogLoader(log_path)
+    progress = []
+    loader.progress.connect(lambda done, total: progress.append((done, total)))
+
+    loaded = loaded_packets(loader)
+
+    assert loader.error is None
+    assert [(packet.timestamp, packet.ptype, packet.content) for packet in loaded] == [(packet.timestamp, packet.ptype, packet.content) for packet in packets]
+    assert progress and progress[-1][1] == os.path.getsize(log_path)
+    assert os.path.exists(cache_path(log_path))
+
+    # The second time the packets come from the cache
+    assert len(loaded_packets(LogLoader(log_path))) == len(packets)
+
+# A cancelled load stops after the batch it is reading and doesn't write the cache
+def test_loader_cancelled(app, log_path, packets):
+    class CancelledLoader(LogLoader):
+        BATCH_SIZE = 50
+
+        def isInterruptionRequested(self):
+            return True
+
+    loaded = loaded_packets(CancelledLoader(log_path))
+
+    assert len(loaded) < len(packets)
+    assert not os.path.exists(cache_path(log_path))
+
+def test_loader_missing_file(app, tmp_path):
+    loader = LogLoader(str(tmp_path / "missing.log"))
+    failures = []
+    loader.failed.connect(failures.append)
+
+    assert loaded_packets(loader) == []
+    assert isinstance(loader.error, OSError)
+    assert failures and failures[0].startswith("FileNotFoundError")
+
+# Errors other than reading the log, like a corrupt cache, are reported as well
+def test_loader_corrupt_cache(app, log_path, monkeypatch):
+    def corrupt_cache(self, progress=None):
+        raise struct.error("unpack requires a buffer of 4 bytes")
+        yield
+
+    monkeypatch.setattr(analyzer.ParsedLogCache, "stream", corrupt_cache)
+
+    loader = LogLoader(log_path)
+    failures = []
+    loader.failed.connect(failures.append)
+
+    assert loaded_packets(loader) == []
+    assert isinstance(loader.error, struct.error)
+    assert failures == ["error: unpack requires a buffer of 4 bytes"]
+
+def test_window_loads_log(app, log_path, packets):
+    window = MainWindow()
+    window.parse_log_file(log_path)
+
+    loader = window.loader
+    loader.wait()
+    while (window.loader is not None):
+        app.processEvents()
+
+    assert window.log_widget.model.rowCount() == len(packets)
+    assert window.statusBar().currentMessage().startswith(f"{len(packets)} packets loaded")
+    window.close()
+
+def test_window_shows_load_error(app, tmp_path):
+    window = MainWindow()
+    window.parse_log_file(str(tmp_path / "missing.log"))
+
+    window.loader.wait()
+    while (window.loader is not None):
+        app.processEvents()
+
+    assert window.statusBar().currentMessage().startswith("Error loading")
+    window.close()
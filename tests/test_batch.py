@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+
+import pytest
+
+from batch import CsvWriter, COLUMNS, find_logs, summarize_log
+from utils import CardDB
+import synthetic_log
+
+# Games of 20 turns, in shorter ones the player often has no minion in play at the end
+@pytest.fixture(scope="module")
+def games_log(tmp_path_factory):
+    path = tmp_path_factory.mktemp("logs") / "Power.log"
+    with open(path, "w") as file:
+        synthetic_log.write_log(file, 3e5, turns=20)
+    return str(path)
+
+def test_summarize_log(games_log):
+    rows = summarize_log((games_log, None, False))
+
+    with open(games_log) as file:
+        assert len(rows) == file.read().count("GameState.DebugPrintPower() - CREATE_GAME")
+    for n, row in enumerate(rows):
+        assert row["log"] == games_log
+        assert row["game"] == n
+        assert row["player"] == "Lvetto#2345"
+        assert row["hero"] == synthetic_log.HEROES[0][1]
+        assert row["placement"] in {str(place) for place in range(1, 9)}
+        assert row["turns"] == "20"
+        assert row["board"]
+        assert set(row["board"].split("|")) <= {card_id for name, card_id in synthetic_log.MINIONS}
+
+# With card data the names of the cards are used
+def test_card_names(games_log, tmp_path):
+    cards = [{"id": card_id, "name": name} for name, card_id in synthetic_log.MINIONS]
+    cards.append({"id": synthetic_log.HEROES[0][1], "name": "Yogg-Saron"})
+    card_path = tmp_path / "cards.json"
+    card_path.write_text(json.dumps(cards))
+
+    try:
+        rows = summarize_log((games_log, str(card_path), False))
+    finally:
+        CardDB.loaded.clear()
+
+    names = {name for name, card_id in synthetic_log.MINIONS}
+    assert all(row["hero"] == "Yogg-Saron" for row in rows)
+    assert all(set(row["board"].split("|")) <= names for row in rows)
+
+def test_csv(log_path):
+    file = io.StringIO()
+    writer = CsvWriter(file)
+    rows = summarize_log((log_path, None, False))
+    writer.write(rows)
+    writer.close()
+
+    read = list(csv.DictReader(io.StringIO(file.getvalue())))
+    assert tuple(read[0]) == COLUMNS
+    assert [row["board"] for row in read] == [row["board"] for row in rows]
+
+def test_find_logs(tmp_path):
+    for name in ("a.log", "b.log", "c.txt"):
+        (tmp_path / name).write_text("")
+
+    assert find_logs([str(tmp_path)]) == [str(tmp_path / "a.log"), str(tmp_path / "b.log")]
+    assert find_logs([str(tmp_path / "*.txt")]) == [str(tmp_path / "c.txt")]
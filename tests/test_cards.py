@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+
+import card_cache
+from card_cache import CardCache, build_cache, cache_path, is_fresh
+from utils import CardDB
+
+CARDS = [
+    {"id": "BG_Bob", "dbfId": 1, "name": "Bob's Tavern"},
+    {"id": "BG_Tier0", "dbfId": 7, "name": "Coin", "techLevel": 0},
+    {"id": "BG_Alleycat", "dbfId": 40, "name": "Alleycat", "techLevel": 1, "race": "BEAST"},
+    {"id": "BG_Amalgam", "dbfId": 41, "name": "Amalgam", "techLevel": 2, "races": ["BEAST", "MURLOC", "DEMON"]},
+    {"id": "BG_Alleycat_G", "dbfId": 39, "name": "Alleycat", "techLevel": 1, "race": "BEAST"},
+    {"id": "BG_Cafe", "name": "Café", "techLevel": 6},
+    {"id": "BG_Noname"},
+]
+
+def write_cards(path, cards):
+    with open(path, "w") as file:
+        json.dump(cards, file)
+
+@pytest.fixture
+def json_path(tmp_path, monkeypatch):
+    # Each test starts without any card data loaded
+    monkeypatch.setattr(CardDB, "loaded", {})
+
+    path = str(tmp_path / "cards.json")
+    write_cards(path, CARDS)
+    return path
+
+# Every lookup gives the same cards from the json and from the cache
+def test_cache_same_as_json(json_path):
+    cards = CardDB.load(json_path, use_cache=False)
+    cache = CardDB.load(json_path)
+
+    assert isinstance(cards, CardDB)
+    assert isinstance(cache, CardCache)
+    assert len(cache) == len(cards) == len(CARDS)
+
+    for card in CARDS:
+        assert cache.get(card["id"]) == cards.get(card["id"]) == card
+    for id in ("BG_Missing", "", None, "ZZZ"):
+        assert cache.get(id) is cards.get(id) is None
+
+    for dbf_id in (0, 1, 7, 39, 40, 41, 1000):
+        assert cache.get_by_dbf_id(dbf_id) == cards.get_by_dbf_id(dbf_id), dbf_id
+
+    for race in ("BEAST", "MURLOC", "DEMON", "DRAGON"):
+        assert cache.find_by_race(race) == cards.find_by_race(race), race
+
+    for tier in range(8):
+        assert cache.find_by_tier(tier) == cards.find_by_tier(tier), tier
+    assert [card["id"] for card in cache.find_by_tier(0)] == ["BG_Tier0"]
+
+    for name in ("Alleycat", "Café", "Bob's Tavern", "Nobody"):
+        assert sorted(card["id"] for card in cache.find_by_name(name)) == sorted(card["id"] for card in cards.find_by_name(name)), name
+
+def test_stale_cache(json_path):
+    build_cache(json_path)
+    assert is_fresh(json_path)
+
+    # Same size, different contents
+    changed = [dict(card, name=card["name"].upper()) if "name" in card else card for card in CARDS]
+    write_cards(json_path, changed)
+    os.utime(json_path, ns=(0, 0))
+    assert not is_fresh(json_path)
+    assert CardCache.open(json_path).get("BG_Alleycat")["name"] == "ALLEYCAT"
+
+    write_cards(json_path, CARDS[:2])
+    assert not is_fresh(json_path)
+    assert len(CardCache.open(json_path)) == 2
+
+def test_old_cache_version(json_path, monkeypatch):
+    build_cache(json_path)
+
+    monkeypatch.setattr(card_cache, "VERSION", card_cache.VERSION + 1)
+    assert not is_fresh(json_path)
+
+def test_missing_json(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(CardDB, "loaded", {})
+    path = str(tmp_path / "missing.json")
+
+    assert CardCache.open(path) is None
+    assert not os.path.exists(cache_path(path))
+
+    for use_cache in (True, False):
+        cards = CardDB.load(path, use_cache=use_cache)
+        assert len(cards) == 0
+        assert cards.get("BG_Alleycat") is None
+
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "not found" in captured.err
@@ -0,0 +1,130 @@
+import pickle
+
+import pytest
+
+from parser_lib import Parser
+from packets import GetPacketList
+from entities import Entity, EntityStore, FindByTags, GetEntityList
+
+QUERIES = [
+    (["ENTITY_ID"], ["4"]),
+    (["ENTITY_ID"], ["999999"]),
+    (["Entity"], ["GameEntity"]),
+    (["entityName"], ["Alleycat"]),
+    (["CARDTYPE"], ["PLAYER"]),
+    (["ZONE", "CARDTYPE"], ["PLAY", "MINION"]),
+    (["ZONE", "CARDTYPE", "CONTROLLER"], ["HAND", "MINION", "5"]),
+    (["ZONE", "ATK"], ["PLAY", "3"]),
+    (["ATK"], ["3"]),
+    (["ZONE"], ["NOT_A_ZONE"]),
+    (["NOT_A_TAG"], [None]),
+]
+
+@pytest.fixture(scope="module")
+def packets(log_text):
+    return GetPacketList(Parser("tokenizer").parse_str(log_text))
+
+# Replays with and without secondary indexes give the same entities, and the indexed queries the same results as a scan
+@pytest.mark.parametrize("indexes", [(), ("ZONE", "CARDTYPE", "CONTROLLER")])
+def test_query_same_as_scan(packets, indexes):
+    entities = GetEntityList(packets, indexes=indexes)
+    plain = list(entities)
+
+    assert isinstance(entities, EntityStore)
+    assert [entity.tag_dict() for entity in entities] == [entity.tag_dict() for entity in GetEntityList(packets)]
+
+    for tags, values in QUERIES:
+        assert FindByTags(tags, values, entities) == FindByTags(tags, values, plain), (tags, values)
+
+def test_indexes_follow_tag_changes():
+    store = EntityStore([Entity([("ENTITY_ID", "1"), ("ZONE", "HAND")]), Entity([("ENTITY_ID", "2"), ("ZONE", "PLAY")])], indexes=["ZONE"])
+    entity = store[0]
+
+    entity["ZONE"] = "PLAY"
+    entity["ENTITY_ID"] = "3"
+
+    assert FindByTags(["ZONE"], ["PLAY"], store) == [(0, entity), (1, store[1])]
+    assert FindByTags(["ZONE"], ["HAND"], store) == []
+    assert FindByTags(["ENTITY_ID"], ["3"], store) == [(0, entity)]
+    assert FindByTags(["ENTITY_ID"], ["1"], store) == []
+
+# The same entity can be in the list more than once, every position is found
+def test_entity_appended_twice():
+    entity = Entity([("ENTITY_ID", "1"), ("ZONE", "HAND")])
+    store = EntityStore([entity, Entity([("ENTITY_ID", "2")]), entity])
+
+    entity["ZONE"] = "PLAY"
+    assert store.find("ENTITY_ID", "1") == [(0, entity), (2, entity)]
+    assert FindByTags(["ZONE"], ["PLAY"], store) == [(0, entity), (2, entity)]
+
+def test_index_added_later(packets):
+    entities = GetEntityList(packets)
+    expected = FindByTags(["ZONE", "CARDTYPE"], ["PLAY", "MINION"], entities)
+
+    entities.add_index("ZONE")
+    entities.add_index("CARDTYPE")
+    assert FindByTags(["ZONE", "CARDTYPE"], ["PLAY", "MINION"], entities) == expected
+
+def test_pickle(packets):
+    entities = GetEntityList(packets, indexes=["ZONE"])
+    copy = pickle.loads(pickle.dumps(entities))
+
+    assert [entity.tag_dict() for entity in copy] == [entity.tag_dict() for entity in entities]
+    assert list(copy.secondary_indexes) == list(entities.secondary_indexes)
+    assert [n for n, entity in FindByTags(["ZONE"], ["PLAY"], copy)] == [n for n, entity in FindByTags(["ZONE"], ["PLAY"], entities)]
+
+def test_entity_values():
+    entity = Entity([("ZONE", 7)])
+    entity["ATK"] = 5
+
+    assert entity["ZONE"] == 7
+    assert entity["ATK"] == 5
+    assert entity["HEALTH"] is None
+    assert "ATK = 5" in repr(entity)
+
+# Enum values are stored as codes and given back as names, other values as they are
+def test_tag_codes():
+    entity = Entity([("ZONE", "PLAY"), ("CARDTYPE", "MINION"), ("ZONE_POSITION", "1"), ("NOT_A_TAG", "x")])
+    entity["ZONE"] = "NOT_A_ZONE"
+    entity["STATE"] = 2
+
+    assert entity.tag_dict() == {"ZONE": "NOT_A_ZONE", "CARDTYPE": "MINION", "ZONE_POSITION": "1", "NOT_A_TAG": "x", "STATE": 2}
+    assert "CARDTYPE = MINION" in repr(entity)
+    assert FindByTags(["CARDTYPE", "NOT_A_TAG"], ["MINION", "x"], [entity]) == [(0, entity)]
+
+# Every way of changing the list keeps the indexes in step with the entities
+@pytest.mark.parametrize("change", [
+    lambda store, entity: store.extend([entity, store[0]]),
+    lambda store, entity: store.__iadd__([entity]),
+    lambda store, entity: store.insert(1, entity),
+    lambda store, entity: store.__setitem__(0, entity),
+    lambda store, entity: store.__setitem__(slice(1, 3), [entity]),
+    lambda store, entity: store.__delitem__(0),
+    lambda store, entity: store.__delitem__(slice(0, 2)),
+    lambda store, entity: store.__imul__(2),
+    lambda store, entity: store.pop(),
+    lambda store, entity: store.pop(0),
+    lambda store, entity: store.remove(store[1]),
+    lambda store, entity: store.clear(),
+    lambda store, entity: store.sort(key=lambda entity: entity["ZONE"]),
+    lambda store, entity: store.reverse(),
+])
+def test_list_changes(change):
+    store = EntityStore([Entity([("ENTITY_ID", str(n)), ("ZONE", zone)]) for n, zone in enumerate(["HAND", "PLAY", "DECK", "PLAY"])],
+                        indexes=["ZONE"])
+    removed = list(store)
+    entity = Entity([("ENTITY_ID", "9"), ("ZONE", "PLAY")])
+    change(store, entity)
+
+    # Tags changed afterwards still move the entities in the indexes
+    for other in store:
+        other["ZONE"] = "HAND" if (other["ZONE"] == "PLAY") else "PLAY"
+    for other in removed:
+        if (other not in store):
+            assert other.store is None
+
+    plain = list(store)
+    for tags, values in [(["ZONE"], ["PLAY"]), (["ZONE"], ["HAND"]), (["ZONE", "ENTITY_ID"], ["PLAY", "9"])]:
+        assert FindByTags(tags, values, store) == FindByTags(tags, values, plain), (tags, values)
+    for n in range(10):
+        assert store.find("ENTITY_ID", str(n)) == FindByTags(["ENTITY_ID"], [str(n)], plain)
@@ -0,0 +1,103 @@
+import os
+
+from parser_lib import Parser
+from packets import GetPacketList, IterPackets
+from entities import GetEntityList
+import follower
+from follower import LogFollower
+
+def entity_tags(entities):
+    return [entity.tag_dict() for entity in entities]
+
+def expected_entities(text):
+    return entity_tags(GetEntityList(GetPacketList(Parser("tokenizer").parse_str(text))))
+
+# The log is written in pieces cut anywhere, also in the middle of a line, and polled after each one
+def write_in_pieces(path, text, follower, size):
+    data = text.encode("utf-8")
+    packets = []
+    with open(path, "ab") as file:
+        for n in range(0, len(data), size):
+            file.write(data[n:n + size])
+            file.flush()
+            packets.extend(follower.poll())
+    return packets
+
+def test_appended_log(tmp_path, log_text):
+    path = str(tmp_path / "Power.log")
+    open(path, "w").close()
+
+    follower = LogFollower(path)
+    packets = write_in_pieces(path, log_text, follower, 4093)
+
+    assert [packet.command for packet in packets] == [packet.command for packet in GetPacketList(Parser("tokenizer").parse_str(log_text))]
+    assert entity_tags(follower.state.entities) == expected_entities(log_text)
+
+def test_partial_line(tmp_path, log_text):
+    path = str(tmp_path / "Power.log")
+    lines = log_text.splitlines(keepends=True)
+    head = "".join(lines[:200])
+
+    with open(path, "w") as file:
+        file.write(head + lines[200][:10])
+
+    follower = LogFollower(path)
+    follower.poll()
+    assert follower.partial == lines[200][:10].encode("utf-8")
+
+    # The rest of the line completes it
+    with open(path, "a") as file:
+        file.write(lines[200][10:] + "".join(lines[201:]))
+    follower.poll()
+
+    assert follower.partial == b""
+    assert entity_tags(follower.state.entities) == expected_entities(log_text)
+
+def test_missing_file(tmp_path):
+    assert LogFollower(str(tmp_path / "missing.log")).poll() == []
+
+# A shorter log (the game started a new one) is read again from the start, without the entities of the old one
+def test_truncated_log(tmp_path, log_text):
+    path = str(tmp_path / "Power.log")
+    with open(path, "w") as file:
+        file.write(log_text)
+
+    resets = []
+    follower = LogFollower(path)
+    follower.state.subscribe("reset", lambda: resets.append(True))
+    follower.poll()
+
+    lines = log_text.splitlines(keepends=True)
+    with open(path, "w") as file:
+        file.write("".join(lines[:300]))
+    follower.poll()
+
+    assert resets
+    assert follower.offset == os.path.getsize(path)
+
+    # The last packet is only complete when the next line is written
+    with open(path, "a") as file:
+        file.write("".join(lines[300:]))
+    follower.poll()
+
+    assert entity_tags(follower.state.entities) == expected_entities(log_text)
+
+# Lines ending with \r\n are parsed the same, also when a piece ends between the \r and the \n
+def test_crlf_log(tmp_path, log_text, monkeypatch):
+    parsed = []
+
+    def recording_iter_packets(packet_data):
+        packet_data = list(packet_data)
+        parsed.extend(packet.as_list() for packet in packet_data)
+        return IterPackets(packet_data)
+
+    monkeypatch.setattr(follower, "IterPackets", recording_iter_packets)
+
+    path = str(tmp_path / "Power.log")
+    open(path, "w").close()
+
+    log_follower = LogFollower(path)
+    write_in_pieces(path, log_text.replace("\n", "\r\n"), log_follower, 997)
+
+    assert parsed == [packet.as_list() for packet in Parser("tokenizer").parse_str(log_text)]
+    assert entity_tags(log_follower.state.entities) == expected_entities(log_text)
@@ -0,0 +1,50 @@
+import pytest
+
+from parser_lib import Parser
+from packets import GetPacketList, CreateGame
+from entities import GetEntityList
+from games import SplitGames, GetGames
+
+@pytest.fixture(scope="module")
+def packets(log_text):
+    return GetPacketList(Parser("tokenizer").parse_str(log_text))
+
+def entity_tags(entities):
+    return [entity.tag_dict() for entity in entities]
+
+# Each game of the synthetic log has a CREATE_GAME from GameState and one from PowerTaskList
+def test_split_games(packets, log_text):
+    segments = SplitGames(packets)
+
+    assert len(segments) == log_text.count("GameState.DebugPrintPower() - CREATE_GAME") > 1
+    assert [packet for segment in segments for packet in segment] == packets
+
+    for segment in segments:
+        assert isinstance(segment[0], CreateGame)
+        assert sorted(packet.packet_type for packet in segment if isinstance(packet, CreateGame)) == [
+            "GameState.DebugPrintPower()", "PowerTaskList.DebugPrintPower()"]
+
+# Packets before the first game stay with it
+def test_packets_before_first_game(packets):
+    first = next(n for n, packet in enumerate(packets) if not isinstance(packet, CreateGame))
+    segments = SplitGames(packets[first:first + 1] + packets)
+
+    assert len(segments) == len(SplitGames(packets))
+    assert segments[0][0] is packets[first]
+
+def test_no_games():
+    assert SplitGames([]) == []
+    assert GetGames([]) == []
+
+# Each game is replayed on its own, in the worker processes or not, the same as a serial replay of its packets
+@pytest.mark.parametrize("workers", [1, 2])
+def test_get_games(packets, workers):
+    games = GetGames(packets, workers=workers, indexes=["ZONE"])
+    segments = SplitGames(packets)
+
+    assert len(games) == len(segments)
+    for game, segment in zip(games, segments):
+        assert [repr(packet) for packet in game.packets] == [repr(packet) for packet in segment]
+        assert entity_tags(game.entities) == entity_tags(GetEntityList(segment))
+        assert (game.start, game.end) == (segment[0].timestamp, segment[-1].timestamp)
+        assert list(game.entities.secondary_indexes) == list(GetEntityList(segment, indexes=["ZONE"]).secondary_indexes)
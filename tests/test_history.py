@@ -0,0 +1,81 @@
+import re
+
+import pytest
+
+from parser_lib import Parser
+from packets import GetPacketList, timestamp_us
+from entities import GetEntityList
+from history import GameHistory, TagTimelines, PacketTimes, DAY_US
+
+@pytest.fixture(scope="module")
+def packets(log_text):
+    return GetPacketList(Parser("tokenizer").parse_str(log_text))
+
+def entity_tags(entities):
+    return [entity.tag_dict() for entity in entities]
+
+def sample(packets):
+    return sorted({0, 1, len(packets) // 3, len(packets) // 2, len(packets) - 2, len(packets) - 1} | set(range(0, len(packets), 97)))
+
+# Every checkpoint is reached both forward and backward with a small interval
+@pytest.mark.parametrize("interval", [50, 1000])
+def test_state_at(packets, interval):
+    history = GameHistory(packets, interval=interval)
+
+    assert entity_tags(history.entities) == entity_tags(GetEntityList(packets))
+    for n in sample(packets):
+        assert entity_tags(history.state_at(n)) == entity_tags(GetEntityList(packets[:n + 1])), n
+
+    assert entity_tags(history.state_at(-1)) == entity_tags(history.entities)
+
+def test_value_at(packets):
+    timelines = TagTimelines(packets)
+
+    for n in sample(packets):
+        entities = GetEntityList(packets[:n + 1])
+        for key, entity in enumerate(entities):
+            if (entity.positions[0] != key):
+                continue
+            for tag, value in entity.items():
+                assert timelines.value_at(key, tag, n) == value, (n, key, tag)
+
+# A timestamp finds the state after the last packet written at or before it
+def test_timestamps(packets):
+    history = GameHistory(packets, interval=100)
+
+    for n in sample(packets)[:-1]:
+        if (packets[n].timestamp != packets[n + 1].timestamp):
+            assert history.packet_count(packets[n].timestamp) == n + 1
+            assert entity_tags(history.state_at(packets[n].timestamp)) == entity_tags(history.state_at(n))
+
+    assert history.packet_count("00:00:00.0000000") == len(packets)
+
+# The same log, moved so it goes past midnight
+def test_past_midnight(log_text):
+    shift = timestamp_us("23:59:58") - timestamp_us("15:00:00")
+
+    def moved(match):
+        time = (timestamp_us(match.group(1)) + shift) % DAY_US
+        seconds, micro = divmod(time, 1000000)
+        return f"{seconds // 3600:02}:{seconds // 60 % 60:02}:{seconds % 60:02}.{micro:06}0"
+
+    packets = GetPacketList(Parser("tokenizer").parse_str(re.sub(r"(?m)(?<=^D )(\S+)", moved, log_text)))
+    timestamps = [packet.timestamp for packet in packets]
+    assert timestamps[0] > timestamps[-1]
+
+    history = GameHistory(packets, interval=100)
+    assert list(history.times.times) == sorted(history.times.times)
+
+    # First packet after midnight
+    n = next(n for n in range(1, len(packets)) if timestamps[n] < timestamps[n - 1])
+    assert history.packet_count(timestamps[n - 1]) == n
+    assert history.packet_count(timestamps[n]) == n + 1
+    assert history.packet_count(timestamps[-1]) == len(packets)
+    assert entity_tags(history.state_at(timestamps[n])) == entity_tags(history.state_at(n))
+
+def test_packet_times_out_of_order():
+    times = PacketTimes()
+    for timestamp in ("10:00:01.0", "10:00:00.5", "10:00:02.0"):
+        times.append(timestamp)
+
+    assert list(times.times) == [timestamp_us("10:00:01.0"), timestamp_us("10:00:01.0"), timestamp_us("10:00:02.0")]
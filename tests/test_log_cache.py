@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+import log_cache
+from log_cache import ParsedLogCache, cache_path, encode, decode, parse_log
+from parser_lib import Parser
+from tokenizer import ParsedGroup, packet_from_list
+
+def as_lists(packets):
+    return [packet.as_list() for packet in packets]
+
+def expected(text):
+    return as_lists(Parser("tokenizer").parse_str(text))
+
+# Records the offsets the log is parsed from, the cache is only used if parse isn't called from 0
+@pytest.fixture
+def parse_offsets(monkeypatch):
+    offsets = []
+    parse = ParsedLogCache.parse
+
+    def recording_parse(self, offset, out, progress=None):
+        offsets.append(offset)
+        return (yield from parse(self, offset, out, progress))
+
+    monkeypatch.setattr(ParsedLogCache, "parse", recording_parse)
+    return offsets
+
+def test_no_cache(log_path, log_text):
+    assert as_lists(parse_log(log_path, use_cache=False)) == expected(log_text)
+    assert not os.path.exists(cache_path(log_path))
+
+def test_cache_hit(log_path, log_text, parse_offsets):
+    assert as_lists(parse_log(log_path)) == expected(log_text)
+    assert os.path.exists(cache_path(log_path))
+    assert parse_offsets == [0]
+
+    assert as_lists(parse_log(log_path)) == expected(log_text)
+    assert parse_offsets == [0]
+
+# Only the new lines (and the packets they can change) are parsed again
+def test_appended_log(log_path, log_text, parse_offsets):
+    lines = log_text.splitlines(keepends=True)
+    head = "".join(lines[:len(lines) // 2])
+
+    with open(log_path, "w") as file:
+        file.write(head)
+    assert as_lists(parse_log(log_path)) == expected(head)
+
+    with open(log_path, "a") as file:
+        file.write(log_text[len(head):])
+    assert as_lists(parse_log(log_path)) == expected(log_text)
+
+    assert parse_offsets[0] == 0
+    assert 0 < parse_offsets[1] <= len(head.encode("utf-8"))
+
+def test_truncated_log(log_path, log_text, parse_offsets):
+    parse_log(log_path)
+
+    head = "".join(log_text.splitlines(keepends=True)[:100])
+    with open(log_path, "w") as file:
+        file.write(head)
+
+    assert as_lists(parse_log(log_path)) == expected(head)
+    assert parse_offsets == [0, 0]
+
+# Same size, different contents: the hash of the log doesn't match
+def test_changed_log(log_path, log_text):
+    parse_log(log_path)
+
+    changed = log_text.replace("tag=ZONE value=PLAY", "tag=ZONE value=HAND", 1)
+    assert len(changed) == len(log_text)
+    with open(log_path, "w") as file:
+        file.write(changed)
+    os.utime(log_path, ns=(0, 0))
+
+    assert as_lists(parse_log(log_path)) == expected(changed)
+
+def test_parser_version(log_path, log_text, parse_offsets, monkeypatch):
+    parse_log(log_path)
+
+    monkeypatch.setattr(log_cache, "PARSER_VERSION", log_cache.PARSER_VERSION + 1)
+    assert ParsedLogCache(log_path).read() is None
+    assert as_lists(parse_log(log_path)) == expected(log_text)
+    assert parse_offsets == [0, 0]
+
+def test_corrupt_cache(log_path, log_text):
+    parse_log(log_path)
+
+    with open(cache_path(log_path), "r+b") as file:
+        file.seek(log_cache.HEADER.size)
+        file.write(b"\xff")
+
+    assert ParsedLogCache(log_path).read() is None
+    assert as_lists(parse_log(log_path)) == expected(log_text)
+
+# Invalid bytes are replaced, with and without the cache
+def test_invalid_utf8(log_path, log_text):
+    data = log_text.encode("utf-8").replace(b"Bob's Tavern", b"Bob's Tavern\xff", 1)
+    assert b"\xff" in data
+    with open(log_path, "wb") as file:
+        file.write(data)
+
+    text = data.decode("utf-8", errors="replace")
+    assert as_lists(parse_log(log_path, use_cache=False)) == expected(text)
+    assert as_lists(parse_log(log_path)) == expected(text)
+    assert as_lists(parse_log(log_path)) == expected(text)
+
+def test_encode_decode(log_text):
+    packets = Parser("tokenizer").parse_str(log_text)
+    # An entity without tags has an empty group
+    packets.append(packet_from_list(["D", "15:00:00.0000000", "GameState.DebugPrintPower()", "FULL_ENTITY", "Creating",
+                                     ParsedGroup([["ID", "99"], ["CardID", "BG_Test"]]), ParsedGroup([])]))
+
+    strings, shapes, leaves = encode(packets)
+    decoded = decode(strings.decode("utf-8").split("\0"), shapes, leaves, len(packets))
+
+    assert as_lists(decoded) == as_lists(packets)
+    assert decoded[-1].as_list()[-1] == []
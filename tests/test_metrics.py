@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+import metrics
+import entities
+import packets
+from parser_lib import Parser
+from packets import GetPacketList
+from entities import Entity, EntityStore, GetEntityList
+
+@pytest.fixture
+def collected():
+    collected = metrics.enable()
+    yield collected
+    metrics.disable()
+
+def test_pipeline_counters(collected, log_text):
+    packet_list = GetPacketList(Parser("tokenizer").parse_str(log_text))
+    GetEntityList(packet_list)
+
+    counters = collected.counters
+    assert sum(count for name, count in counters.items() if name.startswith("packets.") and name != "packets.skipped") == len(packet_list)
+    assert counters["packets.FULL_ENTITY"] == sum(packet.command == "FULL_ENTITY" for packet in packet_list)
+    assert set(collected.timers) >= {"parse_str", "GetPacketList", "GetEntityList", "tokenizer.tag_change", "entities.TAG_CHANGE"}
+
+    # Replays only look entities up through the indexes on the ids and names
+    assert counters["find_by_tags.indexed"] == counters["find_by_tags.calls"] > 0
+    assert counters["find_by_tags.scans"] == 0
+
+# Queries on tags without an index scan the whole store, even through an EntityStore
+def test_indexed_and_scanned_queries(collected):
+    store = EntityStore([Entity([("ENTITY_ID", str(n)), ("ZONE", "PLAY" if n % 2 else "HAND")]) for n in range(10)])
+
+    entities.FindByTags(["ENTITY_ID"], ["3"], store)
+    entities.FindByTags(["ZONE"], ["PLAY"], store)
+    entities.FindByTags(["ZONE"], ["PLAY"], list(store))
+
+    store.add_index("ZONE")
+    entities.FindByTags(["ZONE"], ["PLAY"], store)
+
+    counters = collected.counters
+    assert counters["find_by_tags.calls"] == 4
+    assert counters["find_by_tags.indexed"] == 2
+    assert counters["find_by_tags.candidates"] == 1 + 5
+    assert counters["find_by_tags.scans"] == 2
+    assert counters["find_by_tags.scanned"] == 20
+    assert collected.report()["derived"]["find_by_tags.mean_scan"] == 10
+
+def test_unresolved_entities(collected):
+    state = entities.EntityState()
+    for packet in GetPacketList(Parser("tokenizer").parse_str(
+            "D 15:00:00.0000000 GameState.DebugPrintPower() - TAG_CHANGE Entity=[entityName=Nobody id=999 zone=PLAY zonePos=0 cardId= player=5] tag=ATK value=1 \n")):
+        state.apply(packet)
+
+    assert state.unresolved == 1
+    assert collected.counters["entities.unresolved"] == 1
+
+def test_disable_restores_functions(tmp_path):
+    originals = (packets.MakePacket, entities.FindByTags, EntityStore.__dict__["candidates"], entities.EntityState.__dict__["apply"])
+
+    metrics.enable()
+    assert packets.MakePacket is not originals[0]
+    collected = metrics.disable()
+
+    assert (packets.MakePacket, entities.FindByTags, EntityStore.__dict__["candidates"], entities.EntityState.__dict__["apply"]) == originals
+    assert metrics.current is None
+
+    collected.export_json(tmp_path / "metrics.json")
+    with open(tmp_path / "metrics.json") as file:
+        assert set(json.load(file)) == {"counters", "timers", "derived"}
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from parser_lib import Parser
+from packets import GetPacketList, timestamp_us, CreateGame, PlayerId
+from packet_table import PacketTable
+from tokenizer import ParsedGroup, packet_from_list
+
+@pytest.fixture(scope="module")
+def parsed(log_text):
+    return Parser("tokenizer").parse_str(log_text)
+
+@pytest.fixture(scope="module")
+def table(parsed):
+    return PacketTable(parsed)
+
+# Every packet has its rows, in order, with the tags it sets
+def test_columns(parsed, table):
+    packets = GetPacketList(parsed)
+    assert len(table.packets) == len(packets)
+    assert list(np.unique(table.packet)) == list(range(len(packets)))
+    assert np.all(np.diff(table.packet) >= 0)
+
+    for n, packet in enumerate(packets):
+        rows = np.flatnonzero(table.packet == n)
+        assert repr(table.packets[n]) == repr(packet)
+
+        assert set(table.timestamp[rows]) == {timestamp_us(packet.timestamp)}
+        assert {table.commands[code] for code in table.command[rows]} == {packet.command}
+        assert {table.packet_types[code] for code in table.packet_type[rows]} == {packet.packet_type}
+
+        if isinstance(packet, CreateGame):
+            tags = [*packet.game_tags.items(), *packet.p1_tags.items(), *packet.p2_tags.items()]
+        elif isinstance(packet, PlayerId):
+            tags = []
+        else:
+            tags = list(packet.tags.items())
+
+        decoded = [(table.tags[tag], table.values[value]) for tag, value in zip(table.tag[rows], table.value[rows]) if tag >= 0]
+        assert decoded == tags, n
+
+def test_mask_and_select(table):
+    mask = table.mask(command="TAG_CHANGE", tag="ATK")
+    selected = table.select(mask)
+
+    assert len(selected) == mask.sum() > 0
+    assert {table.tags[code] for code in selected.tag} == {"ATK"}
+    assert not table.mask(command="NOT_A_COMMAND").any()
+
+def test_turns(table):
+    game = table.entity_ids["GameEntity"]
+    codes = table.running_value("TURN", entity=game)
+    turns = table.numbers(codes)
+
+    assert set(turns[table.has_number(codes)]) == {1, 2, 3, 4, 5}
+    assert np.all(turns[~table.has_number(codes)] == -1)
+    assert turns[-1] == 5
+
+# A real -1 is a number, missing values and strings are not
+def test_numbers(parsed):
+    tags = ParsedGroup([["Entity", "GameEntity"], ["tag", "NUM_OPTIONS"], ["value", "-1"]])
+    table = PacketTable([*parsed, packet_from_list(["D", "15:59:59.0000000", "GameState.DebugPrintPower()", "TAG_CHANGE", tags])])
+
+    row = np.flatnonzero(table.mask(tag="NUM_OPTIONS"))[-1]
+    assert table.numbers()[row] == -1
+    assert table.has_number()[row]
+
+    missing = np.flatnonzero(table.tag == -1)
+    assert len(missing) > 0
+    assert np.all(table.numbers()[missing] == -1)
+    assert not table.has_number()[missing].any()
+
+    zones = table.mask(tag="ZONE")
+    assert not table.has_number()[zones].any()
+    assert table.has_number()[table.mask(tag="ATK")].all()
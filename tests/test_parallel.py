@@ -0,0 +1,43 @@
+import pytest
+
+from parser_lib import Parser
+from packets import GetPacketList
+from parallel import BOUNDARY, GetPacketListParallel, chunk_bounds
+
+def packet_values(packets):
+    return [(packet.timestamp, packet.packet_type, packet.command, repr(packet)) for packet in packets]
+
+def serial(text, backend):
+    return packet_values(GetPacketList(Parser(backend).parse_str(text)))
+
+# Every cut is at the start of a line beginning a top-level packet
+@pytest.mark.parametrize("count", [2, 3, 7, 16, 64])
+def test_chunk_bounds(log_text, count):
+    bounds = chunk_bounds(log_text, count)
+
+    assert bounds[0] == 0 and bounds[-1] == len(log_text)
+    assert bounds == sorted(set(bounds))
+    for pos in bounds[1:-1]:
+        assert log_text[pos - 1] == "\n"
+        assert BOUNDARY.match(log_text[pos:log_text.find("\n", pos)])
+
+@pytest.mark.parametrize("workers, chunks_per_worker", [(1, 1), (2, 1), (2, 4), (3, 5)])
+def test_same_as_serial(log_text, workers, chunks_per_worker):
+    packets = GetPacketListParallel(log_text, workers=workers, backend="tokenizer", chunks_per_worker=chunks_per_worker)
+    assert packet_values(packets) == serial(log_text, "tokenizer")
+
+def test_same_as_serial_pyparsing(log_text):
+    assert packet_values(GetPacketListParallel(log_text, workers=2, backend="pyparsing")) == serial(log_text, "pyparsing")
+
+# The text is cut so that the middle, where the chunks would be split, falls among the tag lines of a FULL_ENTITY
+def test_cut_inside_multiline_packet(log_text):
+    start = log_text.index("FULL_ENTITY - Creating", len(log_text) // 3)
+    middle = log_text.index("tag=", start)
+    text = log_text[:log_text.index("\n", 2 * middle) + 1]
+
+    bounds = chunk_bounds(text, 2)
+    assert len(bounds) == 3 and bounds[1] > middle
+
+    packets = GetPacketListParallel(text, workers=2, backend="tokenizer", chunks_per_worker=1)
+    assert packet_values(packets) == serial(text, "tokenizer")
+    assert packet_values(packets) == serial(text, "pyparsing")
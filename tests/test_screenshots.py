@@ -0,0 +1,172 @@
+import os
+import subprocess
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from screenshots import CapturePipeline, FakeFrameSource, WindowGeometryCache, WindowNotFound, get_window_geometry
+
+def saved_files(folder):
+    return sorted(name for name in os.listdir(folder) if name.startswith("screenshot_"))
+
+# Frames are named after the millisecond they were taken, the interval keeps the names apart
+def test_pipeline_saves_frames(tmp_path):
+    pipeline = CapturePipeline(FakeFrameSource(64, 48), str(tmp_path), workers=2)
+    pipeline.run(interval=0.005, count=6)
+
+    files = saved_files(tmp_path)
+    assert pipeline.saved == 6
+    assert pipeline.dropped == pipeline.errors == 0
+    assert len(files) == 6
+    assert all(Image.open(tmp_path / name).size == (64, 48) for name in files)
+
+    with open(tmp_path / "timing.csv") as file:
+        lines = file.read().splitlines()
+    assert lines[0] == "timestamp,capture_ms,queue_ms,encode_ms"
+    assert len(lines) == 7
+
+def test_webp(tmp_path):
+    pipeline = CapturePipeline(FakeFrameSource(64, 48), str(tmp_path), image_format="webp", level=0, timing_log=False)
+    pipeline.run(interval=0.005, count=2)
+
+    files = saved_files(tmp_path)
+    assert len(files) == 2 and all(name.endswith(".webp") for name in files)
+    assert not os.path.exists(tmp_path / "timing.csv")
+
+# With slow encoders the queue fills up: the grabs don't wait more than put_timeout and the frames that don't fit are dropped
+def test_full_queue_drops_frames(tmp_path):
+    pipeline = CapturePipeline(FakeFrameSource(64, 48), str(tmp_path), workers=1, queue_size=1, put_timeout=0.01)
+    save_frame = pipeline.save_frame
+    pipeline.save_frame = lambda frame: (time.sleep(0.1), save_frame(frame))
+
+    start = time.perf_counter()
+    queued = [pipeline.capture() for _ in range(10)]
+    assert time.perf_counter() - start < 0.5
+    pipeline.close()
+
+    assert pipeline.dropped == queued.count(False) > 0
+    assert pipeline.saved == queued.count(True)
+
+# Frames that can't be saved are counted, the encoders keep going
+def test_save_errors(tmp_path):
+    pipeline = CapturePipeline(FakeFrameSource(64, 48), str(tmp_path), workers=1, queue_size=2)
+
+    def save_frame(frame):
+        raise OSError("No space left on device")
+    pipeline.save_frame = save_frame
+
+    pipeline.run(interval=0.005, count=5)
+    assert pipeline.errors == 5
+    assert pipeline.saved == 0
+
+# close returns even if the encoders died and the queue is full
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_close_with_dead_encoders(tmp_path):
+    pipeline = CapturePipeline(FakeFrameSource(64, 48), str(tmp_path), workers=1, queue_size=2, put_timeout=0.01)
+
+    def save_frame(frame):
+        raise SystemExit
+    pipeline.save_frame = save_frame
+
+    for _ in range(10):
+        pipeline.capture()
+
+    pipeline.workers[0].join(1)
+    assert not pipeline.workers[0].is_alive()
+
+    closing = threading.Thread(target=pipeline.close, daemon=True)
+    closing.start()
+    closing.join(5)
+    assert not closing.is_alive()
+
+# The fake frames change every 3 grabs, only the first of each 3 is saved
+def test_dedup(tmp_path):
+    pipeline = CapturePipeline(FakeFrameSource(320, 48, repeat=3), str(tmp_path), dedup_distance=3)
+    pipeline.run(interval=0.005, count=9)
+
+    assert pipeline.saved == 3
+    assert pipeline.duplicates == 6
+
+    with open(tmp_path / "index.csv") as file:
+        rows = [line.split(",") for line in file.read().splitlines()[1:]]
+    assert len(rows) == 9
+    assert sorted({name for timestamp, name in rows}) == saved_files(tmp_path)
+
+
+XWININFO_OUTPUT = b"""
+xwininfo: Window id: 0x4a00007 "Hearthstone"
+
+  Absolute upper-left X:  120
+  Absolute upper-left Y:  45
+  Relative upper-left X:  0
+  Relative upper-left Y:  0
+  Width: 1600
+  Height: 900
+  Depth: 24
+"""
+
+# xwininfo is replaced by its output, or by its exit status when the window doesn't exist
+@pytest.fixture
+def xwininfo(monkeypatch):
+    calls = []
+
+    def check_output(command, stderr=None):
+        calls.append(command)
+        if (command[-1] != "Hearthstone"):
+            raise subprocess.CalledProcessError(1, command)
+        return XWININFO_OUTPUT
+
+    monkeypatch.setattr(subprocess, "check_output", check_output)
+    return calls
+
+def test_get_window_geometry(xwininfo):
+    assert get_window_geometry("Hearthstone") == {"left": 120, "top": 45, "width": 1600, "height": 900}
+    assert xwininfo == [["xwininfo", "-name", "Hearthstone"]]
+
+    with pytest.raises(WindowNotFound):
+        get_window_geometry("Another window")
+
+def test_geometry_cache(xwininfo, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+
+    cache = WindowGeometryCache("Hearthstone", max_age=5.0)
+    for _ in range(10):
+        assert cache.get() == {"top": 45, "left": 120, "width": 1600, "height": 900}
+    assert cache.lookups == len(xwininfo) == 1
+
+    # Looked up again once it's too old
+    now[0] += 6
+    cache.get()
+    cache.get()
+    assert cache.lookups == 2
+
+    # and after a failed grab
+    cache.invalidate()
+    cache.get()
+    assert cache.lookups == len(xwininfo) == 3
+
+def test_geometry_cache_window_not_found(xwininfo):
+    cache = WindowGeometryCache("Another window")
+    with pytest.raises(WindowNotFound):
+        cache.get()
+    assert cache.monitor is None
+
+# Any backend with a geometry method can be used instead of xwininfo
+def test_geometry_backend():
+    class Backend:
+        def __init__(self):
+            self.calls = 0
+
+        def geometry(self, window_name):
+            self.calls += 1
+            return {"left": 0, "top": 0, "width": 800 * self.calls, "height": 600}
+
+    backend = Backend()
+    cache = WindowGeometryCache("Hearthstone", backend=backend, max_age=0)
+
+    assert cache.get()["width"] == 800
+    time.sleep(0.001)
+    assert cache.get()["width"] == 1600
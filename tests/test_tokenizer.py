@@ -0,0 +1,39 @@
+import io
+
+from parser_lib import Parser
+from tokenizer import LineTokenizer
+from packets import GetPacketList
+
+def test_same_output_as_pyparsing(log_text):
+    assert Parser("tokenizer").parse_str(log_text).as_list() == Parser().parse_str(log_text).as_list()
+
+def test_iter_packets_same_as_parse_str(log_text):
+    parser = Parser("tokenizer")
+    assert [packet.as_list() for packet in parser.iter_packets(io.StringIO(log_text))] == parser.parse_str(log_text).as_list()
+
+# Lines given a few at a time, like the follower does, give the same packets as the whole log at once
+def test_feed_in_chunks(log_text):
+    parser = Parser("tokenizer")
+    lines = [parser.clean_str(line + "\n") for line in log_text.split("\n")[:-1]]
+
+    tokenizer = LineTokenizer()
+    packets = []
+    for n in range(0, len(lines), 37):
+        packets.extend(tokenizer.feed(lines[n:n + 37]))
+
+    assert [packet.as_list() for packet in packets] == parser.parse_str(log_text).as_list()
+
+def test_packet_objects(log_text):
+    packets = GetPacketList(Parser("tokenizer").parse_str(log_text))
+
+    commands = {packet.command for packet in packets}
+    assert {"CREATE_GAME", "FULL_ENTITY", "TAG_CHANGE", "SHOW_ENTITY", "HIDE_ENTITY", "CHANGE_ENTITY"} <= commands
+
+# Packets hash and compare by identity, field_values compares their contents
+def test_packet_identity(log_text):
+    packets = GetPacketList(Parser("tokenizer").parse_str(log_text))
+    again = GetPacketList(Parser("tokenizer").parse_str(log_text))
+
+    assert len({packet: n for n, packet in enumerate(packets)}) == len(packets)
+    assert packets[0] != again[0]
+    assert [packet.field_values() for packet in packets] == [packet.field_values() for packet in again]
@@ -0,0 +1,383 @@
+import re
+from collections import deque
+
+# Hand-written alternative to the pyparsing grammar in parser_lib.py
+# Instead of trying every rule at every position of the text, each line is matched once against the common line start and the
+# command keyword after the separator is used to pick the only rule that can apply. The output mimics the structure produced by
+# pyparsing, so the rest of the code can't tell the two apart
+
+# Initial char, timestamp, packet type and separator. Same as Parser.basic_rules
+LINE_START = re.compile(r'\s*([A-Za-z])(?![A-Za-z])\s*([0-9]{2}:[0-9]{2}:[0-9]{2}\.[0-9]+)\s*([A-Za-z]+\.[A-Za-z]+\(\))\s*-\s*')
+
+# A single key-value pair. The value is tried with the same regex used by the grammar first and falls back to a plain word
+# The '$' in the original regex can only match at the end of the whole text, so a different pattern is used for the last line
+KEY_VALUE = re.compile(r'\s*(?:\[\s*)?([A-Za-z0-9_]+)\s*=\s*(?:(.*?)(?=\s+\w+=|\])|([A-Za-z0-9_]+))(?:\s*\])?(?:\s*\])?')
+KEY_VALUE_LAST = re.compile(r'\s*(?:\[\s*)?([A-Za-z0-9_]+)\s*=\s*(?:(.*?)(?=\s+\w+=|\]|$)|([A-Za-z0-9_]+))(?:\s*\])?(?:\s*\])?')
+
+COMMAND = re.compile(r'[A-Za-z0-9_]+')
+SEPARATOR = re.compile(r'\s*-')
+SEPARATOR_WORD = re.compile(r'\s*-\s*([A-Za-z]+)')
+PLAYER_ID = re.compile(r'\s*=\s*([A-Za-z0-9]+)\s*,\s*PlayerName=\s*([A-Za-z0-9#]+)')
+
+
+class ParsedGroup(list):
+    # Implements the small part of the pyparsing ParseResults interface that is used by the rest of the code
+    def as_list(self):
+        return [item.as_list() if isinstance(item, ParsedGroup) else item for item in self]
+
+
+class ParsedPacket(ParsedGroup):
+    def __init__(self, tokens, names):
+        super().__init__(tokens)
+        self.names = names
+
+        # Index of the first line of the packet in the lines given to the tokenizer (blank lines included)
+        self.line = None
+
+    # Packets can be indexed both by position and by result name, like ParseResults. Missing names raise a KeyError
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.names[key]
+        return super().__getitem__(key)
+
+
+# Raised when a packet can't be completed with the lines received so far, but more could still be appended to the log
+class IncompleteData(Exception):
+    pass
+
+
+class LineBuffer:
+    # Small lookahead buffer over the lines of a log. Packets spanning multiple lines need to look at the following lines before
+    # deciding if they match, and have to leave them untouched when they don't
+    # An open buffer is used when following a log that is still being written: running out of lines doesn't mean the log is over
+    def __init__(self, lines=(), closed=True):
+        self.source = iter(lines)
+        self.lines = deque()
+        self.closed = closed
+
+        # Number of lines read from the source. reached_end is set once a closed buffer is asked for a line past the last one, or for
+        # a last line not terminated by a newline: in both cases the answer could change if more data was appended to the log
+        self.count = 0
+        self.reached_end = False
+
+        # First line of the first packet that was only parsed the way it was because the log ended there. Parsing again from this line
+        # gives the same packets as parsing everything again, even if more lines have been appended to the log in the meantime
+        self.resume_line = None
+
+    # Adds lines at the end of an open buffer. Only valid after the previous lines have all been read
+    def feed(self, lines):
+        self.source = iter(lines)
+
+    # Returns the n-th line still to be processed as (line_start match, text, terminated by a newline, line number), or None at the
+    # end of the log
+    def peek(self, n):
+        while len(self.lines) <= n:
+            for raw in self.source:
+                terminated = raw.endswith("\n")
+                text = raw[:-1] if terminated else raw
+                self.count += 1
+
+                # Blank lines are skipped by pyparsing along with any other whitespace
+                if text.strip():
+                    self.lines.append((LINE_START.match(text), text, terminated, self.count - 1))
+                    break
+            else:
+                if (not self.closed):
+                    raise IncompleteData()
+                self.reached_end = True
+                return None
+
+        if not self.lines[n][2]:
+            self.reached_end = True
+        return self.lines[n]
+
+    def is_last(self, n):
+        return self.peek(n + 1) is None
+
+    def pop(self, n=1):
+        for _ in range(n):
+            self.lines.popleft()
+
+
+class LineTokenizer:
+    def __init__(self):
+        # Commands are dispatched on the first word after the separator
+        self.rules = {
+            "CREATE_GAME": self.create_game,
+            "FULL_ENTITY": self.full_entity,
+            "TAG_CHANGE": self.tag_change,
+            "HIDE_ENTITY": self.hide_entity,
+            "SHOW_ENTITY": self.show_entity,
+            "CHANGE_ENTITY": self.change_entity,
+            "BLOCK_START": self.block_start,
+            "BLOCK_END": self.block_end,
+            "PlayerID": self.player_id,
+        }
+
+        # Used by feed, keeps the lines that can't be turned into packets yet
+        self.open_buffer = LineBuffer(closed=False)
+
+    # Generator over the packets found in an iterable of lines (a file object works)
+    def tokenize(self, lines):
+        return self.packets(LineBuffer(lines))
+
+    # Incremental version of tokenize for logs that are still being written. Returns the packets that can be completed with the lines
+    # received so far, the others are kept until the next call. Lines must be complete (ending with a newline)
+    def feed(self, lines):
+        self.open_buffer.feed(lines)
+        return list(self.packets(self.open_buffer))
+
+    # Forgets the lines kept by feed
+    def reset(self):
+        self.open_buffer = LineBuffer(closed=False)
+
+    def packets(self, buffer):
+        try:
+            yield from self.buffer_packets(buffer)
+        except IncompleteData:
+            # The first line of the unfinished packet is still in the buffer, it will be parsed again once more lines are available
+            return
+
+    def buffer_packets(self, buffer):
+        while (line := buffer.peek(0)) is not None:
+            header, text, terminated, number = line
+
+            # Lines not starting with the usual pattern are not handled by any rule
+            if (header is None):
+                packet, used = None, 1
+            else:
+                command = COMMAND.match(text, header.end())
+                rule = self.rules.get(command.group()) if command else None
+
+                packet, used = rule(buffer, header, text, command.end()) if rule else (None, 0)
+
+                # Catch-all for un-handled packets (and for packets that don't match their own rule), same as the generic rule in the grammar
+                if (packet is None):
+                    used = 1
+                    if (terminated):
+                        packet = self.packet(header, [text[header.end():]], {})
+
+            if (buffer.reached_end) and (buffer.resume_line is None):
+                buffer.resume_line = number
+
+            buffer.pop(used)
+            if (packet is not None):
+                packet.line = number
+                yield packet
+
+        if (buffer.resume_line is None):
+            buffer.resume_line = buffer.count
+
+    def packet(self, header, tokens, names):
+        names["initial_char"] = header.group(1)
+        names["timestamp"] = header.group(2)
+        names["packet_type"] = header.group(3)
+
+        return ParsedPacket([header.group(1), header.group(2), header.group(3)] + tokens, names)
+
+    # Reads as many key-value pairs as possible starting from pos. Returns the pairs and the position after the last one
+    def key_values(self, text, pos, last):
+        expr = KEY_VALUE_LAST if last else KEY_VALUE
+        pairs = ParsedGroup()
+
+        while (m := expr.match(text, pos)):
+            key, value, word = m.groups()
+            pairs.append([key, value if value is not None else word])
+            pos = m.end()
+
+        return pairs, pos
+
+    # Reads the indented tag lines following the first line of a packet, starting from the n-th buffered line
+    # Returns the tags, the index of the first line not used and whether the last line was fully consumed
+    def tag_lines(self, buffer, n):
+        tags = ParsedGroup()
+        clean = True
+
+        while clean:
+            line = buffer.peek(n)
+            if (line is None) or (line[0] is None):
+                break
+
+            pairs, pos = self.key_values(line[1], line[0].end(), buffer.is_last(n))
+            if (len(pairs) == 0):
+                break
+
+            tags.extend(pairs)
+            n += 1
+
+            # Anything left on the line stops the following lines from being read
+            clean = not line[1][pos:].strip()
+
+        return tags, n, clean
+
+    # Reads a "Player" line and its tags inside a CREATE_GAME packet
+    def player(self, buffer, n):
+        line = buffer.peek(n)
+        if (line is None) or (line[0] is None) or not line[1].startswith("Player", line[0].end()):
+            return None
+
+        pairs, pos = self.key_values(line[1], line[0].end() + len("Player"), buffer.is_last(n))
+        if (len(pairs) == 0) or line[1][pos:].strip():
+            return None
+
+        tags, n, clean = self.tag_lines(buffer, n + 1)
+        if (len(tags) == 0):
+            return None
+
+        return ParsedGroup(["Player", pairs]), tags, n, clean
+
+    def create_game(self, buffer, header, text, pos):
+        if (text[pos:].strip()):
+            return None, 0
+
+        line = buffer.peek(1)
+        if (line is None) or (line[0] is None) or not line[1].startswith("GameEntity", line[0].end()):
+            return None, 0
+
+        expr = KEY_VALUE_LAST if buffer.is_last(1) else KEY_VALUE
+        m = expr.match(line[1], line[0].end() + len("GameEntity"))
+        if (m is None) or line[1][m.end():].strip():
+            return None, 0
+
+        key, value, word = m.groups()
+        game_entity = [key, value if value is not None else word]
+
+        game_tags, n, clean = self.tag_lines(buffer, 2)
+        if (len(game_tags) == 0) or not clean:
+            return None, 0
+
+        p1 = self.player(buffer, n)
+        if (p1 is None) or not p1[3]:
+            return None, 0
+        player_1, player_1_tags, n, _ = p1
+
+        p2 = self.player(buffer, n)
+        if (p2 is None):
+            return None, 0
+        player_2, player_2_tags, n, _ = p2
+
+        tokens = ["CREATE_GAME", "GameEntity", game_entity, game_tags, *player_1, player_1_tags, *player_2, player_2_tags]
+        names = {
+            "command_name": "CREATE_GAME",
+            "GameEntity_il_tags": ParsedGroup([game_entity]),
+            "game_tags": game_tags,
+            "player_1": player_1,
+            "player_1_tags": player_1_tags,
+            "player_2": player_2,
+            "player_2_tags": player_2_tags,
+        }
+
+        return self.packet(header, tokens, names), n
+
+    # FULL_ENTITY and SHOW_ENTITY share the same layout: a word (Creating/Updating), inline tags and then the tag lines
+    def entity_lines(self, buffer, text, pos):
+        m = SEPARATOR_WORD.match(text, pos)
+        if (m is None):
+            return None
+
+        il_tags, pos = self.key_values(text, m.end(), buffer.is_last(0))
+        if (len(il_tags) == 0) or text[pos:].strip():
+            return None
+
+        tags, n, _ = self.tag_lines(buffer, 1)
+        if (len(tags) == 0):
+            return None
+
+        return m.group(1), il_tags, tags, n
+
+    def full_entity(self, buffer, header, text, pos):
+        res = self.entity_lines(buffer, text, pos)
+        if (res is None):
+            return None, 0
+        word, il_tags, tags, n = res
+
+        names = {"command_name": "FULL_ENTITY", "il_tags": il_tags, "tags": tags}
+        return self.packet(header, ["FULL_ENTITY", word, il_tags, tags], names), n
+
+    def show_entity(self, buffer, header, text, pos):
+        res = self.entity_lines(buffer, text, pos)
+        if (res is None):
+            return None, 0
+        word, il_tags, tags, n = res
+
+        names = {"command_name": "SHOW_ENTITY", "type": word, "il_tags": il_tags, "tags": tags}
+        return self.packet(header, ["SHOW_ENTITY", word, il_tags, tags], names), n
+
+    # Single line packets made of the command followed by key-value pairs
+    def tags_packet(self, buffer, header, text, pos, command):
+        tags, _ = self.key_values(text, pos, buffer.is_last(0))
+        if (len(tags) == 0):
+            return None, 0
+
+        return self.packet(header, [command, tags], {"command_name": command, "tags": tags}), 1
+
+    def tag_change(self, buffer, header, text, pos):
+        return self.tags_packet(buffer, header, text, pos, "TAG_CHANGE")
+
+    def block_start(self, buffer, header, text, pos):
+        return self.tags_packet(buffer, header, text, pos, "BLOCK_START")
+
+    def hide_entity(self, buffer, header, text, pos):
+        m = SEPARATOR.match(text, pos)
+        if (m is None):
+            return None, 0
+
+        return self.tags_packet(buffer, header, text, m.end(), "HIDE_ENTITY")
+
+    def change_entity(self, buffer, header, text, pos):
+        m = SEPARATOR_WORD.match(text, pos)
+        if (m is None):
+            return None, 0
+
+        tags, _ = self.key_values(text, m.end(), buffer.is_last(0))
+        if (len(tags) == 0):
+            return None, 0
+
+        names = {"command_name": "CHANGE_ENTITY", "type": m.group(1), "tags": tags}
+        return self.packet(header, ["CHANGE_ENTITY", m.group(1), tags], names), 1
+
+    def block_end(self, buffer, header, text, pos):
+        return self.packet(header, ["BLOCK_END"], {"command_name": "BLOCK_END"}), 1
+
+    def player_id(self, buffer, header, text, pos):
+        m = PLAYER_ID.match(text, pos)
+        if (m is None):
+            return None, 0
+
+        names = {"command_name": "PlayerID", "id": m.group(1), "name": m.group(2)}
+        return self.packet(header, ["PlayerID", m.group(1), m.group(2)], names), 1
+
+
+# Builds a packet again from its positional tokens (the output of as_list), e.g. after loading it from a cache
+# Packets made by the catch-all rule have a single token after the header, the only command with no tokens of its own is BLOCK_END
+def packet_from_list(tokens):
+    names = {"initial_char": tokens[0], "timestamp": tokens[1], "packet_type": tokens[2]}
+    command = tokens[3]
+
+    if (len(tokens) > 4) or (command == "BLOCK_END"):
+        names["command_name"] = command
+
+        if (command == "CREATE_GAME"):
+            names["GameEntity_il_tags"] = ParsedGroup([tokens[5]])
+            names["game_tags"] = tokens[6]
+            names["player_1"] = ParsedGroup(tokens[7:9])
+            names["player_1_tags"] = tokens[9]
+            names["player_2"] = ParsedGroup(tokens[10:12])
+            names["player_2_tags"] = tokens[12]
+        elif (command == "FULL_ENTITY"):
+            names["il_tags"] = tokens[5]
+            names["tags"] = tokens[6]
+        elif (command == "SHOW_ENTITY"):
+            names["type"] = tokens[4]
+            names["il_tags"] = tokens[5]
+            names["tags"] = tokens[6]
+        elif (command == "CHANGE_ENTITY"):
+            names["type"] = tokens[4]
+            names["tags"] = tokens[5]
+        elif (command == "PlayerID"):
+            names["id"] = tokens[4]
+            names["name"] = tokens[5]
+        elif (command != "BLOCK_END"):
+            names["tags"] = tokens[4]
+
+    return ParsedPacket(tokens, names)
@@ -1,18 +1,89 @@
 import json
+import sys
+
+from card_cache import CardCache, card_races
+
+CARD_DATA_PATH = "json-data/bg-cards.json"
+
+# Card data indexed by card id, with secondary indexes on dbfId, race, tier and name
+# The data is only read the first time it's needed, after that the same object is reused by the whole process
+class CardDB:
+    loaded = {}
+
+    def __init__(self, cards):
+        self.cards = {}
+        self.by_dbf_id = {}
+        self.by_race = {}
+        self.by_tier = {}
+        self.by_name = {}
+
+        for card in cards:
+            self.cards[card["id"]] = card
+
+            if ("dbfId" in card):
+                self.by_dbf_id[card["dbfId"]] = card
+
+            for race in card_races(card):
+                self.by_race.setdefault(race, []).append(card)
+
+            if ("techLevel" in card):
+                self.by_tier.setdefault(card["techLevel"], []).append(card)
+
+            if ("name" in card):
+                self.by_name.setdefault(card["name"], []).append(card)
+
+    # By default the binary cache built from the json is used (see card_cache.py), it has the same lookup methods and is much faster to open
+    @classmethod
+    def load(cls, path=CARD_DATA_PATH, use_cache=True):
+        # The json and the cache are kept apart, so asking for one doesn't return the other
+        key = (path, use_cache)
+
+        if (key not in cls.loaded):
+            if (use_cache):
+                try:
+                    cls.loaded[key] = CardCache.open(path)
+                except OSError:
+                    # The cache can't be written, the json is used directly
+                    pass
+
+            if (cls.loaded.get(key) is None):
+                try:
+                    with open(path) as file:
+                        cls.loaded[key] = cls(json.load(file))
+                except FileNotFoundError:
+                    cls.loaded.pop(key, None)
+                    # On stderr, stdout can be the output of a tool (batch.py writes its csv there)
+                    print("Card data file not found. Try running download-info.py in the json-data folder", file=sys.stderr)
+                    return cls([])
+
+        return cls.loaded[key]
+
+    def __len__(self):
+        return len(self.cards)
+
+    def get(self, id):
+        return self.cards.get(id)
+
+    def get_by_dbf_id(self, dbf_id):
+        return self.by_dbf_id.get(dbf_id)
+
+    def find_by_race(self, race):
+        return self.by_race.get(race, [])
+
+    def find_by_tier(self, tier):
+        return self.by_tier.get(tier, [])
+
+    def find_by_name(self, name):
+        return self.by_name.get(name, [])
+
 
 def GetCardData(id, cards=None):
-    # In the future i would like to avoid having to read card data for each call
+    # Without an explicit list of cards, the shared card database is used
     if (cards is None):
-        try:
-            with open("json-data/bg-cards.json") as file:
-                cards = json.load(file)
-        except FileNotFoundError:
-            print("Card data file not found. Try running download-info.py in the json-data folder")
-    
+        return CardDB.load().get(id)
+
     for card in cards:
         if (card["id"] == id):
             return card
-    
-    return None
-    
 
+    return None